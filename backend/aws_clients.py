@@ -0,0 +1,58 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+from botocore.exceptions import ClientError
+from constants import SECRET_CACHE_TTL_SECONDS
+
+# Clients and secrets live at module level, so warm invocations of a Lambda
+# execution environment reuse the ones created by the first
+_clients: Dict[str, Any] = {}
+_secrets: Dict[str, Tuple[str, float]] = {}
+_lock = threading.Lock()
+
+def get_client(service_name: str, **config: Any) -> Any:
+    """
+    Get the boto3 client for a service, created on first use
+
+    Args:
+        config: botocore Config options, such as read_timeout or retries.
+            Clients with different options are created and reused separately.
+    """
+    key = f"{service_name}:{json.dumps(config, sort_keys=True)}" if config else service_name
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            # Imported here, boto3 is the slowest import of a cold start and scripts that never call AWS skip it
+            import boto3
+            from botocore.config import Config
+            client = boto3.client(service_name, region_name=os.environ.get('AWS_REGION'), config=Config(**config) if config else None)
+            _clients[key] = client
+        return client
+
+def get_secret(secret_arn_variable: str, refresh: bool = False) -> str:
+    """
+    Retrieve a secret string from AWS Secrets Manager, cached for SECRET_CACHE_TTL_SECONDS
+
+    Args:
+        secret_arn_variable: The environment variable holding the secret's ARN
+        refresh: Fetch the secret again even if the cached copy is fresh, such
+            as after GitHub rejected a rotated token
+    """
+    secret_arn = os.environ.get(secret_arn_variable)
+    if not secret_arn:
+        raise ValueError(f"{secret_arn_variable} environment variable is not set")
+
+    cached = _secrets.get(secret_arn)
+    if cached is not None and not refresh and time.monotonic() - cached[1] < SECRET_CACHE_TTL_SECONDS:
+        return cached[0]
+
+    try:
+        secret = get_client('secretsmanager').get_secret_value(SecretId=secret_arn)['SecretString']
+    except ClientError as e:
+        print(f"Error retrieving secret: {str(e)}")
+        raise e
+
+    _secrets[secret_arn] = (secret, time.monotonic())
+    return secret
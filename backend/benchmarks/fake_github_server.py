@@ -0,0 +1,225 @@
+"""
+Local stand-in for the GitHub GraphQL API.
+
+Serves either a synthetic repository or responses recorded with
+replay.RecordingTransport, with a configurable delay per request and a
+GitHub-style rate limit budget charged in query cost points. Run from the
+backend directory:
+
+    python benchmarks/fake_github_server.py --scale 10k --latency 0.05
+    python benchmarks/fake_github_server.py --fixture fixtures/github.json.gz
+
+GET /_stats reports the requests served and points used, POST /_reset clears them.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from replay import load_fixture, request_key
+from synthetic_github import SyntheticGitHub, generate, load_repository, query_cost
+
+class RateLimitBudget:
+    """
+    Points available per window, reset when the window ends
+    """
+    def __init__(self, limit: int = 5000, window: float = 3600.0):
+        """
+        Args:
+            limit: Points per window, 0 for no limit
+            window: Window length in seconds
+        """
+        self.limit = limit
+        self.window = window
+        self.used = 0
+        self.reset_at = time.time() + window
+        self._lock = threading.Lock()
+
+    def charge(self, cost: int) -> bool:
+        """Spend points on a request, returning False if there are not enough left"""
+        with self._lock:
+            if time.time() >= self.reset_at:
+                self.used = 0
+                self.reset_at = time.time() + self.window
+            if self.limit and self.used + cost > self.limit:
+                return False
+            self.used += cost
+            return True
+
+    def status(self, cost: int = 0) -> Dict[str, Any]:
+        with self._lock:
+            # Without a limit, report GitHub's default budget as never running out
+            limit = self.limit or 5000
+            return {
+                'limit': limit,
+                'cost': cost,
+                'remaining': max(limit - self.used, 0) if self.limit else limit,
+                'used': self.used,
+                'resetAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.reset_at))
+            }
+
+class SyntheticBackend:
+    """
+    Answers queries from a generated repository
+    """
+    def __init__(self, github: SyntheticGitHub):
+        self.github = github
+
+    def respond(self, path: str, body: bytes) -> Tuple[int, Dict[str, Any], int]:
+        payload = json.loads(body)
+        variables = payload.get('variables') or {}
+        return 200, self.github.execute(payload['query'], variables), query_cost(payload['query'], variables)
+
+class ReplayBackend:
+    """
+    Answers queries with recorded responses
+    """
+    def __init__(self, responses: Dict[str, Dict[str, Any]]):
+        self.responses = responses
+
+    def respond(self, path: str, body: bytes) -> Tuple[int, Dict[str, Any], int]:
+        payload = json.loads(body)
+        cost = query_cost(payload['query'], payload.get('variables') or {})
+        recorded = self.responses.get(request_key('POST', path, body))
+        if recorded is None:
+            return 404, {'message': 'No recorded response for this query'}, cost
+        return recorded['status'], json.loads(recorded['body']), cost
+
+class FakeGitHubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], backend: Any, latency: float = 0.0, budget: Optional[RateLimitBudget] = None):
+        super().__init__(address, FakeGitHubHandler)
+        self.backend = backend
+        self.latency = latency
+        self.budget = budget or RateLimitBudget(limit=0)
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {'requests': 0, 'points': 0, 'rateLimited': 0, 'bytesSent': 0}
+
+    def record(self, **counts: int):
+        with self.stats_lock:
+            for name, count in counts.items():
+                self.stats[name] += count
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes, which Nagle's algorithm would hold back on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == '/_stats':
+            with self.server.stats_lock:
+                stats = dict(self.server.stats)
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path == '/_reset':
+            self.server.reset_stats()
+            self._send_json(200, {})
+            return
+        if self.path != '/graphql':
+            self._send_json(404, {'message': 'Not Found'})
+            return
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        status, response, cost = self.server.backend.respond(self.path, body)
+        budget = self.server.budget
+        if not budget.charge(cost):
+            self.server.record(requests=1, rateLimited=1)
+            self._send_json(403, {'message': 'API rate limit exceeded'}, budget.status())
+            return
+
+        rate_limit = budget.status(cost)
+        if status == 200 and b'rateLimit' in body and isinstance(response.get('data'), dict):
+            response['data']['rateLimit'] = rate_limit
+        self.server.record(requests=1, points=cost)
+        self._send_json(status, response, rate_limit)
+
+    def _send_json(self, status: int, data: Dict[str, Any], rate_limit: Optional[Dict[str, Any]] = None):
+        body = json.dumps(data).encode('utf-8')
+        if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            body = gzip.compress(body, compresslevel=1)
+            gzipped = True
+        else:
+            gzipped = False
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        if rate_limit:
+            self.send_header('X-RateLimit-Resource', 'graphql')
+            self.send_header('X-RateLimit-Limit', str(rate_limit['limit']))
+            self.send_header('X-RateLimit-Remaining', str(rate_limit['remaining']))
+            self.send_header('X-RateLimit-Used', str(rate_limit['used']))
+            self.send_header('X-RateLimit-Reset', str(int(self.server.budget.reset_at)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.record(bytesSent=len(body))
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+def create_backend(scale: Optional[str] = None, fixture: Optional[str] = None, dataset: Optional[str] = None) -> Any:
+    """
+    Build the backend for a server
+
+    Args:
+        scale: Synthetic repository scale, such as 10k
+        fixture: Responses recorded with RecordingTransport
+        dataset: Synthetic repository saved by synthetic_github.py
+    """
+    if fixture:
+        return ReplayBackend(load_fixture(fixture)['responses'])
+    if dataset:
+        return SyntheticBackend(SyntheticGitHub(load_repository(dataset)))
+    return SyntheticBackend(SyntheticGitHub(generate(scale or '1k')))
+
+def serve(backend: Any, port: int = 0, latency: float = 0.0, rate_limit: int = 0, rate_window: float = 3600.0,
+          ready: Any = None):
+    """
+    Serve until interrupted
+
+    Args:
+        ready: Optional queue that receives the port once the server is listening
+    """
+    server = FakeGitHubServer(('127.0.0.1', port), backend, latency, RateLimitBudget(rate_limit, rate_window))
+    if ready is not None:
+        ready.put(server.server_address[1])
+    else:
+        print(f"Fake GitHub API listening on http://127.0.0.1:{server.server_address[1]}/graphql")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--scale', default='1k')
+    parser.add_argument('--fixture', help='Recorded responses to replay')
+    parser.add_argument('--dataset', help='Synthetic repository file to serve')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--rate-limit', type=int, default=5000, help='Points per window, 0 for no limit')
+    parser.add_argument('--rate-window', type=float, default=3600.0, help='Rate limit window in seconds')
+    args = parser.parse_args()
+    serve(create_backend(args.scale, args.fixture, args.dataset), args.port, args.latency, args.rate_limit, args.rate_window)
@@ -0,0 +1,199 @@
+"""
+End-to-end benchmark of the leaderboard build.
+
+Runs process_contributions against the fake GitHub server, either on a
+synthetic repository or on responses recorded from GitHub, and reports the
+requests made, wall-clock time, peak memory and rate limit points used for
+every mode. Every run happens in a fresh process. Run from the backend
+directory:
+
+    python benchmarks/leaderboard_benchmark.py run --scales 1k 10k --modes aggregate batched
+    python benchmarks/leaderboard_benchmark.py record aws aws-cdk benchmarks/fixtures/aws-cdk.json.gz
+    python benchmarks/leaderboard_benchmark.py run --fixture benchmarks/fixtures/aws-cdk.json.gz --org aws --repo aws-cdk
+
+Recording needs a GitHub token in GITHUB_TOKEN. Replays only answer the
+queries that were recorded, so run them with the mode and worker count
+used for the recording.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import search_sharding
+from fake_github_server import create_backend, serve
+from replay import RecordingTransport, load_fixture
+from constants import AGGREGATE_MODE, PER_USER_MODE, INCREMENTAL_MODE, BATCHED_MODE
+
+MODES = [AGGREGATE_MODE, BATCHED_MODE, INCREMENTAL_MODE, PER_USER_MODE]
+
+# Per-user mode runs several searches per contributor, too slow for the larger scales
+DEFAULT_MODES = {
+    '1k': MODES,
+    '10k': [AGGREGATE_MODE, BATCHED_MODE, INCREMENTAL_MODE],
+    '100k': [AGGREGATE_MODE, BATCHED_MODE, INCREMENTAL_MODE]
+}
+
+def freeze_clock(recorded_at: Optional[str]):
+    """Make searches end at the time a fixture was recorded, so replays build the same queries"""
+    if recorded_at:
+        frozen = datetime.datetime.fromisoformat(recorded_at)
+        search_sharding.utc_now = lambda: frozen
+
+def server_stats(base_url: str, reset: bool = False) -> Dict[str, int]:
+    """Get the fake server's request and point counts, optionally clearing them"""
+    if reset:
+        urllib.request.urlopen(urllib.request.Request(f"{base_url}/_reset", data=b'', method='POST')).read()
+        return {}
+    with urllib.request.urlopen(f"{base_url}/_stats") as response:
+        return json.loads(response.read())
+
+def build_leaderboard(base_url: str, mode: str, org: str, repo: str, max_workers: int, recorded_at: Optional[str],
+                      metrics_path: Optional[str], results: Any):
+    """Build the leaderboard in this process and put the measurements on the results queue"""
+    from github_api import GitHubAPI
+    from http_transport import HTTPTransport
+    from rate_limiter import RateLimitThrottle
+    from contribution_store import ContributionStore
+    from handler import process_contributions
+    from metrics import PipelineMetrics, JsonFileSink
+
+    freeze_clock(recorded_at)
+    github_api = GitHubAPI('benchmark', RateLimitThrottle(), HTTPTransport(base_url=base_url, backoff_base=0.1))
+    metrics = PipelineMetrics(JsonFileSink(metrics_path) if metrics_path else None, {'Mode': mode})
+    metrics.track(github_api.transport)
+    store = ContributionStore() if mode == INCREMENTAL_MODE else None
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        if store is not None:
+            # Measure the refresh of an up-to-date store, not the first full scan
+            process_contributions(github_api, org, repo, mode, max_workers, store)
+        server_stats(base_url, reset=True)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        contributors = process_contributions(github_api, org, repo, mode, max_workers, store, metrics=metrics)
+        elapsed = time.perf_counter() - start
+
+    stats = server_stats(base_url)
+    results.put({
+        'mode': mode,
+        'contributors': len(contributors),
+        'requests': stats['requests'],
+        'points': stats['points'],
+        'rateLimited': stats['rateLimited'],
+        'seconds': elapsed,
+        'peakRssMb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'rssGrowthMb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+    })
+
+def serve_backend(scale: Optional[str], fixture: Optional[str], latency: float, rate_limit: int, rate_window: float, ready: Any):
+    serve(create_backend(scale, fixture), latency=latency, rate_limit=rate_limit, rate_window=rate_window, ready=ready)
+
+def run_benchmarks(scale: Optional[str], fixture: Optional[str], modes: List[str], org: str, repo: str, max_workers: int,
+                   latency: float, rate_limit: int, rate_window: float, metrics_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Start a fake server for a scale or fixture and measure every mode against it
+
+    Args:
+        metrics_path: JSON lines file that receives the phase spans of every run
+
+    Returns:
+        One result per mode
+    """
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    server = context.Process(target=serve_backend, args=(scale, fixture, latency, rate_limit, rate_window, ready), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{ready.get()}"
+    recorded_at = load_fixture(fixture).get('recordedAt') if fixture else None
+
+    results = []
+    try:
+        for mode in modes:
+            queue = context.Queue()
+            worker = context.Process(target=build_leaderboard, args=(base_url, mode, org, repo, max_workers, recorded_at, metrics_path, queue))
+            worker.start()
+            result = queue.get()
+            worker.join()
+            result['scale'] = scale or os.path.basename(fixture)
+            results.append(result)
+            print_result(result)
+    finally:
+        server.terminate()
+        server.join()
+    return results
+
+def record(org: str, repo: str, path: str, mode: str, max_workers: int):
+    """Run a leaderboard build against GitHub and save every response as a fixture"""
+    from github_api import GitHubAPI
+    from rate_limiter import RateLimitThrottle
+    from handler import process_contributions
+
+    recorded_at = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0).isoformat()
+    freeze_clock(recorded_at)
+    transport = RecordingTransport(recorded_at=recorded_at)
+    github_api = GitHubAPI(os.environ['GITHUB_TOKEN'], RateLimitThrottle(), transport)
+    contributors = process_contributions(github_api, org, repo, mode, max_workers)
+    print(f"Built a leaderboard of {len(contributors)} contributors")
+    transport.save(path)
+
+def print_header():
+    print(f"{'scale':<10}{'mode':<14}{'contributors':>13}{'requests':>10}{'points':>8}{'limited':>9}{'wall (s)':>10}{'peak RSS (MB)':>15}")
+
+def print_result(result: Dict[str, Any]):
+    print(f"{result['scale']:<10}{result['mode']:<14}{result['contributors']:>13}{result['requests']:>10}{result['points']:>8}"
+          f"{result['rateLimited']:>9}{result['seconds']:>10.2f}{result['peakRssMb']:>15.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Benchmark against synthetic repositories or a recorded fixture')
+    run_parser.add_argument('--scales', nargs='+', default=['1k', '10k', '100k'])
+    run_parser.add_argument('--modes', nargs='+', choices=MODES, help='Modes to run, by default all that are practical at each scale')
+    run_parser.add_argument('--fixture', help='Replay recorded responses instead of a synthetic repository')
+    run_parser.add_argument('--org', default='synthetic')
+    run_parser.add_argument('--repo', default='repository')
+    run_parser.add_argument('--workers', type=int, default=4)
+    run_parser.add_argument('--latency', type=float, default=0.0, help='Seconds the server adds to every request')
+    run_parser.add_argument('--rate-limit', type=int, default=0, help='Points per window, 0 for no limit')
+    run_parser.add_argument('--rate-window', type=float, default=3600.0, help='Rate limit window in seconds')
+    run_parser.add_argument('--json', help='Also write the results to this file')
+    run_parser.add_argument('--metrics', help='Append the phase spans of every run to this JSON lines file')
+
+    record_parser = commands.add_parser('record', help='Record a fixture from GitHub')
+    record_parser.add_argument('org')
+    record_parser.add_argument('repo')
+    record_parser.add_argument('path', help='Fixture file, gzipped if it ends with .gz')
+    record_parser.add_argument('--mode', choices=MODES, default=AGGREGATE_MODE)
+    record_parser.add_argument('--workers', type=int, default=4)
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        record(args.org, args.repo, args.path, args.mode, args.workers)
+        return
+
+    print_header()
+    results = []
+    for scale in ([None] if args.fixture else args.scales):
+        modes = args.modes or (DEFAULT_MODES.get(scale, MODES) if scale else [AGGREGATE_MODE])
+        results.extend(run_benchmarks(scale, args.fixture, modes, args.org, args.repo, args.workers,
+                                      args.latency, args.rate_limit, args.rate_window, args.metrics))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
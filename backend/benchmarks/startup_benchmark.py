@@ -0,0 +1,123 @@
+"""
+Cold-start benchmark for the leaderboard Lambda modules.
+
+Each module is imported in a fresh interpreter, the way a new Lambda
+execution environment would load it, and the import time and peak memory
+are reported. The AWS clients an invocation needs are then created twice in
+one interpreter, the first time as a cold start does, importing boto3, and
+the second as a warm invocation does, reusing them. Run from the backend
+directory:
+
+    python benchmarks/startup_benchmark.py [module ...]
+"""
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules loaded on a cold start, plus the gql client the discussion scan used to need and boto3, now loaded on first use
+DEFAULT_MODULES = ['discussion_analyzer', 'github_api', 'handler', 'webhook_handler', 'gql.transport.requests', 'boto3']
+
+# Clients a leaderboard invocation uses
+INVOCATION_CLIENTS = ['codepipeline', 'secretsmanager', 's3']
+
+MEASURE_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+try:
+    __import__(sys.argv[1])
+    error = None
+except ImportError as e:
+    error = str(e)
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'importSeconds': elapsed,
+    'peakRssKb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'error': error
+}))
+"""
+
+CLIENTS_SCRIPT = """
+import json, sys, time
+timings = {}
+try:
+    import aws_clients
+    for invocation in ('cold', 'warm'):
+        start = time.perf_counter()
+        for service in sys.argv[1:]:
+            aws_clients.get_client(service)
+        timings[invocation] = time.perf_counter() - start
+    timings['error'] = None
+except ImportError as e:
+    timings['error'] = str(e)
+print(json.dumps(timings))
+"""
+
+def measure_import(module: str, repeat: int = 5) -> Dict[str, float]:
+    """
+    Import a module in fresh interpreters and report the best run
+
+    Returns:
+        The fastest import time in seconds and the matching peak RSS in KB
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', MEASURE_SCRIPT, module],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        runs.append(json.loads(output))
+
+    return min(runs, key=lambda run: run['importSeconds'])
+
+def measure_clients(services: List[str], repeat: int = 5) -> Dict[str, float]:
+    """
+    Create the clients of an invocation twice in fresh interpreters and report the best run
+
+    Returns:
+        The seconds taken by a cold and a warm invocation
+    """
+    # Clients need a region, not credentials
+    env = dict(os.environ, AWS_REGION=os.environ.get('AWS_REGION', 'us-east-1'))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', CLIENTS_SCRIPT, *services],
+            cwd=BACKEND_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        runs.append(json.loads(output))
+
+    if runs[0]['error']:
+        return runs[0]
+    return min(runs, key=lambda run: run['cold'])
+
+def main(modules: List[str]):
+    print(f"{'module':<28}{'import (ms)':>14}{'peak RSS (MB)':>16}")
+    for module in modules:
+        result = measure_import(module)
+        if result['error']:
+            print(f"{module:<28}{'not installed':>14}   ({result['error']})")
+            continue
+        print(f"{module:<28}{result['importSeconds'] * 1000:>14.1f}{result['peakRssKb'] / 1024:>16.1f}")
+
+    clients = measure_clients(INVOCATION_CLIENTS)
+    print(f"\nAWS clients of an invocation: {', '.join(INVOCATION_CLIENTS)}")
+    print(f"{'invocation':<28}{'clients (ms)':>14}")
+    if clients['error']:
+        print(f"{'cold':<28}{'not installed':>14}   ({clients['error']})")
+        return
+    print(f"{'cold':<28}{clients['cold'] * 1000:>14.1f}")
+    print(f"{'warm':<28}{clients['warm'] * 1000:>14.3f}")
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or DEFAULT_MODULES)
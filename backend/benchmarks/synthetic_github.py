@@ -0,0 +1,379 @@
+"""
+Synthetic GitHub repository for benchmarks.
+
+Generates a deterministic repository of merged PRs, issues and discussions
+for a given number of contributors, and answers the GraphQL queries the
+leaderboard sends, search qualifiers included, from in-memory indexes.
+Generate a dataset as a fixture file from the backend directory with:
+
+    python benchmarks/synthetic_github.py 10k benchmarks/fixtures/synthetic-10k.json.gz
+"""
+import bisect
+import datetime
+import gzip
+import json
+import random
+import re
+import sys
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Contributors at each benchmark scale
+SCALES = {
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000
+}
+
+# Items per contributor, on average
+PRS_PER_CONTRIBUTOR = 2
+ISSUES_PER_CONTRIBUTOR = 1
+DISCUSSIONS_PER_CONTRIBUTOR = 0.2
+
+DATASET_START = datetime.datetime(2023, 7, 1, tzinfo=datetime.timezone.utc)
+DATASET_END = datetime.datetime(2025, 12, 31, tzinfo=datetime.timezone.utc)
+
+# GitHub search never returns more than this many results
+SEARCH_RESULT_CAP = 1000
+
+LABELS = ['bug', 'feature-request', 'contribution/core', 'p1', 'p2']
+
+def to_iso(timestamp: int) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def parse_time(value: str, end_of_day: bool = False) -> int:
+    """Parse a search qualifier date or timestamp into epoch seconds"""
+    if len(value) == 10:
+        parsed = datetime.datetime.fromisoformat(value).replace(tzinfo=datetime.timezone.utc)
+        if end_of_day:
+            parsed += datetime.timedelta(days=1, seconds=-1)
+    else:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return int(parsed.timestamp())
+
+def parse_range(value: str) -> Tuple[int, int]:
+    """Parse a >=, <=, > or < comparison or an a..b range into inclusive epoch bounds"""
+    if '..' in value:
+        start, end = value.split('..', 1)
+        return parse_time(start), parse_time(end, end_of_day=True)
+    for operator, bounds in (('>=', lambda t: (t, sys.maxsize)), ('<=', lambda t: (0, t)),
+                             ('>', lambda t: (t + 1, sys.maxsize)), ('<', lambda t: (0, t - 1))):
+        if value.startswith(operator):
+            return bounds(parse_time(value[len(operator):], end_of_day=operator in ('<=', '>')))
+    return parse_time(value), parse_time(value, end_of_day=True)
+
+class SyntheticRepository:
+    """
+    A generated repository with indexes for the searches the leaderboard runs
+    """
+    def __init__(self, contributors: int, seed: int = 0):
+        rng = random.Random(seed)
+        self.usernames = [f"user{i:06d}" for i in range(contributors)]
+        # A few users contribute most of the work, as in real repositories
+        weights = [1 / (rank + 1) ** 0.8 for rank in range(contributors)]
+        start, end = int(DATASET_START.timestamp()), int(DATASET_END.timestamp())
+
+        def pick_users(count: int) -> List[int]:
+            return rng.choices(range(contributors), weights=weights, k=count)
+
+        pr_count = contributors * PRS_PER_CONTRIBUTOR
+        merged = sorted(rng.randint(start, end) for _ in range(pr_count))
+        authors = pick_users(pr_count)
+        reviewers = pick_users(pr_count * 4)
+        # PR: (number, author, mergedAt, updatedAt, reviewers, labels)
+        self.pull_requests: List[Tuple[int, int, int, int, Tuple[int, ...], Tuple[str, ...]]] = []
+        for i, merged_at in enumerate(merged):
+            review_count = min(int(rng.expovariate(1 / 4)), 30)
+            pr_reviewers = tuple(reviewers[(i * 4 + j) % len(reviewers)] for j in range(review_count))
+            labels = tuple(label for label in LABELS if rng.random() < 0.1)
+            self.pull_requests.append((i + 1, authors[i], merged_at, merged_at + rng.randint(0, 3600), pr_reviewers, labels))
+
+        issue_count = contributors * ISSUES_PER_CONTRIBUTOR
+        created = sorted(rng.randint(start, end) for _ in range(issue_count))
+        # Issue: (number, author, createdAt, updatedAt, labels)
+        self.issues: List[Tuple[int, int, int, int, Tuple[str, ...]]] = [
+            (pr_count + i + 1, author, created_at, created_at + rng.randint(0, 86400), tuple(label for label in LABELS if rng.random() < 0.1))
+            for i, (created_at, author) in enumerate(zip(created, pick_users(issue_count)))
+        ]
+
+        discussion_count = int(contributors * DISCUSSIONS_PER_CONTRIBUTOR)
+        # Discussion: (number, createdAt, updatedAt, answerer or None, answeredAt)
+        self.discussions: List[Tuple[int, int, int, Optional[int], int]] = []
+        for i, answerer in enumerate(pick_users(discussion_count)):
+            created_at = rng.randint(start, end)
+            answered_at = created_at + rng.randint(0, 7 * 86400)
+            self.discussions.append((i + 1, created_at, answered_at + rng.randint(0, 86400), answerer if rng.random() < 0.6 else None, answered_at))
+
+        self._index()
+
+    def _index(self):
+        self.pr_times = [pr[2] for pr in self.pull_requests]
+        self.issue_times = [issue[2] for issue in self.issues]
+        # Longest time between an item's merge or creation and its last update, bounding updated: searches
+        self.max_update_lag = max([pr[3] - pr[2] for pr in self.pull_requests] + [issue[3] - issue[2] for issue in self.issues] + [0])
+        self.user_index = {username: i for i, username in enumerate(self.usernames)}
+        self.prs_by_author: Dict[int, List[int]] = defaultdict(list)
+        self.prs_by_reviewer: Dict[int, List[int]] = defaultdict(list)
+        self.issues_by_author: Dict[int, List[int]] = defaultdict(list)
+        for position, pr in enumerate(self.pull_requests):
+            self.prs_by_author[pr[1]].append(position)
+            for reviewer in set(pr[4]):
+                self.prs_by_reviewer[reviewer].append(position)
+        for position, issue in enumerate(self.issues):
+            self.issues_by_author[issue[1]].append(position)
+        self._search_cache: OrderedDict = OrderedDict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'usernames': self.usernames,
+            'pullRequests': self.pull_requests,
+            'issues': self.issues,
+            'discussions': self.discussions
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SyntheticRepository':
+        repository = cls.__new__(cls)
+        repository.usernames = data['usernames']
+        repository.pull_requests = [(n, a, m, u, tuple(r), tuple(l)) for n, a, m, u, r, l in data['pullRequests']]
+        repository.issues = [(n, a, c, u, tuple(l)) for n, a, c, u, l in data['issues']]
+        repository.discussions = [tuple(discussion) for discussion in data['discussions']]
+        repository._index()
+        return repository
+
+    def search(self, query: str) -> List[int]:
+        """Get the positions of the PRs or issues matching a search query"""
+        cached = self._search_cache.get(query)
+        if cached is not None:
+            self._search_cache.move_to_end(query)
+            return cached
+
+        tokens = query.split()
+        is_pr = 'is:pr' in tokens
+        times = self.pr_times if is_pr else self.issue_times
+        items = self.pull_requests if is_pr else self.issues
+        date_field = 'merged:' if is_pr else 'created:'
+
+        lower, upper = 0, sys.maxsize
+        updated_since = 0
+        author = reviewer = None
+        excluded_authors = set()
+        excluded_labels = set()
+        for token in tokens:
+            if token.startswith(date_field):
+                start, end = parse_range(token[len(date_field):])
+                lower, upper = max(lower, start), min(upper, end)
+            elif token.startswith('updated:'):
+                updated_since = parse_range(token[len('updated:'):])[0]
+            elif token.startswith('author:'):
+                author = self.user_index.get(token[len('author:'):], -1)
+            elif token.startswith('reviewed-by:'):
+                reviewer = self.user_index.get(token[len('reviewed-by:'):], -1)
+            elif token.startswith('-author:'):
+                excluded_authors.add(self.user_index.get(token[len('-author:'):], -1))
+            elif token.startswith('-label:'):
+                excluded_labels.add(token[len('-label:'):].strip('"'))
+
+        if author is not None:
+            candidates = (self.prs_by_author if is_pr else self.issues_by_author).get(author, [])
+        elif reviewer is not None and is_pr:
+            candidates = self.prs_by_reviewer.get(reviewer, [])
+        else:
+            # Updates come at most max_update_lag after the merge or creation, so the date index bounds them too
+            first = bisect.bisect_left(times, max(lower, updated_since - self.max_update_lag))
+            last = bisect.bisect_right(times, upper)
+            candidates = range(first, last)
+
+        labels_at = 5 if is_pr else 4
+        result = [
+            position for position in candidates
+            if lower <= times[position] <= upper
+            and items[position][3] >= updated_since
+            and (reviewer is None or not is_pr or reviewer in items[position][4])
+            and items[position][1] not in excluded_authors
+            and not excluded_labels.intersection(items[position][labels_at])
+        ]
+
+        self._search_cache[query] = result
+        if len(self._search_cache) > 256:
+            self._search_cache.popitem(last=False)
+        return result
+
+    def pull_request_node(self, position: int, review_limit: int) -> Dict[str, Any]:
+        number, author, merged_at, updated_at, reviewers, labels = self.pull_requests[position]
+        return {
+            'number': number,
+            'mergedAt': to_iso(merged_at),
+            'updatedAt': to_iso(updated_at),
+            'author': {'login': self.usernames[author]},
+            'labels': {'nodes': [{'name': label} for label in labels]},
+            'reviews': self.review_page(position, 0, review_limit)
+        }
+
+    def review_page(self, position: int, offset: int, limit: int) -> Dict[str, Any]:
+        reviewers = self.pull_requests[position][4]
+        end = min(offset + limit, len(reviewers))
+        return {
+            'totalCount': len(reviewers),
+            'pageInfo': {'hasNextPage': end < len(reviewers), 'endCursor': str(end)},
+            'nodes': [{'author': {'login': self.usernames[reviewer]}} for reviewer in reviewers[offset:end]]
+        }
+
+    def issue_node(self, position: int) -> Dict[str, Any]:
+        number, author, created_at, updated_at, labels = self.issues[position]
+        return {
+            'number': number,
+            'title': f"Issue {number}",
+            'createdAt': to_iso(created_at),
+            'updatedAt': to_iso(updated_at),
+            'author': {'login': self.usernames[author]},
+            'state': 'OPEN',
+            'labels': {'nodes': [{'name': label} for label in labels]}
+        }
+
+    def discussion_node(self, discussion: Tuple[int, int, int, Optional[int], int]) -> Dict[str, Any]:
+        number, created_at, updated_at, answerer, answered_at = discussion
+        return {
+            'number': number,
+            'createdAt': to_iso(created_at),
+            'updatedAt': to_iso(updated_at),
+            'answer': {'createdAt': to_iso(answered_at), 'author': {'login': self.usernames[answerer]}} if answerer is not None else None
+        }
+
+# Fields the evaluator answers, with their arguments
+FIELD_PATTERN = re.compile(r'(?:(\w+)\s*:\s*)?(search|discussions|pullRequest|rateLimit)\s*(?:\(([^)]*)\))?\s*\{')
+ARGUMENT_PATTERN = re.compile(r'(\w+)\s*:\s*(\$\w+|"[^"]*"|\{[^}]*\}|[\w.-]+)')
+CONNECTION_PATTERN = re.compile(r'\w+\s*\(([^)]*)\)\s*\{|\{|\}')
+
+def block_end(text: str, start: int) -> int:
+    """Get the position just after the brace block opening at start"""
+    depth = 0
+    for position in range(start, len(text)):
+        if text[position] == '{':
+            depth += 1
+        elif text[position] == '}':
+            depth -= 1
+            if depth == 0:
+                return position + 1
+    return len(text)
+
+def parse_arguments(arguments: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve a field's arguments, substituting variables"""
+    resolved = {}
+    for name, value in ARGUMENT_PATTERN.findall(arguments or ''):
+        if value.startswith('$'):
+            resolved[name] = variables.get(value[1:])
+        elif value.startswith('"'):
+            resolved[name] = value[1:-1]
+        elif value.isdigit():
+            resolved[name] = int(value)
+        else:
+            resolved[name] = value
+    return resolved
+
+def query_cost(query: str, variables: Dict[str, Any]) -> int:
+    """
+    Rate limit points of a query, following GitHub's documented formula
+
+    Every connection needs one request per parent node, the requests are
+    summed, divided by 100 and rounded, with a minimum of one point.
+    """
+    requests = 0
+    multipliers = [1]
+    for match in CONNECTION_PATTERN.finditer(query):
+        token = match.group(0)
+        if token == '}':
+            if len(multipliers) > 1:
+                multipliers.pop()
+            continue
+        first = parse_arguments(match.group(1), variables).get('first') if match.group(1) else None
+        if isinstance(first, int):
+            requests += multipliers[-1]
+            multipliers.append(multipliers[-1] * first)
+        else:
+            multipliers.append(multipliers[-1])
+    return max(1, round(requests / 100))
+
+class SyntheticGitHub:
+    """
+    Answers the leaderboard's GraphQL queries from a SyntheticRepository
+    """
+    def __init__(self, repository: SyntheticRepository):
+        self.repository = repository
+
+    def execute(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        data: Dict[str, Any] = {}
+        for match in FIELD_PATTERN.finditer(query):
+            alias, field, arguments = match.groups()
+            if field == 'rateLimit':
+                # Filled in by the server, which tracks the budget
+                continue
+            body = query[match.end() - 1:block_end(query, match.end() - 1)]
+            resolved = parse_arguments(arguments, variables)
+            if field == 'search':
+                data[alias or field] = self._search(resolved, body)
+            elif field == 'discussions':
+                data.setdefault('repository', {})['discussions'] = self._discussions(resolved)
+            elif field == 'pullRequest':
+                data.setdefault('repository', {})[alias or field] = self._pull_request(resolved, body, variables)
+        return {'data': data}
+
+    def _search(self, arguments: Dict[str, Any], body: str) -> Dict[str, Any]:
+        positions = self.repository.search(arguments['query'])
+        result: Dict[str, Any] = {'issueCount': len(positions)}
+        if 'nodes' not in body:
+            return result
+
+        first = arguments.get('first', 10)
+        offset = int(arguments.get('after') or 0)
+        reachable = positions[:SEARCH_RESULT_CAP]
+        page = reachable[offset:offset + first]
+        review_limit = int(re.search(r'reviews\s*\(\s*first:\s*(\d+)', body).group(1)) if 'reviews' in body else 0
+
+        if 'is:pr' in arguments['query'].split():
+            result['nodes'] = [self.repository.pull_request_node(position, review_limit) for position in page]
+        else:
+            result['nodes'] = [self.repository.issue_node(position) for position in page]
+        result['pageInfo'] = {'hasNextPage': offset + first < len(reachable), 'endCursor': str(offset + first)}
+        return result
+
+    def _pull_request(self, arguments: Dict[str, Any], body: str, variables: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # PRs are numbered from 1 in merge order
+        position = arguments['number'] - 1
+        if not 0 <= position < len(self.repository.pull_requests):
+            return None
+        reviews = parse_arguments(re.search(r'reviews\s*\(([^)]*)\)', body).group(1), variables)
+        return {'reviews': self.repository.review_page(position, int(reviews.get('after') or 0), reviews.get('first', 10))}
+
+    def _discussions(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        order_field = 'UPDATED_AT' if 'UPDATED_AT' in str(arguments.get('orderBy')) else 'CREATED_AT'
+        key_index = 2 if order_field == 'UPDATED_AT' else 1
+        discussions = self.repository.discussions
+        if arguments.get('answered') == 'true':
+            discussions = [discussion for discussion in discussions if discussion[3] is not None]
+        ordered = sorted(discussions, key=lambda discussion: discussion[key_index], reverse=True)
+
+        first = arguments.get('first', 10)
+        offset = int(arguments.get('after') or 0)
+        return {
+            'pageInfo': {'hasNextPage': offset + first < len(ordered), 'endCursor': str(offset + first)},
+            'nodes': [self.repository.discussion_node(discussion) for discussion in ordered[offset:offset + first]]
+        }
+
+def generate(scale: str, seed: int = 0) -> SyntheticRepository:
+    """Generate the repository for a benchmark scale, such as 10k"""
+    return SyntheticRepository(SCALES[scale], seed)
+
+def save_repository(path: str, repository: SyntheticRepository):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(repository.to_dict(), f)
+
+def load_repository(path: str) -> SyntheticRepository:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return SyntheticRepository.from_dict(json.load(f))
+
+if __name__ == '__main__':
+    repository = generate(sys.argv[1])
+    save_repository(sys.argv[2], repository)
+    print(f"Wrote {len(repository.usernames)} contributors, {len(repository.pull_requests)} PRs, "
+          f"{len(repository.issues)} issues and {len(repository.discussions)} discussions to {sys.argv[2]}")
@@ -0,0 +1,114 @@
+import json
+from typing import Any, Dict, List, Optional
+from botocore.exceptions import ClientError
+from models import Contributor
+from constants import CHECKPOINT_SAFETY_MARGIN_MS
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a run has to stop before the Lambda timeout
+    """
+
+class Deadline:
+    """
+    Tracks how much of the Lambda's time budget is left
+    """
+    def __init__(self, context: Any, safety_margin_ms: int = CHECKPOINT_SAFETY_MARGIN_MS):
+        """
+        Args:
+            context: The Lambda context, or None when running locally
+            safety_margin_ms: Time kept in reserve to save the checkpoint
+        """
+        self.context = context
+        self.safety_margin_ms = safety_margin_ms
+
+    def expired(self) -> bool:
+        """Check whether the run should stop and save its progress"""
+        if self.context is None:
+            return False
+        return self.context.get_remaining_time_in_millis() < self.safety_margin_ms
+
+    def check(self, phase: str):
+        """Raise DeadlineExceeded if the run should stop after the given phase"""
+        if self.expired():
+            raise DeadlineExceeded(f"Stopped after {phase} to stay within the Lambda timeout")
+
+class RunCheckpoint:
+    """
+    Progress of a leaderboard run that can be saved and resumed by a later invocation
+    """
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        # Contribution counts from the discovery scan, None until it has finished
+        self.aggregation: Optional[Dict[str, Any]] = data.get('aggregation')
+        # Counts and position of a discovery scan stopped part way, None otherwise
+        self.discovery: Optional[Dict[str, Any]] = data.get('discovery')
+        # Position of a contribution store refresh stopped part way, None otherwise
+        self.refresh: Optional[Dict[str, Any]] = data.get('refresh')
+        # Discussion answer counts, None until the discussion scan has finished
+        self.discussion_counts: Optional[Dict[str, int]] = data.get('discussionCounts')
+        # When each user's discussion answers were posted, saved with discussion_counts
+        self.discussion_answer_dates: Dict[str, List[str]] = data.get('discussionAnswerDates', {})
+        # Contributor records of the users processed so far
+        self.processed: Dict[str, Contributor] = data.get('processed', {})
+        # Progress of each repository in a multi-repository run, keyed by org/repo
+        self.repositories: Dict[str, RunCheckpoint] = {
+            name: RunCheckpoint(repository) for name, repository in data.get('repositories', {}).items()
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the checkpoint to a JSON-compatible dictionary"""
+        return {
+            'aggregation': self.aggregation,
+            'discovery': self.discovery,
+            'refresh': self.refresh,
+            'discussionCounts': self.discussion_counts,
+            'discussionAnswerDates': self.discussion_answer_dates,
+            'processed': self.processed,
+            'repositories': {name: repository.to_dict() for name, repository in self.repositories.items()}
+        }
+
+    def repository(self, name: str) -> 'RunCheckpoint':
+        """Get the progress of one repository in a multi-repository run"""
+        return self.repositories.setdefault(name, RunCheckpoint())
+
+    def pending(self, usernames: List[str]) -> List[str]:
+        """Get the users that still have to be processed, in order"""
+        return [username for username in usernames if username not in self.processed]
+
+def get_checkpoint_key(run_id: str) -> str:
+    """Get the S3 key of the checkpoint for a run"""
+    return f"leaderboard/checkpoints/checkpoint-{run_id}.json"
+
+def load_checkpoint(s3_client: Any, bucket: str, key: str) -> RunCheckpoint:
+    """
+    Load a saved checkpoint from S3
+
+    Returns:
+        The saved progress, or an empty checkpoint if it no longer exists
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            print(f"Checkpoint s3://{bucket}/{key} not found, starting over")
+            return RunCheckpoint()
+        raise e
+
+    print(f"Resuming from checkpoint s3://{bucket}/{key}")
+    return RunCheckpoint(json.loads(response['Body'].read().decode('utf-8')))
+
+def save_checkpoint(s3_client: Any, bucket: str, key: str, checkpoint: RunCheckpoint):
+    """Save a checkpoint to S3"""
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(checkpoint.to_dict()),
+        ContentType='application/json'
+    )
+    processed = len(checkpoint.processed) + sum(len(repository.processed) for repository in checkpoint.repositories.values())
+    print(f"Saved checkpoint to s3://{bucket}/{key} with {processed} contributors processed")
+
+def delete_checkpoint(s3_client: Any, bucket: str, key: str):
+    """Remove a checkpoint once the run it belongs to has finished"""
+    s3_client.delete_object(Bucket=bucket, Key=key)
@@ -1,5 +1,9 @@
+# Highest-volume authors first, searches exclude as many as fit in the query and filter the rest
 AUTHORS_TO_EXCLUDE = [
   'aws-cdk-automation',
+  'dependabot',
+  'github-actions',
+  'github-advanced-security',
   'rix0rrr',
   'iliapolo',
   'otaviomacedo',
@@ -26,10 +30,111 @@ AUTHORS_TO_EXCLUDE = [
   'saiyush',
   '5d',
   'iankhou',
-  'SimonCMoore',
-  'github-advanced-security',
-  'dependabot',
-  'github-actions'
+  'SimonCMoore'
 ]
 
-EXCLUDED_LABELS = ['contribution/core']
\ No newline at end of file
+# PRs and issues with these labels, like those of excluded authors, count for nobody
+EXCLUDED_LABELS = ['contribution/core']
+
+# Excluded authors that are GitHub Apps, which searches name as app/<name>
+APP_AUTHORS = ['dependabot', 'github-actions', 'github-advanced-security']
+
+# GitHub rejects longer search queries, exclusions that do not fit are filtered from the results instead
+MAX_SEARCH_QUERY_LENGTH = 256
+
+# Contributions made before this date are not counted
+CONTRIBUTIONS_START_DATE = '2024-01-01'
+
+# Points per contribution, used for every contributor's total score
+SCORE_WEIGHTS = {
+    'prsMerged': 10,
+    'prsReviewed': 8,
+    'issuesOpened': 5,
+    'discussionsAnswered': 3
+}
+
+# Contributors published on the leaderboard
+LEADERBOARD_SIZE = 100
+
+# Contributors per published page, and username characters per search index shard
+LEADERBOARD_PAGE_SIZE = 20
+SEARCH_INDEX_PREFIX_LENGTH = 2
+
+# Rolling windows, in days, published next to the all-time leaderboard
+ROLLING_WINDOW_DAYS = [30, 90, 365]
+
+# Archives written as diffs before a new full snapshot is taken
+ARCHIVE_SNAPSHOT_INTERVAL = 30
+
+# Rank history segments appended before they are merged back into one
+HISTORY_SEGMENT_LIMIT = 30
+
+# Changed paths invalidated one by one before falling back to a wildcard
+MAX_INVALIDATION_PATHS = 10
+
+# Processing modes for handler.process_contributions
+AGGREGATE_MODE = 'aggregate'
+PER_USER_MODE = 'per-user'
+INCREMENTAL_MODE = 'incremental'
+BATCHED_MODE = 'batched'
+
+# Number of users fetched concurrently in per-user mode
+DEFAULT_MAX_WORKERS = 8
+
+# Users per aliased count query, adjusted at runtime to GitHub's query cost
+COUNT_BATCH_SIZE = 20
+MAX_COUNT_BATCH_SIZE = 50
+MAX_COUNT_BATCH_COST = 50
+
+# GitHub search returns at most this many results per query
+SEARCH_RESULT_CAP = 1000
+
+# PRs whose remaining reviews are fetched per request, each PR getting up to 100 reviews per page
+REVIEW_PAGE_BATCH_SIZE = 50
+
+# Repositories scanned at the same time in a multi-repository run
+REPOSITORY_WORKERS = 4
+
+# Date-range shards of a search fetched concurrently
+SEARCH_SHARD_WORKERS = 4
+
+# Pages a shard fetches ahead of the one being consumed before it waits
+SEARCH_SHARD_PAGE_BUFFER = 2
+
+# Search results whose nested connections are completed together, held by the shard's worker until then
+SEARCH_COMPLETION_NODES = 500
+
+# Seconds to wait for a shard worker invocation, beyond the worker's 15 minute timeout
+SHARD_INVOKE_READ_TIMEOUT_SECONDS = 15 * 60 + 60
+
+# Time kept in reserve before the Lambda timeout to save a checkpoint
+CHECKPOINT_SAFETY_MARGIN_MS = 90 * 1000
+
+# Contributors fetched between two checks of the remaining time
+CHECKPOINT_CHUNK_SIZE = 50
+
+# Shortest time between two leaderboard publishes driven by webhook events
+WEBHOOK_PUBLISH_INTERVAL_SECONDS = 5 * 60
+
+# Seconds a secret fetched from Secrets Manager is reused by warm invocations
+SECRET_CACHE_TTL_SECONDS = 15 * 60
+
+# CloudWatch namespace of the pipeline's embedded metrics
+METRICS_NAMESPACE = 'GithubLeaderboard'
+
+# Seconds a cached GraphQL response stays fresh, by the query's root field, or
+# root and repository field. Discussion pages are ordered by update time, so
+# any edit shifts every page and they are not cached.
+CACHE_TTLS = {
+    'search': 6 * 60 * 60,
+    'rateLimit': 6 * 60 * 60,
+    'repository': 60 * 60,
+    'repository.discussions': 0
+}
+DEFAULT_CACHE_TTL = 60 * 60
+
+# Size cap of the in-memory and disk response caches
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Share of the cap the disk cache is brought back down to when it goes over
+CACHE_EVICTION_TARGET = 0.9
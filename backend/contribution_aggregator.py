@@ -0,0 +1,159 @@
+from typing import Any, Callable, Dict, Optional, Set
+from github_api import GitHubAPI
+from search_sharding import ShardedSearch, ShardedQuery
+from checkpoint import Deadline
+from contributor_table import ContributorTable
+from time_windows import ActivityIndex
+
+# Searches of the discovery scan, in the order they run
+DISCOVERY_SEARCHES = ('mergedPullRequests', 'issues')
+
+class ContributionAggregator:
+    """
+    Derives per-user PR, review and issue counts from a single pass over the
+    repository's merged PRs and issues, instead of one search per user
+    """
+    def __init__(self, github_api: GitHubAPI, search: Optional[ShardedSearch] = None):
+        """
+        Args:
+            github_api: The GitHub API client
+            search: Runs the discovery searches, a ShardedSearch of github_api by default
+        """
+        self.github_api = github_api
+        self.search = search or ShardedSearch(github_api)
+        self.table = ContributorTable()
+        # When each contribution was made, for the windowed leaderboards
+        self.activity = ActivityIndex()
+        # Position of a scan stopped part way: the search, its shards, how many
+        # of them are done, the cursor within the next one and the results seen
+        self.progress: Optional[Dict[str, Any]] = None
+        self.is_initialized = False
+
+    def initialize_contributions(self, org: str, repo: str, deadline: Optional[Deadline] = None):
+        """
+        Scan merged PRs and issues once and count contributions for every user
+
+        Args:
+            org: GitHub organization name
+            repo: Repository name
+            deadline: Checked between pages. When it runs out, DeadlineExceeded
+                is raised and to_dict saves the counts so far with the
+                position to resume the scan from.
+        """
+        if self.is_initialized:
+            return
+        deadline = deadline or Deadline(None)
+
+        if self.progress is None:
+            self.table = ContributorTable()
+            self.activity = ActivityIndex()
+            self.progress = {'search': DISCOVERY_SEARCHES[0], 'shards': None, 'finished': 0, 'cursor': None, 'seen': set()}
+
+        searches = {
+            'mergedPullRequests': (self.search.merged_pull_requests(org, repo), self._count_pull_request),
+            'issues': (self.search.issues(org, repo), self._count_issue)
+        }
+        for name in DISCOVERY_SEARCHES[DISCOVERY_SEARCHES.index(self.progress['search']):]:
+            query, count = searches[name]
+            self._scan(name, query, count, deadline)
+
+        self.progress = None
+        self.is_initialized = True
+
+    def _scan(self, name: str, query: ShardedQuery, count: Callable[[Dict[str, Any]], None], deadline: Deadline):
+        """Run one search of the discovery scan from where the progress left it"""
+        progress = self.progress
+        if progress['search'] != name:
+            progress.update(search=name, shards=None, finished=0, cursor=None, seen=set())
+        if progress['shards'] is None:
+            progress['shards'] = self.search.plan(query.build_query)
+            deadline.check(f"planning the {name} search")
+
+        seen = progress['seen']
+        pages = self.search.iter_shard_pages(progress['shards'][progress['finished']:], query.fetch_page, query.complete, progress['cursor'])
+        try:
+            for _, nodes, cursor in pages:
+                for node in nodes:
+                    # Items edited while the shards run can move between windows
+                    key = node.get('number')
+                    if key is not None:
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                    count(node)
+
+                if cursor is None:
+                    progress['finished'] += 1
+                progress['cursor'] = cursor
+                deadline.check(f"{progress['finished']} of {len(progress['shards'])} {name} shards")
+        finally:
+            pages.close()
+
+    def _count_pull_request(self, pr: Dict[str, Any]):
+        author = pr.get('author') or {}
+        if author.get('login'):
+            self.table.increment(author['login'], 'prsMerged')
+            self.activity.add(author['login'], 'prsMerged', pr.get('mergedAt'))
+
+        # A PR counts once per reviewer, however many reviews they left on it
+        reviewers = set()
+        for review in (pr.get('reviews') or {}).get('nodes', []):
+            review_author = review.get('author') or {}
+            if review_author.get('login'):
+                reviewers.add(review_author['login'])
+        for reviewer in reviewers:
+            self.table.increment(reviewer, 'prsReviewed')
+            self.activity.add(reviewer, 'prsReviewed', pr.get('mergedAt'))
+
+    def _count_issue(self, issue: Dict[str, Any]):
+        author = issue.get('author') or {}
+        if author.get('login'):
+            self.table.increment(author['login'], 'issuesOpened')
+            self.activity.add(author['login'], 'issuesOpened', issue.get('createdAt'))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the aggregated counts so a later run can restore them, with the scan's progress if it stopped part way"""
+        data = {
+            'prsMerged': self.table.column_dict('prsMerged'),
+            'prsReviewed': self.table.column_dict('prsReviewed'),
+            'issuesOpened': self.table.column_dict('issuesOpened'),
+            'contributors': sorted(self.table.usernames),
+            'activity': self.activity.to_dict()
+        }
+        if self.progress is not None:
+            data['progress'] = dict(self.progress, seen=sorted(self.progress['seen']))
+        return data
+
+    def restore(self, data: Dict[str, Any]):
+        """
+        Restore counts saved with to_dict instead of scanning the repository
+        again, or resume a scan that stopped part way with initialize_contributions
+        """
+        table = ContributorTable()
+        for username in data['contributors']:
+            table.row(username)
+        for column in ('prsMerged', 'prsReviewed', 'issuesOpened'):
+            for username, count in data[column].items():
+                table.increment(username, column, count)
+        self.table = table
+        self.activity = ActivityIndex(data.get('activity'))
+
+        progress = data.get('progress')
+        self.progress = dict(progress, seen=set(progress['seen'])) if progress is not None else None
+        self.is_initialized = progress is None
+
+    def get_contributors(self) -> Set[str]:
+        """Get every user who authored or reviewed a merged PR, or opened an issue"""
+        return set(self.table.usernames)
+
+    def get_user_pr_count(self, username: str) -> int:
+        """Get the number of merged PRs authored by a specific user"""
+        return self.table.get(username, 'prsMerged')
+
+    def get_user_review_count(self, username: str) -> int:
+        """Get the number of merged PRs reviewed by a specific user"""
+        return self.table.get(username, 'prsReviewed')
+
+    def get_user_issue_count(self, username: str) -> int:
+        """Get the number of issues opened by a specific user"""
+        return self.table.get(username, 'issuesOpened')
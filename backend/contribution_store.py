@@ -0,0 +1,427 @@
+import json
+import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from botocore.exceptions import ClientError
+from github_api import GitHubAPI
+from discussion_analyzer import DiscussionAnalyzer
+from search_sharding import ShardedSearch, ShardedQuery
+from rest_api import GitHubRestAPI
+from checkpoint import Deadline
+from time_windows import ActivityIndex
+from search_query import SearchExclusions
+from constants import CONTRIBUTIONS_START_DATE
+
+# Timestamps are kept in the same format GitHub returns, so they sort as strings
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Receive times of webhook changes, to the microsecond but comparable with TIMESTAMP_FORMAT on the first 19 characters
+UPDATE_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+# Steps of a refresh, in the order they run, discussions last
+REFRESH_STEPS = ('mergedPullRequests', 'issues', 'discussions')
+
+class ContributionStore:
+    """
+    Persisted per-item record of every counted PR, issue and discussion.
+
+    Each run only fetches the items updated since the stored watermark and
+    overwrites their records, then recounts every user from the records. A
+    re-run or an item fetched twice therefore never double counts, and an
+    edited or re-labelled item simply replaces its old record.
+
+    Merging a record also moves the per-user counts from its old version to
+    the new one, so single items, such as those of webhook events, update
+    the counts in constant time. The activity index is only rebuilt by
+    recount.
+    """
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.watermark: Optional[str] = data.get('watermark')
+        self.pull_requests: Dict[str, Dict[str, Any]] = data.get('pullRequests', {})
+        self.issues: Dict[str, Dict[str, Any]] = data.get('issues', {})
+        self.discussions: Dict[str, Dict[str, Any]] = data.get('discussions', {})
+        # Excluded items, which incremental searches and the REST listing return, are dropped when counting
+        self.exclusions = SearchExclusions()
+        # Position of a refresh stopped part way: when it started, its step, the
+        # shards of that step's search, how many are done and the cursor within the next
+        self.progress: Optional[Dict[str, Any]] = None
+        self.recount()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the store to a JSON-compatible dictionary"""
+        return {
+            'watermark': self.watermark,
+            'pullRequests': self.pull_requests,
+            'issues': self.issues,
+            'discussions': self.discussions
+        }
+
+    def refresh(self, github_api: GitHubAPI, discussion_analyzer: DiscussionAnalyzer, org: str, repo: str,
+                rest_api: Optional[GitHubRestAPI] = None, deadline: Optional[Deadline] = None, search: Optional[ShardedSearch] = None):
+        """
+        Fetch every item updated since the watermark and merge it into the store
+
+        Args:
+            github_api: The GitHub API client
+            discussion_analyzer: Used to scan the repository's discussions
+            org: The GitHub organization
+            repo: The repository name
+            rest_api: When set, issues are read from the REST listing with conditional
+                requests once the store has a watermark, so unchanged pages are free
+            deadline: Checked between pages. When it runs out, DeadlineExceeded
+                is raised with the position to resume from in progress. The
+                items merged so far stay in the store, and the watermark only
+                moves once the refresh has finished.
+            search: Runs the PR and issue searches, one of github_api with the default result cap otherwise
+        """
+        deadline = deadline or Deadline(None)
+        if self.progress is None:
+            # Taken before fetching, so anything updated during the run is picked up next time
+            started_at = datetime.datetime.now(datetime.timezone.utc).strftime(TIMESTAMP_FORMAT)
+            self.progress = {'startedAt': started_at, 'step': REFRESH_STEPS[0], 'shards': None, 'finished': 0, 'cursor': None}
+        progress = self.progress
+        updated_since = self.watermark.replace('Z', '+00:00') if self.watermark else None
+
+        self.exclusions = github_api.exclusions
+        search = search or ShardedSearch(github_api)
+        if progress['step'] == 'mergedPullRequests':
+            self._scan(search, search.merged_pull_requests(org, repo, updated_since), self.merge_pull_request, deadline)
+            self._next_step()
+
+        if progress['step'] == 'issues':
+            if rest_api and self.watermark:
+                for issue in rest_api.iter_issues(org, repo, self.watermark):
+                    self.merge_issue(issue)
+            else:
+                self._scan(search, search.issues(org, repo, updated_since), self.merge_issue, deadline)
+            self._next_step()
+            deadline.check('the issues')
+
+        # The first run only needs the discussions answered since CONTRIBUTIONS_START_DATE
+        discussions = discussion_analyzer.fetch_updated_discussions(org, repo, self.watermark or CONTRIBUTIONS_START_DATE,
+                                                                    answered_only=self.watermark is None)
+        for discussion in discussions:
+            self.merge_discussion(discussion)
+
+        self.watermark = progress['startedAt']
+        self.progress = None
+        self.recount()
+
+    def _scan(self, search: ShardedSearch, query: ShardedQuery, merge: Callable[[Dict[str, Any]], None], deadline: Deadline):
+        """Run the search of the current refresh step from where the progress left it"""
+        progress = self.progress
+        if progress['shards'] is None:
+            progress['shards'] = search.plan(query.build_query)
+            deadline.check(f"planning the {progress['step']} search")
+
+        pages = search.iter_shard_pages(progress['shards'][progress['finished']:], query.fetch_page, query.complete, progress['cursor'])
+        try:
+            for _, nodes, cursor in pages:
+                # An item seen twice, as it moved between windows, just replaces its record
+                for node in nodes:
+                    merge(node)
+
+                if cursor is None:
+                    progress['finished'] += 1
+                progress['cursor'] = cursor
+                deadline.check(f"{progress['finished']} of {len(progress['shards'])} {progress['step']} shards")
+        finally:
+            pages.close()
+
+    def _next_step(self):
+        """Move the refresh progress on to the next step"""
+        step = REFRESH_STEPS[REFRESH_STEPS.index(self.progress['step']) + 1]
+        self.progress.update(step=step, shards=None, finished=0, cursor=None)
+
+    def merge_pull_request(self, pr: Dict[str, Any]):
+        """Insert or replace the record for a merged PR"""
+        if pr.get('number') is None:
+            return
+
+        reviewers = set()
+        for review in (pr.get('reviews') or {}).get('nodes', []):
+            review_author = review.get('author') or {}
+            if review_author.get('login'):
+                reviewers.add(review_author['login'])
+
+        self._replace(self.pull_requests, str(pr['number']), {
+            'author': (pr.get('author') or {}).get('login'),
+            'reviewers': sorted(reviewers),
+            'labels': _label_names(pr),
+            'mergedAt': pr.get('mergedAt'),
+            'updatedAt': pr.get('updatedAt')
+        }, self._count_pull_request)
+
+    def merge_review(self, number: int, reviewer: Optional[str]) -> bool:
+        """
+        Add a reviewer to a stored merged PR
+
+        Returns:
+            True if the PR is stored and the user had not reviewed it yet
+        """
+        key = str(number)
+        record = self.pull_requests.get(key)
+        if record is None or not reviewer or reviewer in record['reviewers']:
+            return False
+        self._replace(self.pull_requests, key, dict(record, reviewers=sorted(record['reviewers'] + [reviewer])), self._count_pull_request)
+        return True
+
+    def merge_issue(self, issue: Dict[str, Any]):
+        """Insert or replace the record for an issue"""
+        if issue.get('number') is None:
+            return
+
+        self._replace(self.issues, str(issue['number']), {
+            'author': (issue.get('author') or {}).get('login'),
+            'labels': _label_names(issue),
+            'createdAt': issue.get('createdAt'),
+            'updatedAt': issue.get('updatedAt')
+        }, self._count_issue)
+
+    def remove_issue(self, number: int):
+        """Drop the record of a deleted issue"""
+        self._replace(self.issues, str(number), None, self._count_issue)
+
+    def merge_discussion(self, discussion: Dict[str, Any]):
+        """Insert or replace the record for a discussion, dropping it if it lost its answer or was answered before CONTRIBUTIONS_START_DATE"""
+        answer = discussion.get('answer') or {}
+        answerer = (answer.get('author') or {}).get('login')
+        key = str(discussion['number'])
+
+        if not answerer or (answer.get('createdAt') or CONTRIBUTIONS_START_DATE) < CONTRIBUTIONS_START_DATE:
+            self._replace(self.discussions, key, None, self._count_discussion)
+            return
+
+        self._replace(self.discussions, key, {
+            'answerer': answerer,
+            'answeredAt': answer.get('createdAt'),
+            'updatedAt': discussion.get('updatedAt')
+        }, self._count_discussion)
+
+    def _replace(self, records: Dict[str, Dict[str, Any]], key: str, record: Optional[Dict[str, Any]],
+                 count: Callable[[Dict[str, Any], int], bool]):
+        """Replace or drop a record, moving the counts from its old version to the new one"""
+        previous = records.get(key)
+        if previous is not None:
+            count(previous, -1)
+        if record is None:
+            records.pop(key, None)
+        else:
+            records[key] = record
+            count(record, 1)
+
+    def _count_pull_request(self, pr: Dict[str, Any], step: int) -> bool:
+        """Add or remove a PR record's counts, returning False if the PR is excluded"""
+        if self.exclusions.excludes(pr['author'], pr.get('labels', [])):
+            return False
+        if pr['author']:
+            _adjust(self.user_prs_merged, pr['author'], step)
+        for reviewer in pr['reviewers']:
+            _adjust(self.user_prs_reviewed, reviewer, step)
+        return True
+
+    def _count_issue(self, issue: Dict[str, Any], step: int) -> bool:
+        """Add or remove an issue record's count, returning False if the issue is excluded"""
+        if self.exclusions.excludes(issue['author'], issue.get('labels', [])):
+            return False
+        if issue['author']:
+            _adjust(self.user_issues_opened, issue['author'], step)
+        return True
+
+    def _count_discussion(self, discussion: Dict[str, Any], step: int) -> bool:
+        """Add or remove an answered discussion's count, returning False if it was answered before CONTRIBUTIONS_START_DATE"""
+        # Records stored before answer dates were kept fall back to the discussion's last update
+        if (discussion.get('answeredAt') or discussion['updatedAt']) < CONTRIBUTIONS_START_DATE:
+            return False
+        _adjust(self.user_discussions, discussion['answerer'], step)
+        return True
+
+    def recount(self):
+        """Rebuild the per-user counts and the activity index from the stored items"""
+        self.user_prs_merged: Dict[str, int] = {}
+        self.user_prs_reviewed: Dict[str, int] = {}
+        self.user_issues_opened: Dict[str, int] = {}
+        self.user_discussions: Dict[str, int] = {}
+        activity = ActivityIndex()
+
+        for pr in self.pull_requests.values():
+            if not self._count_pull_request(pr, 1):
+                continue
+            if pr['author']:
+                activity.add(pr['author'], 'prsMerged', pr['mergedAt'])
+            for reviewer in pr['reviewers']:
+                activity.add(reviewer, 'prsReviewed', pr['mergedAt'])
+
+        for issue in self.issues.values():
+            if self._count_issue(issue, 1) and issue['author']:
+                activity.add(issue['author'], 'issuesOpened', issue['createdAt'])
+
+        for discussion in self.discussions.values():
+            if not self._count_discussion(discussion, 1):
+                continue
+            activity.add(discussion['answerer'], 'discussionsAnswered', discussion.get('answeredAt') or discussion['updatedAt'])
+
+        self.activity = activity
+
+    def get_contributors(self) -> Set[str]:
+        """Get every user who authored or reviewed a merged PR, or opened an issue"""
+        return set(self.user_prs_merged) | set(self.user_prs_reviewed) | set(self.user_issues_opened)
+
+    def get_user_pr_count(self, username: str) -> int:
+        """Get the number of merged PRs authored by a specific user"""
+        return self.user_prs_merged.get(username, 0)
+
+    def get_user_review_count(self, username: str) -> int:
+        """Get the number of merged PRs reviewed by a specific user"""
+        return self.user_prs_reviewed.get(username, 0)
+
+    def get_user_issue_count(self, username: str) -> int:
+        """Get the number of issues opened by a specific user"""
+        return self.user_issues_opened.get(username, 0)
+
+    def get_user_discussion_count(self, username: str) -> int:
+        """Get the number of discussions answered by a specific user"""
+        return self.user_discussions.get(username, 0)
+
+def _adjust(counts: Dict[str, int], username: str, step: int):
+    """Change a user's count, dropping users whose count falls to zero"""
+    count = counts.get(username, 0) + step
+    if count > 0:
+        counts[username] = count
+    else:
+        counts.pop(username, None)
+
+def _label_names(node: Dict[str, Any]) -> List[str]:
+    """Extract the label names from a PR or issue node"""
+    return sorted(label['name'] for label in (node.get('labels') or {}).get('nodes', []) if label)
+
+def get_store_key(org: str, repo: str) -> str:
+    """Get the S3 key of the contribution store for a repository"""
+    return f"leaderboard/store/contributions-{org}-{repo}.json"
+
+def load_contribution_store(s3_client: Any, bucket: str, org: str, repo: str) -> ContributionStore:
+    """
+    Load the contribution store for a repository from S3
+
+    Returns:
+        The stored contributions, or an empty store if none has been saved yet
+    """
+    return load_contribution_store_version(s3_client, bucket, org, repo)[0]
+
+def load_contribution_store_version(s3_client: Any, bucket: str, org: str, repo: str) -> Tuple[ContributionStore, Optional[str]]:
+    """
+    Load the contribution store for a repository with the ETag of the stored object
+
+    Returns:
+        The stored contributions and their ETag, or an empty store and None
+        if none has been saved yet
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=get_store_key(org, repo))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            print(f"No contribution store found for {org}/{repo}, starting a full fetch")
+            return ContributionStore(), None
+        raise e
+
+    return ContributionStore(json.loads(response['Body'].read().decode('utf-8'))), response.get('ETag')
+
+def save_contribution_store(s3_client: Any, bucket: str, org: str, repo: str, store: ContributionStore):
+    """Save the contribution store for a repository to S3"""
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=get_store_key(org, repo),
+        Body=json.dumps(store.to_dict()),
+        ContentType='application/json'
+    )
+    print(f"Saved contribution store to s3://{bucket}/{get_store_key(org, repo)}")
+
+def save_contribution_store_if_unchanged(s3_client: Any, bucket: str, org: str, repo: str, store: ContributionStore,
+                                         etag: Optional[str]) -> bool:
+    """
+    Save the contribution store unless another writer saved it since it was loaded
+
+    Args:
+        etag: ETag the store was loaded with, None if there was no store
+
+    Returns:
+        False if the stored object changed in the meantime, in which case
+        nothing is written
+    """
+    condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    try:
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=get_store_key(org, repo),
+            Body=json.dumps(store.to_dict()),
+            ContentType='application/json',
+            **condition
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409'):
+            return False
+        raise e
+    return True
+
+def get_store_updates_prefix(org: str, repo: str) -> str:
+    """Get the S3 prefix of the webhook changes waiting to be covered by a refresh of a repository's store"""
+    return f"leaderboard/store/updates-{org}-{repo}/"
+
+def has_contribution_store(s3_client: Any, bucket: str, org: str, repo: str) -> bool:
+    """Check whether a repository's contribution store has been saved"""
+    try:
+        s3_client.head_object(Bucket=bucket, Key=get_store_key(org, repo))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return False
+        raise e
+    return True
+
+def save_store_update(s3_client: Any, bucket: str, org: str, repo: str, update: Dict[str, Any], received_at: datetime.datetime,
+                      delivery: str):
+    """
+    Save a webhook change of a repository's contributions as its own object
+
+    Keys start with the time the change was received, so they list in
+    arrival order and a refresh can drop the ones it has covered.
+    """
+    key = f"{get_store_updates_prefix(org, repo)}{received_at.strftime(UPDATE_TIMESTAMP_FORMAT)}-{delivery}.json"
+    s3_client.put_object(Bucket=bucket, Key=key, Body=json.dumps(update), ContentType='application/json')
+
+def list_store_updates(s3_client: Any, bucket: str, org: str, repo: str) -> List[str]:
+    """Get the keys of a repository's saved webhook changes, in arrival order"""
+    keys = []
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=get_store_updates_prefix(org, repo)):
+        keys.extend(item['Key'] for item in page.get('Contents', []))
+    return sorted(keys)
+
+def load_store_updates(s3_client: Any, bucket: str, org: str, repo: str) -> List[Dict[str, Any]]:
+    """Load a repository's saved webhook changes, in arrival order"""
+    updates = []
+    for key in list_store_updates(s3_client, bucket, org, repo):
+        try:
+            response = s3_client.get_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            # Deleted by a run since it was listed
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                continue
+            raise e
+        updates.append(json.loads(response['Body'].read().decode('utf-8')))
+    return updates
+
+def delete_store_updates(s3_client: Any, bucket: str, org: str, repo: str, before: str) -> int:
+    """
+    Delete the webhook changes received before a time, which a refresh from that time has fetched again
+
+    Args:
+        before: A timestamp in TIMESTAMP_FORMAT, such as the watermark a refresh started from
+
+    Returns:
+        The number of changes deleted
+    """
+    prefix = get_store_updates_prefix(org, repo)
+    keys = [key for key in list_store_updates(s3_client, bucket, org, repo) if key[len(prefix):len(prefix) + 19] < before[:19]]
+    for key in keys:
+        s3_client.delete_object(Bucket=bucket, Key=key)
+    return len(keys)
+
@@ -0,0 +1,106 @@
+import heapq
+from array import array
+from operator import add
+from typing import Dict, Iterable, List, Mapping, Optional
+from models import Contributor
+from constants import SCORE_WEIGHTS
+
+# Count columns, in Contributor field order
+COLUMNS = ('prsMerged', 'prsReviewed', 'issuesOpened', 'discussionsAnswered')
+
+class ContributorTable:
+    """
+    Compact columnar table of contributor counts.
+
+    Each count is a column of unsigned 32-bit integers and users are rows,
+    found through a username-to-index map. Scoring runs column by column
+    and ranking selects the top rows with a heap instead of sorting them all.
+    """
+    def __init__(self):
+        self.usernames: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.columns: Dict[str, array] = {column: array('I') for column in COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self.index
+
+    @classmethod
+    def from_contributors(cls, contributors: Iterable[Contributor]) -> 'ContributorTable':
+        """Build a table from contributor records"""
+        table = cls()
+        for contributor in contributors:
+            table.add(contributor)
+        return table
+
+    def add(self, contributor: Contributor):
+        """Add a contributor record's counts to the user's row"""
+        row = self.row(contributor['username'])
+        for column in COLUMNS:
+            self.columns[column][row] += contributor[column]
+
+    def row(self, username: str) -> int:
+        """Get the row of a user, adding an empty one if needed"""
+        row = self.index.get(username)
+        if row is None:
+            row = len(self.usernames)
+            self.index[username] = row
+            self.usernames.append(username)
+            for values in self.columns.values():
+                values.append(0)
+        return row
+
+    def increment(self, username: str, column: str, amount: int = 1):
+        """Add to one of a user's counts"""
+        self.columns[column][self.row(username)] += amount
+
+    def get(self, username: str, column: str) -> int:
+        """Get one of a user's counts, 0 for unknown users"""
+        row = self.index.get(username)
+        return self.columns[column][row] if row is not None else 0
+
+    def column_dict(self, column: str) -> Dict[str, int]:
+        """Get the non-zero values of a column keyed by username"""
+        return {username: value for username, value in zip(self.usernames, self.columns[column]) if value}
+
+    def scores(self, weights: Optional[Mapping[str, float]] = None) -> array:
+        """
+        Compute every user's weighted score, one column at a time
+
+        Args:
+            weights: Weight of each count column, SCORE_WEIGHTS by default
+        """
+        weights = weights or SCORE_WEIGHTS
+        typecode = 'q' if all(isinstance(weight, int) for weight in weights.values()) else 'd'
+        scores = array(typecode, bytes(array(typecode).itemsize * len(self)))
+
+        for column, weight in weights.items():
+            if weight:
+                scores = array(typecode, map(add, scores, map(weight.__mul__, self.columns[column])))
+        return scores
+
+    def to_contributor(self, row: int, total_score: int) -> Contributor:
+        """Build the contributor record of a row"""
+        contributor: Contributor = {
+            'username': self.usernames[row],
+            'prsMerged': self.columns['prsMerged'][row],
+            'prsReviewed': self.columns['prsReviewed'][row],
+            'issuesOpened': self.columns['issuesOpened'][row],
+            'discussionsAnswered': self.columns['discussionsAnswered'][row],
+            'totalScore': total_score
+        }
+        return contributor
+
+    def top_k(self, k: int, weights: Optional[Mapping[str, float]] = None) -> List[Contributor]:
+        """
+        Get the k highest scoring contributors, highest first
+
+        Ties are broken on the counts in column order, as the frontend does,
+        so published pages agree with its ranking.
+        """
+        scores = self.scores(weights)
+        columns = [self.columns[column] for column in COLUMNS]
+        top_rows = heapq.nlargest(k, range(len(self)), key=lambda row: (scores[row], *(values[row] for values in columns)))
+        return [self.to_contributor(row, scores[row]) for row in top_rows]
@@ -1,86 +1,183 @@
+import datetime
+import json
 import logging
-import requests
-import os
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
 from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional
+from botocore.exceptions import ClientError
 from github_api import GitHubAPI
+from pagination import paginate, DISCUSSIONS_CONNECTION
+from constants import CONTRIBUTIONS_START_DATE
 
 logger = logging.getLogger(__name__)
 
+# Same format as GitHub's timestamps, so they compare as strings
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+class DiscussionIndex:
+    """
+    Persisted answer of every discussion answered since CONTRIBUTIONS_START_DATE.
+
+    Answering a discussion updates it, so once a first scan has built the
+    index, later scans only fetch the discussions updated since its
+    watermark and replace their entries.
+    """
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.watermark: Optional[str] = data.get('watermark')
+        # Discussion number to its answerer and answer date
+        self.answers: Dict[str, Dict[str, str]] = data.get('answers', {})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the index to a JSON-compatible dictionary"""
+        return {
+            'watermark': self.watermark,
+            'answers': self.answers
+        }
+
+    def merge(self, discussion: Dict[str, Any], since: str):
+        """Insert or replace a discussion's answer, dropping it if it lost its answer or was answered before since"""
+        answer = discussion.get('answer') or {}
+        answerer = (answer.get('author') or {}).get('login')
+        key = str(discussion['number'])
+
+        if not answerer or not answer.get('createdAt') or answer['createdAt'] < since:
+            self.answers.pop(key, None)
+            return
+
+        self.answers[key] = {'answerer': answerer, 'answeredAt': answer['createdAt']}
+
 class DiscussionAnalyzer:
-    def __init__(self, github_api: GitHubAPI):
+    def __init__(self, github_api: GitHubAPI, index: Optional[DiscussionIndex] = None):
+        """
+        Args:
+            github_api: The GitHub API client
+            index: Answers found by earlier runs, updated in place by the scan
+        """
         self.github_api = github_api
+        self.index = index or DiscussionIndex()
         self.user_discussions = {}
+        # When each user's answers were posted, keyed by username
+        self.user_answer_dates: Dict[str, List[str]] = {}
         self.is_initialized = False
 
-    def initialize_discussions(self, org: str, repo: str):
-        """Initialize discussion data for the repository"""
+    def initialize_discussions(self, org: str, repo: str, since: str = CONTRIBUTIONS_START_DATE):
+        """
+        Count the discussions every user answered since a date
+
+        Discussions are fetched most recently updated first, and the scan
+        stops at the first one last updated before the index's watermark, or
+        before since when the index is empty, as none further can have an
+        answer the index is missing.
+
+        Args:
+            org: The GitHub organization
+            repo: The repository name
+            since: ISO 8601 date, answers posted earlier are not counted
+        """
         if self.is_initialized:
             return
 
-        transport = RequestsHTTPTransport(
-            url='https://api.github.com/graphql',
-            headers={'Authorization': f'Bearer {self.github_api.token}'}
-        )
-        
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        query = gql("""
-        query($org: String!, $repo: String!, $cursor: String) {
-            repository(owner: $org, name: $repo) {
-                discussions(first: 100, after: $cursor, orderBy: {field: CREATED_AT, direction: DESC}) {
-                    pageInfo {
-                        hasNextPage
-                        endCursor
-                    }
-                    nodes {
-                        number
-                        answer {
-                            author {
-                                login
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        """)
-        
         try:
+            # Taken before fetching, so anything updated during the scan is fetched again next time
+            started_at = datetime.datetime.now(datetime.timezone.utc).strftime(TIMESTAMP_FORMAT)
+            first_scan = self.index.watermark is None
+            updated_since = max(self.index.watermark or since, since)
+
+            # The first scan has nothing to drop, so unanswered discussions are left out
+            for discussion in self.fetch_updated_discussions(org, repo, updated_since, answered_only=first_scan, prefetch=first_scan):
+                self.index.merge(discussion, since)
+            self.index.watermark = started_at
+
             user_discussions = defaultdict(int)
-            has_next_page = True
-            cursor = None
-            total_discussions = 0
-            
-            while has_next_page:
-                result = client.execute(query, variable_values={'org': org, 'repo': repo, 'cursor': cursor})
-                discussions_data = result['repository']['discussions']
-                discussions = discussions_data['nodes']
-                total_discussions += len(discussions)
-                
-                # Process discussions in current page
-                for discussion in discussions:
-                    answer = discussion.get('answer', {})
-                    if answer and answer.get('author'):
-                        username = answer['author']['login']
-                        user_discussions[username] += 1
-                
-                # Update pagination info
-                page_info = discussions_data['pageInfo']
-                has_next_page = page_info['hasNextPage']
-                cursor = page_info['endCursor']
+            user_answer_dates = defaultdict(list)
+            for answer in self.index.answers.values():
+                user_discussions[answer['answerer']] += 1
+                user_answer_dates[answer['answerer']].append(answer['answeredAt'])
 
             self.user_discussions = dict(user_discussions)
+            self.user_answer_dates = dict(user_answer_dates)
             self.is_initialized = True
-            
+
             for username, count in self.user_discussions.items():
                 logger.info(f"User {username} answered {count} discussions")
-                
+
         except Exception as e:
             logger.error(f"Error analyzing discussions: {str(e)}")
             self.user_discussions = {}
+            self.user_answer_dates = {}
             self.is_initialized = False
 
+    def fetch_updated_discussions(self, org: str, repo: str, updated_since: Optional[str] = None,
+                                  answered_only: bool = False, prefetch: bool = False) -> List[Dict[str, Any]]:
+        """
+        Fetch discussions updated since a timestamp, most recently updated first
+
+        Args:
+            org: The GitHub organization
+            repo: The repository name
+            updated_since: ISO 8601 timestamp, or None to fetch every discussion
+            answered_only: Leave out the discussions without an answer
+            prefetch: Request the next page while the current one is read. Only
+                worth it when most pages are read, as the page after the one
+                the scan stops on is requested for nothing
+
+        Returns:
+            Discussion nodes with their number, updatedAt and answer
+        """
+        updated_discussions = []
+        for discussion in self._iter_discussions(org, repo, 'UPDATED_AT', answered_only, prefetch):
+            # Discussions are ordered by updatedAt, so everything after this is older
+            if updated_since and discussion['updatedAt'] < updated_since:
+                break
+            updated_discussions.append(discussion)
+
+        return updated_discussions
+
+    def _iter_discussions(self, org: str, repo: str, order_by: str, answered_only: bool = False, prefetch: bool = False) -> Iterator[Dict[str, Any]]:
+        """Lazily iterate over the repository's discussions, newest first"""
+        return paginate(
+            lambda cursor: self.github_api.get_discussions(org, repo, cursor, order_by, answered_only),
+            DISCUSSIONS_CONNECTION,
+            prefetch=prefetch
+        )
+
+    def restore(self, user_discussions: Dict[str, int], user_answer_dates: Optional[Dict[str, List[str]]] = None):
+        """Restore discussion counts and answer dates from an earlier scan instead of fetching them again"""
+        self.user_discussions = dict(user_discussions)
+        self.user_answer_dates = dict(user_answer_dates or {})
+        self.is_initialized = True
+
     def get_user_discussion_count(self, username: str) -> int:
         """Get the number of discussions answered by a specific user"""
         return self.user_discussions.get(username, 0)
+
+def get_discussion_index_key(org: str, repo: str) -> str:
+    """Get the S3 key of the discussion answer index for a repository"""
+    return f"leaderboard/store/discussions-{org}-{repo}.json"
+
+def load_discussion_index(s3_client: Any, bucket: str, org: str, repo: str) -> DiscussionIndex:
+    """
+    Load the discussion answer index for a repository from S3
+
+    Returns:
+        The stored index, or an empty index if none has been saved yet
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=get_discussion_index_key(org, repo))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            print(f"No discussion index found for {org}/{repo}, scanning every discussion")
+            return DiscussionIndex()
+        raise e
+
+    return DiscussionIndex(json.loads(response['Body'].read().decode('utf-8')))
+
+def save_discussion_index(s3_client: Any, bucket: str, org: str, repo: str, index: DiscussionIndex):
+    """Save the discussion answer index for a repository to S3"""
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=get_discussion_index_key(org, repo),
+        Body=json.dumps(index.to_dict()),
+        ContentType='application/json'
+    )
+    print(f"Saved discussion index to s3://{bucket}/{get_discussion_index_key(org, repo)}")
@@ -1,16 +1,44 @@
 
 import json
-import urllib.request
 import datetime
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from http_transport import HTTPTransport
+from rate_limiter import RateLimitThrottle
+from response_cache import ResponseCache
+from search_query import CompiledSearch, SearchExclusions
+from constants import CONTRIBUTIONS_START_DATE, COUNT_BATCH_SIZE, MAX_COUNT_BATCH_SIZE, MAX_COUNT_BATCH_COST
+
+# GraphQL errors GitHub returns when a query asks for too much, which a smaller query avoids
+QUERY_LIMIT_ERROR_TYPES = {'MAX_NODE_LIMIT_EXCEEDED', 'RESOURCE_LIMITS_EXCEEDED'}
+QUERY_LIMIT_ERROR_MESSAGES = ('complexity', 'exceeds the maximum', 'too large', 'timeout')
+
+def is_query_limit_error(errors: List[Dict[str, Any]]) -> bool:
+    """Check whether GraphQL errors report a query as too large or too costly, rather than failed"""
+    for error in errors:
+        message = (error.get('message') or '').lower()
+        if error.get('type') in QUERY_LIMIT_ERROR_TYPES or any(part in message for part in QUERY_LIMIT_ERROR_MESSAGES):
+            return True
+    return False
 
 class GitHubAPI:
     """
     GitHub API client for fetching contribution data
     """
-    def __init__(self, token: str):
+    def __init__(self, token: str, throttle: Optional[RateLimitThrottle] = None, transport: Optional[HTTPTransport] = None,
+                 cache: Optional[ResponseCache] = None, exclusions: Optional[SearchExclusions] = None,
+                 token_refresher: Optional[Callable[[], str]] = None):
         self.token = token
-        self.api_url = 'https://api.github.com/graphql'
+        # Fetches a new token when GitHub rejects the current one, such as after a rotation
+        self.token_refresher = token_refresher
+        self.api_path = '/graphql'
+        self.throttle = throttle
+        self.transport = transport or HTTPTransport()
+        self.cache = cache
+        # Excluded authors and labels, added to every search
+        self.exclusions = exclusions or SearchExclusions()
+        # Starting and largest users per batched count query, adapted within each call
+        self.count_batch_size = COUNT_BATCH_SIZE
+        self.max_count_batch_size = MAX_COUNT_BATCH_SIZE
 
     def graphql_query(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -23,6 +51,11 @@ class GitHubAPI:
         Returns:
             The JSON response from GitHub
         """
+        if self.cache:
+            cached = self.cache.get(query, variables)
+            if cached is not None:
+                return cached
+
         request_data = json.dumps({
             'query': query,
             'variables': variables
@@ -34,76 +67,126 @@ class GitHubAPI:
             'User-Agent': 'GitHub-Leaderboard-Script',
         }
         
-        request = urllib.request.Request(
-            self.api_url,
-            data=request_data,
-            headers=headers,
-            method='POST'
-        )
-        
-        try:
-            with urllib.request.urlopen(request) as response:
-                return json.loads(response.read().decode('utf-8'))
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode('utf-8')
-            print(f"GitHub API error: {e.code} - {error_body}")
-            raise Exception(f"GitHub API error: {e.code} - {error_body}")
+        if self.throttle:
+            self.throttle.wait()
+
+        response = self.transport.request('POST', self.api_path, request_data, headers)
+        if response.status == 401 and self.token_refresher:
+            print("GitHub rejected the token, fetching it again")
+            self.token = self.token_refresher()
+            headers['Authorization'] = f'Bearer {self.token}'
+            response = self.transport.request('POST', self.api_path, request_data, headers)
+        if self.throttle:
+            self.throttle.update_from_headers(response.headers)
+
+        if response.status >= 400:
+            error_body = response.text()
+            print(f"GitHub API error: {response.status} - {error_body}")
+            raise Exception(f"GitHub API error: {response.status} - {error_body}")
+
+        result = json.loads(response.text())
+        if self.throttle:
+            self.throttle.update_from_rate_limit((result.get('data') or {}).get('rateLimit'))
+        if self.cache:
+            self.cache.set(query, variables, result)
+        return result
 
     def get_contributor_prs(self, org: str, repo: str, username: str, cursor: Optional[str] = None) -> Dict[str, Any]:
         """
         Get merged PRs for a specific contributor
         """
-        query = f"repo:{org}/{repo} author:{username} is:pr is:merged merged:>=2024-01-01"
-        graphql_query = """
-            query($queryString: String!, $cursor: String) {
-              search(query: $queryString, type: ISSUE, first: 100, after: $cursor) {
-                pageInfo {
+        search = self.exclusions.compile(f"repo:{org}/{repo} author:{username} is:pr is:merged merged:>={CONTRIBUTIONS_START_DATE}", single_author=True)
+        return self.search_page(search, 'PullRequest', cursor)
+
+    def get_contributor_reviews(self, org: str, repo: str, username: str, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get PR reviews for a specific contributor
+        """
+        search = self.exclusions.compile(f"repo:{org}/{repo} is:pr is:merged merged:>={CONTRIBUTIONS_START_DATE} reviewed-by:{username}")
+        return self.search_page(search, 'PullRequest', cursor)
+
+    def search_page(self, search: CompiledSearch, node_type: str, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get a page of search results with only their numbers, plus whatever the
+        leftover exclusions need to filter them
+
+        Args:
+            search: The compiled search
+            node_type: PullRequest or Issue
+            cursor: The cursor of the page
+        """
+        graphql_query = f"""
+            query($queryString: String!, $cursor: String) {{
+              search(query: $queryString, type: ISSUE, first: 100, after: $cursor) {{
+                pageInfo {{
                   hasNextPage
                   endCursor
-                }
-                nodes {
-                  ... on PullRequest {
+                }}
+                nodes {{
+                  ... on {node_type} {{
                     number
-                  }
-                }
-              }
-            }
+                    {search.node_fields()}
+                  }}
+                }}
+              }}
+            }}
         """
-        return self.graphql_query(graphql_query, {
-            'queryString': query,
+        return search.filter_response(self.graphql_query(graphql_query, {
+            'queryString': search.query,
             'cursor': cursor
-        })
+        }))
 
-    def get_contributor_reviews(self, org: str, repo: str, username: str, cursor: Optional[str] = None) -> Dict[str, Any]:
+    def merged_prs_query(self, org: str, repo: str, merged: Optional[str] = None, updated_since: Optional[str] = None) -> CompiledSearch:
         """
-        Get PR reviews for a specific contributor
+        Build the search for merged PRs, leaving out excluded authors and labels
+
+        Args:
+            merged: Range for the merged: qualifier, every PR since CONTRIBUTIONS_START_DATE by default
+            updated_since: Only match PRs updated since this timestamp, keeping
+                the excluded ones so a PR relabelled into an exclusion
+                replaces its stored record, which is then left out when counting
+        """
+        query = f"repo:{org}/{repo} is:pr is:merged merged:{merged or f'>={CONTRIBUTIONS_START_DATE}'}"
+        if updated_since:
+            return CompiledSearch(f"{query} updated:>={updated_since}")
+        return self.exclusions.compile(query)
+
+    def issues_query(self, org: str, repo: str, created: Optional[str] = None, updated_since: Optional[str] = None) -> CompiledSearch:
+        """
+        Build the search for opened issues, leaving out excluded authors and labels
+
+        Args:
+            created: Range for the created: qualifier, every issue since CONTRIBUTIONS_START_DATE by default
+            updated_since: Only match issues updated since this timestamp,
+                keeping the excluded ones as merged_prs_query does
+        """
+        query = f"repo:{org}/{repo} is:issue created:{created or f'>={CONTRIBUTIONS_START_DATE}'}"
+        if updated_since:
+            return CompiledSearch(f"{query} updated:>={updated_since}")
+        return self.exclusions.compile(query)
+
+    def get_search_count(self, query: str) -> int:
+        """
+        Get the total number of results for a search query, without fetching any
         """
-        query = f"repo:{org}/{repo} is:pr is:merged merged:>=2024-01-01 reviewed-by:{username}"
         graphql_query = """
-            query($queryString: String!, $cursor: String) {
-              search(query: $queryString, type: ISSUE, first: 100, after: $cursor) {
-                pageInfo {
-                  hasNextPage
-                  endCursor
-                }
-                nodes {
-                  ... on PullRequest {
-                    number
-                  }
-                }
+            query($queryString: String!) {
+              search(query: $queryString, type: ISSUE, first: 1) {
+                issueCount
               }
             }
         """
-        return self.graphql_query(graphql_query, {
-            'queryString': query,
-            'cursor': cursor
-        })
+        response = self.graphql_query(graphql_query, {'queryString': query})
+        if response.get('errors'):
+            raise Exception(f"GitHub API error: {response['errors']}")
+        return response['data']['search']['issueCount']
 
-    def get_all_contributors(self, org: str, repo: str, cursor: Optional[str] = None) -> Dict[str, Any]:
+    def get_all_contributors(self, org: str, repo: str, cursor: Optional[str] = None, updated_since: Optional[str] = None, merged: Optional[str] = None) -> Dict[str, Any]:
         """
-        Get all contributors to the repository
+        Get all contributors to the repository, optionally only from PRs updated since a
+        timestamp or merged within a range
         """
-        query = f"repo:{org}/{repo} is:pr is:merged merged:>=2024-01-01"
+        search = self.merged_prs_query(org, repo, merged, updated_since)
         graphql_query = """
             query($queryString: String!, $cursor: String) {
               search(query: $queryString, type: ISSUE, first: 100, after: $cursor) {
@@ -113,10 +196,22 @@ class GitHubAPI:
                 }
                 nodes {
                   ... on PullRequest {
+                    number
+                    mergedAt
+                    updatedAt
                     author {
                       login
                     }
+                    labels(first: 20) {
+                      nodes {
+                        name
+                      }
+                    }
                     reviews(first: 10) {
+                      pageInfo {
+                        hasNextPage
+                        endCursor
+                      }
                       nodes {
                         author {
                           login
@@ -128,16 +223,46 @@ class GitHubAPI:
               }
             }
         """
-        return self.graphql_query(graphql_query, {
-            'queryString': query,
+        return search.filter_response(self.graphql_query(graphql_query, {
+            'queryString': search.query,
             'cursor': cursor
-        })
+        }))
+
+    def get_pull_request_reviews_batch(self, org: str, repo: str, pages: List[Tuple[int, Optional[str]]]) -> Dict[str, Any]:
+        """
+        Get the next page of reviews for several PRs in one request
 
-    def get_issues_contributors(self, org: str, repo: str, cursor: Optional[str] = None) -> Dict[str, Any]:
+        Args:
+            pages: (PR number, reviews cursor) pairs, each answered under the alias pr<index>
+        """
+        declarations = ['$org: String!', '$repo: String!']
+        fields = []
+        variables: Dict[str, Any] = {'org': org, 'repo': repo}
+        for i, (number, cursor) in enumerate(pages):
+            declarations.append(f"$number{i}: Int!")
+            declarations.append(f"$after{i}: String")
+            fields.append(
+                f"pr{i}: pullRequest(number: $number{i}) {{ reviews(first: 100, after: $after{i}) "
+                f"{{ pageInfo {{ hasNextPage endCursor }} nodes {{ author {{ login }} }} }} }}"
+            )
+            variables[f"number{i}"] = number
+            variables[f"after{i}"] = cursor
+
+        graphql_query = f"""
+            query({', '.join(declarations)}) {{
+              repository(owner: $org, name: $repo) {{
+                {' '.join(fields)}
+              }}
+            }}
         """
-        Get all contributors to the repository
+        return self.graphql_query(graphql_query, variables)
+
+    def get_issues_contributors(self, org: str, repo: str, cursor: Optional[str] = None, updated_since: Optional[str] = None, created: Optional[str] = None) -> Dict[str, Any]:
         """
-        query = f"repo:{org}/{repo} is:issue created:>=2024-01-01"
+        Get all contributors to the repository, optionally only from issues updated since a
+        timestamp or created within a range
+        """
+        search = self.issues_query(org, repo, created, updated_since)
         graphql_query = """
             query($queryString: String!, $cursor: String) {
               search(query: $queryString, type: ISSUE, first: 100, after: $cursor) {
@@ -150,47 +275,156 @@ class GitHubAPI:
                     number
                     title
                     createdAt
+                    updatedAt
                     author {
                       login
                     }
                     state
+                    labels(first: 20) {
+                      nodes {
+                        name
+                      }
+                    }
                   }
                 }
               }
             }
         """
-        return self.graphql_query(graphql_query, {
-            'queryString': query,
+        return search.filter_response(self.graphql_query(graphql_query, {
+            'queryString': search.query,
             'cursor': cursor
-        })   
+        }))   
 
     def get_issues_opened(self, org: str, repo: str, username: str, cursor: Optional[str] = None) -> Dict[str, Any]:
         """
         Get all issues opened in the last year
         """
-        query = f"repo:{org}/{repo} is:issue created:>=2024-01-01 author:{username}"
-        graphql_query = """
-            query($queryString: String!, $cursor: String) {
-              search(query: $queryString, type: ISSUE, first: 100, after: $cursor) {
-                pageInfo {
-                  hasNextPage
-                  endCursor
-                }
-                nodes {
-                  ... on Issue {
+        search = self.exclusions.compile(f"repo:{org}/{repo} is:issue created:>={CONTRIBUTIONS_START_DATE} author:{username}", single_author=True)
+        return self.search_page(search, 'Issue', cursor)
+
+    def get_discussions(self, org: str, repo: str, cursor: Optional[str] = None, order_by: str = 'CREATED_AT',
+                        answered_only: bool = False) -> Dict[str, Any]:
+        """
+        Get a page of the repository's discussions with their answers' authors and dates, newest first
+
+        Args:
+            order_by: The DiscussionOrderField to sort by, CREATED_AT or UPDATED_AT
+            answered_only: Leave out the discussions without an answer
+        """
+        answered = ', answered: true' if answered_only else ''
+        graphql_query = f"""
+            query($org: String!, $repo: String!, $cursor: String, $orderBy: DiscussionOrderField!) {{
+              repository(owner: $org, name: $repo) {{
+                discussions(first: 100, after: $cursor, orderBy: {{field: $orderBy, direction: DESC}}{answered}) {{
+                  pageInfo {{
+                    hasNextPage
+                    endCursor
+                  }}
+                  nodes {{
                     number
-                    title
-                    createdAt
-                    author {
-                      login
-                    }
-                    state
-                  }
-                }
-              }
-            }
+                    updatedAt
+                    answer {{
+                      createdAt
+                      author {{
+                        login
+                      }}
+                    }}
+                  }}
+                }}
+              }}
+            }}
         """
         return self.graphql_query(graphql_query, {
-            'queryString': query,
-            'cursor': cursor
-        })
\ No newline at end of file
+            'org': org,
+            'repo': repo,
+            'cursor': cursor,
+            'orderBy': order_by
+        })
+
+    def get_contributor_counts_batch(self, org: str, repo: str, usernames: List[str]) -> Dict[str, Any]:
+        """
+        Get merged PR, review and issue counts for several contributors in one request
+
+        Every user gets three aliased searches that only ask for issueCount, so
+        no result nodes are transferred. Counts can only leave out the
+        exclusions that fit in the search queries.
+        """
+        searches = {
+            'prs': (f"repo:{org}/{repo} is:pr is:merged merged:>={CONTRIBUTIONS_START_DATE} author:{{username}}", True),
+            'reviews': (f"repo:{org}/{repo} is:pr is:merged merged:>={CONTRIBUTIONS_START_DATE} reviewed-by:{{username}}", False),
+            'issues': (f"repo:{org}/{repo} is:issue created:>={CONTRIBUTIONS_START_DATE} author:{{username}}", True)
+        }
+
+        declarations = []
+        fields = []
+        variables = {}
+        for i, username in enumerate(usernames):
+            for kind, (search, single_author) in searches.items():
+                name = f"{kind}{i}"
+                declarations.append(f"${name}: String!")
+                fields.append(f"{name}: search(query: ${name}, type: ISSUE, first: 1) {{ issueCount }}")
+                variables[name] = self.exclusions.compile(search.format(username=username), single_author).query
+
+        graphql_query = f"""
+            query({', '.join(declarations)}) {{
+              rateLimit {{
+                cost
+                remaining
+                resetAt
+              }}
+              {' '.join(fields)}
+            }}
+        """
+        return self.graphql_query(graphql_query, variables)
+
+    def get_contributor_counts(self, org: str, repo: str, usernames: List[str]) -> Dict[str, Dict[str, int]]:
+        """
+        Get merged PR, review and issue counts for many contributors, batching users per request
+
+        The batch size adapts to GitHub's limits: it is halved when GitHub reports
+        a batch as too large or too complex, or when one costs more than
+        MAX_COUNT_BATCH_COST points, and doubled when it is cheap, up to the
+        largest size that has not failed yet. The size is local to the call, so
+        concurrent shards do not shrink each other's batches.
+
+        Returns:
+            Counts keyed by username, each with prsMerged, prsReviewed and issuesOpened
+
+        Raises:
+            Exception: On any other error, such as a server error that outlasted the transport's retries
+        """
+        counts: Dict[str, Dict[str, int]] = {}
+        batch_size = self.count_batch_size
+        max_batch_size = self.max_count_batch_size
+        start = 0
+
+        while start < len(usernames):
+            batch = usernames[start:start + batch_size]
+            response = self.get_contributor_counts_batch(org, repo, batch)
+
+            errors = response.get('errors')
+            if errors:
+                if len(batch) == 1 or not is_query_limit_error(errors):
+                    raise Exception(f"GitHub API error fetching counts for {len(batch)} users: {errors}")
+                # Never grow back to a size that has already failed
+                max_batch_size = len(batch) - 1
+                batch_size = max(len(batch) // 2, 1)
+                print(f"Batch of {len(batch)} users was too large, retrying with {batch_size}: {errors}")
+                continue
+
+            data = response['data']
+            for i, username in enumerate(batch):
+                counts[username] = {
+                    'prsMerged': data[f"prs{i}"]['issueCount'],
+                    'prsReviewed': data[f"reviews{i}"]['issueCount'],
+                    'issuesOpened': data[f"issues{i}"]['issueCount']
+                }
+            start += len(batch)
+
+            cost = (data.get('rateLimit') or {}).get('cost', 0)
+            if cost > MAX_COUNT_BATCH_COST and len(batch) > 1:
+                batch_size = max(len(batch) // 2, 1)
+            elif cost * 2 <= MAX_COUNT_BATCH_COST and len(batch) == batch_size:
+                batch_size = min(batch_size * 2, max_batch_size)
+
+        return counts
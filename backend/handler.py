@@ -1,220 +1,522 @@
 import json
 import os
 import datetime
-from models import Contributor
-from typing import Dict, List, Optional, TypedDict, Any, Set
-import boto3
-from botocore.exceptions import ClientError
+from models import Contributor, ShardTask
+from typing import Dict, List, Optional, Tuple, TypedDict, Any, Set, Union
+from concurrent.futures import ThreadPoolExecutor
+from aws_clients import get_client, get_secret
 from github_api import GitHubAPI
-from discussion_analyzer import DiscussionAnalyzer
-from constants import AUTHORS_TO_EXCLUDE
+from rate_limiter import RateLimitThrottle
+from response_cache import create_response_cache
+from pagination import paginate, count_nodes, SEARCH_CONNECTION
+from discussion_analyzer import DiscussionAnalyzer, DiscussionIndex, load_discussion_index, save_discussion_index
+from contribution_aggregator import ContributionAggregator
+from search_sharding import ShardedSearch
+from contribution_store import ContributionStore, get_store_key, load_contribution_store_version, save_contribution_store_if_unchanged, delete_store_updates
+from sharded_runner import ShardedRunner, LocalShardExecutor, LambdaShardExecutor, InMemoryPartialStore, S3PartialStore
+from rest_api import GitHubRestAPI, load_etag_store, save_etag_store
+from contributor_table import ContributorTable
+from time_windows import ActivityIndex, leaderboard_windows, get_window_leaderboard_key
+from leaderboard_pages import publish_leaderboard_pages
+from publisher import Publisher, load_json, archive_leaderboard, summarize_changes, save_publish_report
+from rank_history import S3ObjectStore, compact_history, publish_rank_history
+from metrics import PipelineMetrics, create_metrics_sink, SECRET_FETCH_PHASE, DISCOVERY_PHASE, DISCUSSION_SCAN_PHASE, PER_USER_FETCH_PHASE, RANKING_PHASE, UPLOAD_PHASE
+from multi_repo import parse_repositories, repository_name, process_repositories, merge_repository_contributors
+from checkpoint import Deadline, DeadlineExceeded, RunCheckpoint, get_checkpoint_key, load_checkpoint, save_checkpoint, delete_checkpoint
+from constants import AUTHORS_TO_EXCLUDE, AGGREGATE_MODE, PER_USER_MODE, INCREMENTAL_MODE, BATCHED_MODE, DEFAULT_MAX_WORKERS, CHECKPOINT_CHUNK_SIZE, SCORE_WEIGHTS, LEADERBOARD_SIZE, REPOSITORY_WORKERS, SHARD_INVOKE_READ_TIMEOUT_SECONDS
 
-def get_github_token() -> str:
+# Mode, repositories and score weights of the last run that published the leaderboard
+RUN_SETTINGS_KEY = 'leaderboard/run-settings.json'
+
+def get_github_token(refresh: bool = False) -> str:
     """
     Retrieve GitHub token from AWS Secrets Manager using the secret ARN
-    
+
+    Args:
+        refresh: Fetch it again instead of reusing the copy cached by an earlier invocation
+
     Returns:
         The GitHub token string
     """
-    secret_arn = os.environ.get('GITHUB_TOKEN_SECRET_ARN')
-    if not secret_arn:
-        raise ValueError("GITHUB_TOKEN_SECRET_ARN environment variable is not set")
-
-    region_name = os.environ.get('AWS_REGION')
-    if not region_name:
-        raise ValueError("AWS_REGION environment variable is not set")
-
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region_name,
-         # Disable SSL verification for local testing
-         #TODO: Remove later after testing
-        verify=False
-    )
+    return get_secret('GITHUB_TOKEN_SECRET_ARN', refresh)
 
-    try:
-        get_secret_value_response = client.get_secret_value(
-            SecretId=secret_arn
-        )
-        return get_secret_value_response['SecretString']
-    except ClientError as e:
-        print(f"Error retrieving secret: {str(e)}")
-        raise e
-
-def calculate_score(contributor: Contributor) -> int:
+def calculate_score(contributor: Contributor, weights: Dict[str, float] = SCORE_WEIGHTS) -> int:
     """
     Calculate the score for a contributor
     """
-    return contributor['prsMerged'] * 10 + contributor['prsReviewed'] * 8 + contributor['issuesOpened'] * 5 + contributor['discussionsAnswered'] * 3
+    return sum(contributor[column] * weight for column, weight in weights.items())
+
+# Set lookup for the users dropped from the leaderboard, such as reviewers who are excluded authors
+EXCLUDED_AUTHORS = frozenset(AUTHORS_TO_EXCLUDE)
 
 def is_author_to_exclude(username: str) -> bool:
     """
     Check if a username belongs to an author that should be excluded
     """
-    return username in AUTHORS_TO_EXCLUDE
+    return username in EXCLUDED_AUTHORS
 
 def fetch_all_contributors(github_api: GitHubAPI, org: str, repo: str) -> Set[str]:
     """
     Fetch all contributors with pagination
     """
-    pr_contributors = set()
-    has_next_page = True
-    cursor = None
-    
-    while has_next_page:
-        response = github_api.get_all_contributors(org, repo, cursor)
-        search_data = response.get('data', {}).get('search', {})
-        
-        for pr in search_data.get('nodes', []):
-            if pr.get('author', {}).get('login'):
-                pr_contributors.add(pr['author']['login'])
-            
-            for review in pr.get('reviews', {}).get('nodes', []):
-                if review.get('author', {}).get('login'):
-                    pr_contributors.add(review['author']['login'])
-
-        page_info = search_data.get('pageInfo', {})
-        has_next_page = page_info.get('hasNextPage', False)
-        cursor = page_info.get('endCursor')            
-
-    #Get the contributors for issues
-    issue_contributors = set()
-    has_next_page = True
-    cursor = None
-    while has_next_page:
-        response = github_api.get_issues_contributors(org, repo, cursor)
-        search_data = response.get('data', {}).get('search', {})
-
-        for issue in search_data.get('nodes', []):
-            author = issue.get('author')
-            if author and author.get('login'):
-                issue_contributors.add(issue['author']['login'])
-
-        page_info = search_data.get('pageInfo', {})
-        has_next_page = page_info.get('hasNextPage', False)
-        cursor = page_info.get('endCursor')
-    
-    contributors = pr_contributors.union(issue_contributors)
-    return contributors
+    aggregator = ContributionAggregator(github_api)
+    aggregator.initialize_contributions(org, repo)
+    return aggregator.get_contributors()
+
+def build_contributor(username: str, prs_merged: int, prs_reviewed: int, issues_opened: int, discussions_answered: int) -> Contributor:
+    """
+    Build a scored contributor record from its raw counts
+    """
+    contributor: Contributor = {
+        'username': username,
+        'prsMerged': prs_merged,
+        'prsReviewed': prs_reviewed,
+        'issuesOpened': issues_opened,
+        'discussionsAnswered': discussions_answered,
+        'totalScore': 0
+    }
+
+    contributor['totalScore'] = calculate_score(contributor)
+    return contributor
 
 def fetch_contributions_data(github_api: GitHubAPI, org: str, repo: str, username: str, discussion_analyzer: DiscussionAnalyzer) -> Contributor:
     """
     Fetch contributions data for a specific user
     """
     # Get merged PRs count
-    merged_count = 0
-    has_next_page = True
-    cursor = None
-    
-    while has_next_page:
-        response = github_api.get_contributor_prs(org, repo, username, cursor)
-        search_data = response.get('data', {}).get('search', {})
-        merged_count += len(search_data.get('nodes', []))
-        
-        page_info = search_data.get('pageInfo', {})
-        has_next_page = page_info.get('hasNextPage', False)
-        cursor = page_info.get('endCursor')
+    merged_count = count_nodes(paginate(
+        lambda cursor: github_api.get_contributor_prs(org, repo, username, cursor),
+        SEARCH_CONNECTION
+    ))
 
     # Get reviews count
-    review_count = 0
-    has_next_page = True
-    cursor = None
-    
-    while has_next_page:
-        response = github_api.get_contributor_reviews(org, repo, username, cursor)
-        search_data = response.get('data', {}).get('search', {})
-        review_count += len(search_data.get('nodes', []))
-        
-        page_info = search_data.get('pageInfo', {})
-        has_next_page = page_info.get('hasNextPage', False)
-        cursor = page_info.get('endCursor')
+    review_count = count_nodes(paginate(
+        lambda cursor: github_api.get_contributor_reviews(org, repo, username, cursor),
+        SEARCH_CONNECTION
+    ))
 
     # Get opened issues count
-    issues_opened = 0
-    has_next_page = True
-    cursor = None 
+    issues_opened = count_nodes(paginate(
+        lambda cursor: github_api.get_issues_opened(org, repo, username, cursor),
+        SEARCH_CONNECTION
+    ))
 
-    while has_next_page:
-        response = github_api.get_issues_opened(org, repo, username, cursor)
-        search_data = response.get('data', {}).get('search', {})
-        issues_opened += len(search_data.get('nodes', []))
+    # Get discussions data
+    discussions_answered = discussion_analyzer.get_user_discussion_count(username)
 
-        page_info = search_data.get('pageInfo', {})
-        has_next_page = page_info.get('hasNextPage', False)
-        cursor = page_info.get('endCursor')
+    return build_contributor(username, merged_count, review_count, issues_opened, discussions_answered)
 
+def aggregate_contributions_data(aggregator: Union[ContributionAggregator, ContributionStore], username: str, discussion_analyzer: Union[DiscussionAnalyzer, ContributionStore]) -> Contributor:
+    """
+    Build contributions data for a specific user from the single-pass aggregation or the contribution store
+    """
+    return build_contributor(
+        username,
+        aggregator.get_user_pr_count(username),
+        aggregator.get_user_review_count(username),
+        aggregator.get_user_issue_count(username),
+        discussion_analyzer.get_user_discussion_count(username)
+    )
 
-    # Get discussions data
-    discussions_answered = discussion_analyzer.get_user_discussion_count(username)
+def fetch_contributions_concurrently(github_api: GitHubAPI, org: str, repo: str, usernames: List[str], discussion_analyzer: DiscussionAnalyzer, max_workers: int) -> List[Contributor]:
+    """
+    Fetch contributions data for several users on a bounded worker pool
 
-    contributor: Contributor = {
-        'username': username,
-        'prsMerged': merged_count,
-        'prsReviewed': review_count,
-        'issuesOpened': issues_opened,
-        'discussionsAnswered': discussions_answered,
-        'totalScore': 0
-    }
-    
-    contributor['totalScore'] = calculate_score(contributor)
-    return contributor
+    Args:
+        github_api: The GitHub API client, shared by all workers
+        org: The GitHub organization
+        repo: The repository name
+        usernames: The users to fetch, in the order results should be returned
+        discussion_analyzer: An initialized discussion analyzer
+        max_workers: Maximum number of users fetched at the same time
+
+    Returns:
+        One contributor record per username, in the same order as usernames
+    """
+    def fetch(username: str) -> Contributor:
+        return fetch_contributions_data(github_api, org, repo, username, discussion_analyzer)
+
+    if max_workers <= 1:
+        return [fetch(username) for username in usernames]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fetch, usernames))
+
+def fetch_contributions_batched(github_api: GitHubAPI, org: str, repo: str, usernames: List[str], discussion_analyzer: DiscussionAnalyzer) -> List[Contributor]:
+    """
+    Fetch contributions data for several users with batched count queries
+
+    Returns:
+        One contributor record per username, in the same order as usernames
+    """
+    counts = github_api.get_contributor_counts(org, repo, usernames)
+    return [
+        build_contributor(
+            username,
+            counts[username]['prsMerged'],
+            counts[username]['prsReviewed'],
+            counts[username]['issuesOpened'],
+            discussion_analyzer.get_user_discussion_count(username)
+        )
+        for username in usernames
+    ]
 
-def process_contributions(github_api: GitHubAPI, org: str, repo: str) -> Dict[str, Contributor]:
+def process_shard(github_api: GitHubAPI, task: ShardTask) -> Dict[str, Contributor]:
+    """
+    Fetch contributions data for the users of one shard
+
+    Returns:
+        Contributor records keyed by username
+    """
+    discussion_analyzer = DiscussionAnalyzer(github_api)
+    discussion_analyzer.restore(task['discussionCounts'])
+
+    if task['mode'] == BATCHED_MODE:
+        fetched = fetch_contributions_batched(github_api, task['org'], task['repo'], task['usernames'], discussion_analyzer)
+    else:
+        fetched = fetch_contributions_concurrently(github_api, task['org'], task['repo'], task['usernames'], discussion_analyzer, task['maxWorkers'])
+
+    return {contributor['username']: contributor for contributor in fetched}
+
+def create_sharded_runner(github_api: GitHubAPI, shard_count: int, run_id: str, s3_client: Any, bucket: str) -> ShardedRunner:
+    """
+    Create a runner that fans shards out to the worker Lambda when one is
+    configured, and to in-process workers otherwise
+    """
+    worker_function = os.environ.get('SHARD_WORKER_FUNCTION_NAME')
+    if worker_function:
+        partial_store = S3PartialStore(s3_client, bucket)
+        # A shard runs for minutes: wait for it instead of timing out and invoking it again, and
+        # keep a connection for every invocation in flight rather than queueing behind the default pool of 10
+        lambda_client = get_client('lambda', read_timeout=SHARD_INVOKE_READ_TIMEOUT_SECONDS, connect_timeout=10,
+                                   retries={'max_attempts': 0}, max_pool_connections=max(shard_count, 10))
+        executor = LambdaShardExecutor(worker_function, lambda_client, shard_count)
+    else:
+        partial_store = InMemoryPartialStore()
+        executor = LocalShardExecutor(lambda task: process_shard(github_api, task), partial_store)
+    return ShardedRunner(executor, partial_store, shard_count, run_id)
+
+def process_contributions(github_api: GitHubAPI, org: str, repo: str, mode: str = AGGREGATE_MODE, max_workers: int = 1,
+                          store: Optional[ContributionStore] = None, checkpoint: Optional[RunCheckpoint] = None,
+                          deadline: Optional[Deadline] = None, sharded_runner: Optional[ShardedRunner] = None,
+                          rest_api: Optional[GitHubRestAPI] = None, activity: Optional[ActivityIndex] = None,
+                          metrics: Optional[PipelineMetrics] = None, discussion_index: Optional[DiscussionIndex] = None,
+                          search: Optional[ShardedSearch] = None) -> Dict[str, Contributor]:
     """
     Process contributions for all contributors, excluding specific authors
+
+    Args:
+        github_api: The GitHub API client
+        org: The GitHub organization
+        repo: The repository name
+        mode: AGGREGATE_MODE derives every user's counts from one scan of the
+            repository, PER_USER_MODE runs separate searches for each user,
+            BATCHED_MODE packs many users' count searches into each request and
+            INCREMENTAL_MODE only fetches what changed since the store's last run
+        max_workers: Number of users fetched concurrently in PER_USER_MODE
+        store: The contribution store to refresh, required in INCREMENTAL_MODE
+        checkpoint: Progress of an earlier invocation to resume from, updated as the run goes
+        deadline: When set, DeadlineExceeded is raised once the time budget runs
+            low, with all progress so far recorded in the checkpoint
+        sharded_runner: Fans PER_USER_MODE and BATCHED_MODE fetching out to shard workers
+        rest_api: REST client with conditional requests, used by the store in INCREMENTAL_MODE
+        activity: When set, receives the dated contributions of every active
+            contributor, from the same scans, for the windowed leaderboards
+        metrics: Records a timing span for each phase
+        discussion_index: Discussion answers found by earlier runs, so the
+            discussion scan only fetches recently updated discussions
+        search: Runs the discovery and refresh searches, a ShardedSearch of github_api by default
     """
+    if mode not in (AGGREGATE_MODE, PER_USER_MODE, INCREMENTAL_MODE, BATCHED_MODE):
+        raise ValueError(f"Unknown processing mode: {mode}")
+    if mode == INCREMENTAL_MODE and store is None:
+        raise ValueError("A contribution store is required in incremental mode")
+
+    checkpoint = checkpoint or RunCheckpoint()
+    deadline = deadline or Deadline(None)
+    metrics = metrics or PipelineMetrics()
+    repository = f"{org}/{repo}"
     active_contributors: Dict[str, Contributor] = {}
-    
-    print(f"Fetching contributors for {org}/{repo}")
-    potential_contributors = fetch_all_contributors(github_api, org, repo)
+    discussion_analyzer = DiscussionAnalyzer(github_api, discussion_index)
+
+    if mode == INCREMENTAL_MODE:
+        if checkpoint.refresh is not None:
+            print(f"Resuming the refresh of {org}/{repo} at its {checkpoint.refresh['step']} step")
+            store.progress = checkpoint.refresh
+        else:
+            print(f"Fetching contributions for {org}/{repo} updated since {store.watermark or 'the beginning'}")
+        # The store refreshes PRs, issues and discussions together
+        with metrics.span(DISCOVERY_PHASE, Repository=repository):
+            try:
+                store.refresh(github_api, discussion_analyzer, org, repo, rest_api, deadline, search)
+            except DeadlineExceeded:
+                # The items merged so far are saved with the store, the rest resumed from the next page
+                checkpoint.refresh = store.progress
+                raise
+        checkpoint.refresh = None
+        potential_contributors = store.get_contributors()
+    else:
+        aggregator = ContributionAggregator(github_api, search)
+        if checkpoint.aggregation is not None:
+            aggregator.restore(checkpoint.aggregation)
+        else:
+            if checkpoint.discovery is not None:
+                print(f"Resuming the contributor discovery of {org}/{repo}")
+                aggregator.restore(checkpoint.discovery)
+            else:
+                print(f"Fetching contributors for {org}/{repo}")
+            with metrics.span(DISCOVERY_PHASE, Repository=repository):
+                try:
+                    aggregator.initialize_contributions(org, repo, deadline)
+                except DeadlineExceeded:
+                    # The counts of the pages scanned so far, resumed from the next page
+                    checkpoint.discovery = aggregator.to_dict()
+                    raise
+            checkpoint.discovery = None
+            checkpoint.aggregation = aggregator.to_dict()
+            deadline.check('contributor discovery')
+        potential_contributors = aggregator.get_contributors()
+
+        if checkpoint.discussion_counts is not None:
+            discussion_analyzer.restore(checkpoint.discussion_counts, checkpoint.discussion_answer_dates)
+        else:
+            with metrics.span(DISCUSSION_SCAN_PHASE, Repository=repository):
+                discussion_analyzer.initialize_discussions(org, repo)
+            checkpoint.discussion_answer_dates = discussion_analyzer.user_answer_dates
+            checkpoint.discussion_counts = discussion_analyzer.user_discussions
+            deadline.check('discussion scan')
+
     print(f"Found {len(potential_contributors)} total potential contributors")
 
-    discussion_analyzer = DiscussionAnalyzer(github_api)
-    discussion_analyzer.initialize_discussions(org, repo)
-    
-    for i, username in enumerate(potential_contributors, 1):
+    usernames = []
+    for username in sorted(potential_contributors):
         if is_author_to_exclude(username):
             print(f"Skipped {username} (excluded author)")
             continue
-            
-        print(f"Processing contributor {i}/{len(potential_contributors)}: {username}")
-        contributor = fetch_contributions_data(github_api, org, repo, username, discussion_analyzer)
+        usernames.append(username)
+
+    if mode == INCREMENTAL_MODE:
+        contributors = [aggregate_contributions_data(store, username, store) for username in usernames]
+    elif mode == AGGREGATE_MODE:
+        contributors = [aggregate_contributions_data(aggregator, username, discussion_analyzer) for username in usernames]
+    elif sharded_runner is not None:
+        with metrics.span(PER_USER_FETCH_PHASE, Repository=repository, Contributors=len(usernames)):
+            merged = sharded_runner.run(org, repo, mode, usernames, discussion_analyzer.user_discussions, max_workers)
+        contributors = [merged[username] for username in usernames]
+    else:
+        pending = checkpoint.pending(usernames)
+        if len(pending) < len(usernames):
+            print(f"Resuming with {len(pending)} of {len(usernames)} contributors left to fetch")
+
+        # Fetch in chunks so progress can be saved between them
+        for start in range(0, len(pending), CHECKPOINT_CHUNK_SIZE):
+            chunk = pending[start:start + CHECKPOINT_CHUNK_SIZE]
+            # One span per chunk, so a run cut short by the deadline still reports its progress
+            with metrics.span(PER_USER_FETCH_PHASE, Repository=repository, Contributors=len(chunk)):
+                if mode == BATCHED_MODE:
+                    fetched = fetch_contributions_batched(github_api, org, repo, chunk, discussion_analyzer)
+                else:
+                    fetched = fetch_contributions_concurrently(github_api, org, repo, chunk, discussion_analyzer, max_workers)
+
+            for contributor in fetched:
+                checkpoint.processed[contributor['username']] = contributor
+            if start + CHECKPOINT_CHUNK_SIZE < len(pending):
+                deadline.check(f"{len(checkpoint.processed)} contributors")
+
+        contributors = [checkpoint.processed[username] for username in usernames]
+
+    for i, contributor in enumerate(contributors, 1):
+        username = contributor['username']
+        print(f"Processed contributor {i}/{len(usernames)}: {username}")
         
         if contributor['prsMerged'] > 0 or contributor['prsReviewed'] > 0 or contributor['issuesOpened'] > 0 or contributor['discussionsAnswered'] > 0:
             active_contributors[username] = contributor
             print(f"Added {username} with {contributor['prsMerged']} PRs merged, {contributor['prsReviewed']} PRs reviewed, {contributor['issuesOpened']} issues opened ,{contributor['discussionsAnswered']} Discussions Answered")
     
+    if activity is not None:
+        if mode == INCREMENTAL_MODE:
+            activity.merge(store.activity, active_contributors)
+        else:
+            # The discovery scan runs in every other mode, so its dates are there even when counts come from searches
+            activity.merge(aggregator.activity, active_contributors)
+            for username, answer_dates in discussion_analyzer.user_answer_dates.items():
+                if username in active_contributors:
+                    for answered_at in answer_dates:
+                        activity.add(username, 'discussionsAnswered', answered_at)
+
     print(f"\nSummary:")
     print(f"Total potential contributors: {len(potential_contributors)}")
     print(f"Active contributors: {len(active_contributors)}")
     return active_contributors
 
-def upload_to_s3(data: dict, bucket: str, key: str) -> bool:
+def run_repository(github_api: GitHubAPI, github_token: str, org: str, repo: str, mode: str, max_workers: int, shard_count: int,
+                   run_id: str, checkpoint: RunCheckpoint, deadline: Deadline, s3_client: Any, bucket: str,
+                   activity: Optional[ActivityIndex] = None, metrics: Optional[PipelineMetrics] = None) -> Dict[str, Contributor]:
     """
-    Upload JSON data to S3 bucket
-    
-    Args:
-        data: Dictionary containing the leaderboard data
-        bucket: S3 bucket name
-        key: S3 object key (path/filename)
-        
+    Process one repository's contributions, loading and saving its stores around the run
+
     Returns:
-        bool: True if upload was successful, False otherwise
+        The repository's active contributors, keyed by username
     """
+    store = None
+    store_etag = None
+    rest_api = None
+    discussion_index = None
+    if mode == INCREMENTAL_MODE:
+        store, store_etag = load_contribution_store_version(s3_client, bucket, org, repo)
+        rest_api = GitHubRestAPI(github_token, load_etag_store(s3_client, bucket, org, repo), github_api.throttle, github_api.transport,
+                                 github_api.token_refresher)
+    else:
+        # The store keeps discussion answers itself in incremental mode
+        discussion_index = load_discussion_index(s3_client, bucket, org, repo)
+
+    sharded_runner = None
+    if shard_count > 1:
+        sharded_runner = create_sharded_runner(github_api, shard_count, run_id, s3_client, bucket)
+
+    # The watermark the refresh starts from, a resumed refresh keeps it until it finishes
+    refreshed_since = store.watermark if store is not None else None
     try:
-        s3_client = boto3.client('s3')
-        s3_client.put_object(
-            Bucket=bucket,
-            Key=key,
-            Body=json.dumps(data, default=str),
-            ContentType='application/json'
-        )
-        print(f"Successfully uploaded leaderboard data to s3://{bucket}/{key}")
-        return True
-    except ClientError as e:
-        print(f"Error uploading to S3: {str(e)}")
-        return False    
+        contributors = process_contributions(github_api, org, repo, mode, max_workers, store, checkpoint, deadline, sharded_runner, rest_api, activity,
+                                             metrics, discussion_index)
+    except DeadlineExceeded:
+        if store is not None and checkpoint.refresh is not None:
+            save_run_store(s3_client, bucket, org, repo, store, store_etag)
+        # Saved with the discussion counts of the checkpoint, which the resumed run restores instead of scanning
+        if discussion_index is not None and discussion_index.watermark:
+            save_discussion_index(s3_client, bucket, org, repo, discussion_index)
+        raise
+
+    if store is not None:
+        save_run_store(s3_client, bucket, org, repo, store, store_etag)
+        save_etag_store(s3_client, bucket, org, repo, rest_api.etag_store)
+        print(f"{org}/{repo} REST pages unchanged: {rest_api.not_modified}, refetched: {rest_api.modified}")
+        if refreshed_since:
+            # Changes received before the refresh's watermark were fetched by this run or the one before
+            deleted = delete_store_updates(s3_client, bucket, org, repo, refreshed_since)
+            print(f"Deleted {deleted} webhook changes of {org}/{repo} covered by the refresh")
+    if discussion_index is not None and discussion_index.watermark:
+        save_discussion_index(s3_client, bucket, org, repo, discussion_index)
+
+    return contributors
+
+def save_run_store(s3_client: Any, bucket: str, org: str, repo: str, store: ContributionStore, etag: Optional[str]):
+    """Save the refreshed contribution store, failing the run if another run saved it since it was loaded"""
+    if not save_contribution_store_if_unchanged(s3_client, bucket, org, repo, store, etag):
+        raise Exception(f"Contribution store of {org}/{repo} was saved by another run since this one loaded it")
+    print(f"Saved contribution store to s3://{bucket}/{get_store_key(org, repo)}")
+
+def build_leaderboard_data(contributor_table: ContributorTable, score_weights: Dict[str, float], last_updated: str) -> Dict[str, Any]:
+    """
+    Build the published leaderboard from a table of contributors
+    """
+    # Rank from a columnar table, selecting the top contributors without sorting everyone
+    return {
+        'lastUpdated': last_updated,
+        'contributors': contributor_table.top_k(LEADERBOARD_SIZE, score_weights),
+        'totalContributors': len(contributor_table)
+    }
+
+def get_repository_leaderboard_key(name: str) -> str:
+    """Get the S3 key of a repository's leaderboard in a multi-repository run"""
+    return f"data/repos/{name}.json"
+
+def build_combined_leaderboard(results: Dict[str, Dict[str, Contributor]], score_weights: Dict[str, float],
+                               last_updated: str) -> Tuple[ContributorTable, Dict[str, Any]]:
+    """
+    Build the leaderboard of one or several repositories
+
+    Args:
+        results: The active contributors of each repository, keyed by org/repo
+
+    Returns:
+        Every contributor in one table and the published leaderboard, which
+        lists the repositories when there are several
+    """
+    # Users active in several repositories are merged into a single row
+    contributor_table = merge_repository_contributors(results)
+    leaderboard_data = build_leaderboard_data(contributor_table, score_weights, last_updated)
+    if len(results) > 1:
+        leaderboard_data['repositories'] = [
+            {'name': name, 'totalContributors': len(contributors)} for name, contributors in results.items()
+        ]
+    return contributor_table, leaderboard_data
+
+def publish_leaderboard(s3_client: Any, bucket: str, leaderboard_data: Dict[str, Any], contributor_table: ContributorTable,
+                        activity: ActivityIndex, score_weights: Dict[str, float],
+                        repositories: Optional[Dict[str, Dict[str, Contributor]]] = None, archive: bool = True) -> Dict[str, Any]:
+    """
+    Publish a leaderboard with every file the frontend reads from it
+
+    A changed leaderboard is archived and added to the rank history, then the
+    pages of every contributor and the windowed leaderboards are published.
+    Only files whose content changed are uploaded, ignoring lastUpdated.
+
+    Args:
+        leaderboard_data: The leaderboard built by build_leaderboard_data
+        contributor_table: Every contributor, for the pages
+        activity: Dated contributions of the contributors, for the windows
+        repositories: Contributors of each repository of a multi-repository run
+        archive: Archive a changed leaderboard and update the rank history.
+            Webhook publishes leave both to the daily run, so the history
+            keeps one point a day.
+
+    Returns:
+        The publish report: keys uploaded, keys skipped and how the ranking changed
+    """
+    last_updated = leaderboard_data['lastUpdated']
+    publisher = Publisher(s3_client, bucket)
+    previous_data = load_json(s3_client, bucket, 'data/leaderboard.json')
+
+    if publisher.publish_json('data/leaderboard.json', leaderboard_data) and archive:
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
+        archive_key = archive_leaderboard(s3_client, bucket, leaderboard_data, timestamp)
+        print(f"Archived leaderboard to s3://{bucket}/{archive_key}")
+        history = compact_history(S3ObjectStore(s3_client, bucket))
+        published = publish_rank_history(publisher, history, last_updated)
+        print(f"Published the rank history of {published} users")
+    elif archive:
+        print("Leaderboard unchanged since the last run, skipping the archive")
+
+    # Every contributor, paged and indexed for the frontend to fetch on demand
+    publish_leaderboard_pages(publisher, contributor_table, score_weights, last_updated)
+
+    # Rolling and quarterly leaderboards
+    windows = []
+    for name, start, end in leaderboard_windows(datetime.datetime.now(datetime.timezone.utc).date()):
+        window_data = build_leaderboard_data(activity.window(start, end), score_weights, last_updated)
+        window_data['window'] = {'name': name, 'start': start.isoformat(), 'end': end.isoformat()}
+        publisher.publish_json(get_window_leaderboard_key(name), window_data)
+        windows.append(window_data['window'])
+    publisher.publish_json('data/windows.json', {'lastUpdated': last_updated, 'windows': windows})
+
+    # Per-repository breakdowns of a multi-repository run
+    for name, contributors in (repositories or {}).items():
+        repository_data = build_leaderboard_data(ContributorTable.from_contributors(contributors.values()), score_weights, last_updated)
+        repository_data['repository'] = name
+        publisher.publish_json(get_repository_leaderboard_key(name), repository_data)
+
+    return dict(publisher.report(), changes=summarize_changes(previous_data, leaderboard_data), publishedAt=last_updated)
+
+def save_run_settings(s3_client: Any, bucket: str, mode: str, repositories: List[Tuple[str, str]], score_weights: Dict[str, float]):
+    """Save how the published leaderboard was built, for webhook publishes to build it the same way"""
+    settings = {
+        'mode': mode,
+        'repositories': [repository_name(*repository) for repository in repositories],
+        'scoreWeights': score_weights
+    }
+    s3_client.put_object(Bucket=bucket, Key=RUN_SETTINGS_KEY, Body=json.dumps(settings), ContentType='application/json')
+
+def get_run_parameters(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the parameters of a run, such as mode and repos
+
+    The UserParameters JSON of the pipeline action, set in the stack, takes
+    precedence over the same keys on the event itself.
+    """
+    configuration = event['CodePipeline.job'].get('data', {}).get('actionConfiguration', {}).get('configuration', {})
+    user_parameters = configuration.get('UserParameters')
+    return {**event, **(json.loads(user_parameters) if user_parameters else {})}
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
@@ -223,56 +525,100 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     print(f"Received event: {json.dumps(event)}")
     
     # Initialize the CodePipeline client
-    codepipeline_client = boto3.client('codepipeline')
+    codepipeline_client = get_client('codepipeline')
     job_id = event['CodePipeline.job']['id']
     
     try:
-        org = event.get('org', 'aws')
-        repo = event.get('repo', 'aws-cdk')
-        
-        github_token = get_github_token()
+        parameters = get_run_parameters(event)
+        org = parameters.get('org', 'aws')
+        repo = parameters.get('repo', 'aws-cdk')
+        mode = parameters.get('mode', AGGREGATE_MODE)
+        max_workers = int(parameters.get('maxWorkers', DEFAULT_MAX_WORKERS))
+        shard_count = int(parameters.get('shardCount', 1))
+        score_weights = {**SCORE_WEIGHTS, **parameters.get('scoreWeights', {})}
+        # A list of repositories, as org/repo or names in org, builds one combined leaderboard
+        repositories = parse_repositories(parameters['repos'], org) if parameters.get('repos') else [(org, repo)]
+        multi_repo = len(repositories) > 1
+        repository_workers = int(parameters.get('repoWorkers', REPOSITORY_WORKERS))
+
+        # Phase timings as CloudWatch embedded metrics, or a JSON lines file when METRICS_SINK is a path
+        metrics = PipelineMetrics(create_metrics_sink(os.environ.get('METRICS_SINK')), {'Mode': mode}, {'JobId': job_id})
+
+        with metrics.span(SECRET_FETCH_PHASE):
+            github_token = get_github_token()
             
-        github_api = GitHubAPI(github_token)
-        print(f"Generating leaderboard for {org}/{repo}")
-        
-        contributors_dict = process_contributions(github_api, org, repo)
-        
-        if not contributors_dict:
-            print("Warning: No contributors found")
-        
-        contributors_list = list(contributors_dict.values())
-        contributors_list.sort(key=lambda c: c['totalScore'], reverse=True)
-        top_contributors = contributors_list[:100]
-
-        leaderboard_data = {
-            'lastUpdated': datetime.datetime.now(datetime.timezone.utc).isoformat(),
-            'contributors': top_contributors,
-            'totalContributors': len(contributors_dict)
-        }
-        
-        print("\nLeaderboard Data:")
-        print(json.dumps(leaderboard_data, indent=2))
-        
-        # Upload data to s3
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
         s3_bucket = os.environ.get('BUCKET_NAME')
-
         if not s3_bucket:
             raise ValueError("BUCKET_NAME environment variable is not set")
-        
-        # Upload file with timestamp
-        s3_key = f"leaderboard/leaderboard-{timestamp}.json"
-        
-        upload_success = upload_to_s3(leaderboard_data, s3_bucket, s3_key)
-        if not upload_success:
-            print("Warning: Failed to upload leaderboard data to S3")
+        s3_client = get_client('s3')
 
-        # Upload to data folder 
-        upload_to_s3(leaderboard_data, s3_bucket, 'data/leaderboard.json')
+        # Optional GraphQL response cache: memory, disk or s3
+        cache_backend = parameters.get('responseCache', os.environ.get('RESPONSE_CACHE'))
+        response_cache = create_response_cache(cache_backend, s3_client, s3_bucket) if cache_backend else None
 
-        # Signal success to CodePipeline
-        codepipeline_client.put_job_success_result(jobId=job_id)
+        github_api = GitHubAPI(github_token, RateLimitThrottle(), cache=response_cache,
+                               token_refresher=lambda: get_github_token(refresh=True))
+        metrics.track(github_api.transport)
+        print(f"Generating leaderboard for {', '.join(repository_name(*repository) for repository in repositories)}")
+
+        # CodePipeline re-invokes the action with the token we hand back when stopping early
+        continuation_token = event['CodePipeline.job'].get('data', {}).get('continuationToken')
+        checkpoint_key = continuation_token or get_checkpoint_key(job_id)
+        checkpoint = load_checkpoint(s3_client, s3_bucket, checkpoint_key) if continuation_token else RunCheckpoint()
+        deadline = Deadline(context)
+        # Dated contributions of every repository, for the windowed leaderboards
+        activity = ActivityIndex()
+
+        def process_repository(repository_org: str, repository: str) -> Dict[str, Contributor]:
+            # Every repository keeps its own progress and partial results, but they share one API client
+            name = repository_name(repository_org, repository)
+            return run_repository(github_api, github_token, repository_org, repository, mode, max_workers, shard_count,
+                                  f"{job_id}-{repository_org}-{repository}" if multi_repo else job_id,
+                                  checkpoint.repository(name) if multi_repo else checkpoint,
+                                  deadline, s3_client, s3_bucket, activity, metrics)
+
+        try:
+            results = process_repositories(process_repository, repositories, repository_workers)
+        except DeadlineExceeded as e:
+            print(str(e))
+            save_checkpoint(s3_client, s3_bucket, checkpoint_key, checkpoint)
+            codepipeline_client.put_job_success_result(jobId=job_id, continuationToken=checkpoint_key)
+            return {
+                'statusCode': 202,
+                'headers': {
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({
+                    'message': 'Leaderboard run checkpointed, continuing in a new invocation',
+                    'checkpoint': checkpoint_key
+                })
+            }
+
+        if continuation_token:
+            delete_checkpoint(s3_client, s3_bucket, checkpoint_key)
+
+        if response_cache:
+            print(f"Response cache: {json.dumps(response_cache.stats())}")
+
+        with metrics.span(RANKING_PHASE):
+            contributor_table, leaderboard_data = build_combined_leaderboard(results, score_weights,
+                                                                             datetime.datetime.now(datetime.timezone.utc).isoformat())
+            if not len(contributor_table):
+                print("Warning: No contributors found")
+
+        print("\nLeaderboard Data:")
+        print(json.dumps(leaderboard_data, indent=2))
         
+        with metrics.span(UPLOAD_PHASE):
+            publish_report = publish_leaderboard(s3_client, s3_bucket, leaderboard_data, contributor_table, activity, score_weights,
+                                                 results if multi_repo else None)
+            save_publish_report(s3_client, s3_bucket, publish_report)
+            print(f"Published {len(publish_report['changed'])} changed files, skipped {publish_report['unchanged']} unchanged")
+            print(f"Leaderboard changes: {json.dumps(publish_report['changes'])}")
+            save_run_settings(s3_client, s3_bucket, mode, repositories, score_weights)
+
+        print(f"Phase metrics: {json.dumps(metrics.summary())}")
+
         # Signal success to CodePipeline
         codepipeline_client.put_job_success_result(jobId=job_id)
 
@@ -321,6 +667,10 @@ if __name__ == "__main__":
     event = {
         'org': 'aws',
         'repo': 'aws-cdk',
+        # Set to build one leaderboard across several repositories
+        # 'repos': ['aws-cdk', 'jsii', 'constructs', 'cdklabs/cdk-nag'],
+        # Reuse responses from earlier local runs
+        'responseCache': 'disk',
     }
 
     result = handler(event, None)
@@ -0,0 +1,224 @@
+import gzip
+import http.client
+import queue
+import random
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, Optional
+from checkpoint import DeadlineExceeded
+
+# Status codes that are worth retrying after a pause
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TransportResponse:
+    """
+    A fully read HTTP response
+    """
+    def __init__(self, status: int, headers: http.client.HTTPMessage, body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self) -> str:
+        """Get the response body decoded as UTF-8"""
+        return self.body.decode('utf-8')
+
+class HTTPTransport:
+    """
+    Pooled keep-alive HTTP client shared by everything that talks to GitHub.
+
+    Connections are reused across requests and threads, responses are
+    requested gzip-compressed, and failed requests are retried with jittered
+    exponential backoff that honours Retry-After and rate limit resets.
+    """
+    def __init__(self, base_url: str = 'https://api.github.com', pool_size: int = 10, timeout: float = 60.0,
+                 max_retries: int = 5, backoff_base: float = 1.0, backoff_max: float = 60.0):
+        """
+        Args:
+            base_url: Scheme and host every request is sent to
+            pool_size: Maximum number of idle connections kept open
+            timeout: Socket timeout in seconds
+            max_retries: Number of retries after the first attempt
+            backoff_base: Initial backoff in seconds, doubled on every retry
+            backoff_max: Upper bound for a single backoff in seconds, and for
+                the wait GitHub can ask for before the request gives up
+        """
+        parsed = urllib.parse.urlsplit(base_url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._pool: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+        # Running totals for metrics, read through stats()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._bytes_received = 0
+        self._retries = 0
+        self._rate_limits: Dict[str, Dict[str, int]] = {}
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None) -> TransportResponse:
+        """
+        Send a request, retrying connection errors and retryable responses
+
+        Args:
+            method: HTTP method
+            path: Request path, including any query string
+            body: Request body
+            headers: Request headers
+
+        Returns:
+            The last response received, which may still be an error response
+
+        Raises:
+            DeadlineExceeded: GitHub asked to wait longer than backoff_max,
+                so the run should save its progress rather than sleep
+        """
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip')
+
+        attempt = 0
+        while True:
+            try:
+                response = self._send(method, path, body, headers)
+            except (http.client.HTTPException, ConnectionError, TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise e
+                delay = self._backoff(attempt)
+                print(f"Request to {path} failed ({e!r}), retrying in {delay:.1f}s")
+            else:
+                if not self._should_retry(response) or attempt >= self.max_retries:
+                    return response
+                retry_after = self._retry_after(response)
+                if retry_after > self.backoff_max:
+                    raise DeadlineExceeded(f"Request to {path} returned {response.status} and asked to wait {retry_after:.0f}s, longer than {self.backoff_max:.0f}s")
+                delay = max(self._backoff(attempt), retry_after)
+                print(f"Request to {path} returned {response.status}, retrying in {delay:.1f}s")
+
+            time.sleep(delay)
+            attempt += 1
+            with self._stats_lock:
+                self._retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the totals since the transport was created
+
+        Returns:
+            Responses received, retries included, bytes received before
+            decompression, retries, and for each GitHub resource the last
+            rate limit seen as used, remaining and reset, along with the
+            points spent through this transport as cost
+        """
+        with self._stats_lock:
+            return {
+                'requests': self._requests,
+                'bytesReceived': self._bytes_received,
+                'retries': self._retries,
+                'rateLimits': {resource: dict(limit) for resource, limit in self._rate_limits.items()}
+            }
+
+    def close(self):
+        """Close every idle connection in the pool"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _send(self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]) -> TransportResponse:
+        """Send one request over a pooled connection"""
+        connection = self._acquire()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            raw_response = connection.getresponse()
+            data = raw_response.read()
+        except Exception:
+            # The connection state is unknown, so never hand it back to the pool
+            connection.close()
+            raise
+
+        self._record(raw_response, len(data))
+        if raw_response.getheader('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+
+        if raw_response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+
+        return TransportResponse(raw_response.status, raw_response.headers, data)
+
+    def _record(self, raw_response: http.client.HTTPResponse, size: int):
+        """Count a response and keep the rate limit it reports"""
+        used = raw_response.getheader('X-RateLimit-Used')
+        remaining = raw_response.getheader('X-RateLimit-Remaining')
+        reset = raw_response.getheader('X-RateLimit-Reset')
+        with self._stats_lock:
+            self._requests += 1
+            self._bytes_received += size
+            if used is None or remaining is None or reset is None:
+                return
+
+            resource = raw_response.getheader('X-RateLimit-Resource', 'default')
+            used, reset = int(used), int(float(reset))
+            previous = self._rate_limits.get(resource)
+            if previous is None:
+                # What came before this transport is unknown, count the smallest cost a query can have
+                cost = 1
+            elif previous['reset'] != reset:
+                cost = previous['cost'] + used
+            else:
+                # Concurrent responses can arrive out of order
+                cost = previous['cost'] + max(used - previous['used'], 0)
+                used = max(used, previous['used'])
+            self._rate_limits[resource] = {'used': used, 'remaining': int(remaining), 'reset': reset, 'cost': cost}
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        """Take an idle connection from the pool, or open a new one"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            if self.scheme == 'https':
+                return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, connection: http.client.HTTPConnection):
+        """Return a connection to the pool, closing it if the pool is full"""
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _should_retry(self, response: TransportResponse) -> bool:
+        """Check whether a response is a transient failure"""
+        if response.status in RETRYABLE_STATUS_CODES:
+            return True
+        # GitHub reports both primary and secondary rate limits as 403
+        if response.status == 403:
+            return (response.headers.get('Retry-After') is not None
+                    or response.headers.get('X-RateLimit-Remaining') == '0'
+                    or b'rate limit' in response.body.lower())
+        return False
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for a retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response: TransportResponse) -> float:
+        """Get the wait GitHub asked for, from Retry-After or the rate limit reset time"""
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                return 0.0
+
+        reset = response.headers.get('X-RateLimit-Reset')
+        if response.headers.get('X-RateLimit-Remaining') == '0' and reset is not None:
+            return max(float(reset) - time.time(), 0.0)
+
+        return 0.0
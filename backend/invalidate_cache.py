@@ -1,19 +1,33 @@
 import os
-import boto3
+from aws_clients import get_client
+from publisher import PUBLISH_REPORT_KEY, load_json, invalidation_paths
 
 def handler(event, context):
-    codepipeline_client = boto3.client('codepipeline')
+    codepipeline_client = get_client('codepipeline')
     job_id = event['CodePipeline.job']['id']
     
     distribution_id = os.environ['DISTRIBUTION_ID']
-    cloudfront = boto3.client('cloudfront')
-    
+    bucket = os.environ['BUCKET_NAME']
+    cloudfront = get_client('cloudfront')
+
+    # Only invalidate what the leaderboard run actually changed
+    report = load_json(get_client('s3'), bucket, PUBLISH_REPORT_KEY)
+    paths = invalidation_paths(report)
+    if not paths:
+        print("No published files changed, skipping the invalidation")
+        codepipeline_client.put_job_success_result(jobId=job_id)
+        return {
+            'statusCode': 200,
+            'body': 'skipped',
+        }
+
+    print(f"Invalidating {paths}")
     response = cloudfront.create_invalidation(
         DistributionId=distribution_id,
         InvalidationBatch={
             'Paths': {
-                'Quantity': 1,
-                'Items': ['/data/leaderboard.json'],
+                'Quantity': len(paths),
+                'Items': paths,
             },
             'CallerReference': str(context.aws_request_id), # Unique reference for the invalidation
         }
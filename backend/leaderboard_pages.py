@@ -0,0 +1,91 @@
+import gzip
+import json
+from typing import Any, Dict, List
+from contributor_table import ContributorTable
+from constants import LEADERBOARD_PAGE_SIZE, SEARCH_INDEX_PREFIX_LENGTH
+
+# Where the manifest, pages and search index are published
+PAGES_PREFIX = 'data/pages/'
+
+def get_page_key(page: int) -> str:
+    """Get the S3 key of a leaderboard page, numbered from 1"""
+    return f"{PAGES_PREFIX}page-{page}.json"
+
+def get_index_key(prefix: str) -> str:
+    """Get the S3 key of the search index shard for a username prefix"""
+    return f"{PAGES_PREFIX}index/{prefix}.json"
+
+def index_prefix(username: str) -> str:
+    """Get the search index shard a username belongs to"""
+    return username[:SEARCH_INDEX_PREFIX_LENGTH].lower()
+
+def build_pages(contributors: List[Dict[str, Any]], page_size: int = LEADERBOARD_PAGE_SIZE) -> List[List[Dict[str, Any]]]:
+    """Split ranked contributors into fixed-size pages"""
+    return [contributors[start:start + page_size] for start in range(0, len(contributors), page_size)]
+
+def build_prefix_index(contributors: List[Dict[str, Any]]) -> Dict[str, List[List[Any]]]:
+    """
+    Group ranked contributors by the first characters of their username
+
+    Returns:
+        [username, rank] pairs by prefix, in rank order, so a search only
+        needs the shard for what was typed and then the pages of its hits
+    """
+    index: Dict[str, List[List[Any]]] = {}
+    for contributor in contributors:
+        index.setdefault(index_prefix(contributor['username']), []).append([contributor['username'], contributor['rank']])
+    return index
+
+def compress_json(data: Any) -> bytes:
+    """Serialize and gzip a JSON payload, with a fixed mtime so equal data compresses to equal bytes"""
+    return gzip.compress(json.dumps(data, separators=(',', ':'), default=str).encode('utf-8'), mtime=0)
+
+def publish_leaderboard_pages(publisher: Any, contributor_table: ContributorTable, score_weights: Dict[str, float],
+                              last_updated: str, page_size: int = LEADERBOARD_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Publish every contributor as a manifest, fixed-size pages and a username prefix index
+
+    The frontend reads the small manifest first, then only the page being
+    viewed or the index shard of a search, so the whole ranking can be
+    published without slowing down the first paint. Every file is gzipped
+    and only uploaded when its content changed. Pages and index shards left
+    from a larger board are deleted once the new manifest is published.
+
+    Args:
+        publisher: The Publisher to upload through
+
+    Returns:
+        The published manifest
+    """
+    contributors = [
+        dict(contributor, rank=rank)
+        for rank, contributor in enumerate(contributor_table.top_k(len(contributor_table), score_weights), 1)
+    ]
+    pages = build_pages(contributors, page_size)
+    index = build_prefix_index(contributors)
+
+    for page_number, page in enumerate(pages, 1):
+        publisher.publish_json(get_page_key(page_number), {
+            'page': page_number,
+            'contributors': page
+        }, compress=True)
+
+    for prefix, entries in index.items():
+        publisher.publish_json(get_index_key(prefix), {'entries': entries}, compress=True)
+
+    manifest = {
+        'lastUpdated': last_updated,
+        'totalContributors': len(contributors),
+        'pageSize': page_size,
+        'pageCount': len(pages),
+        'prefixLength': SEARCH_INDEX_PREFIX_LENGTH,
+        'prefixes': sorted(index)
+    }
+    publisher.publish_json(f"{PAGES_PREFIX}manifest.json", manifest, compress=True)
+    print(f"Published {len(pages)} leaderboard pages and {len(index)} search index shards to {PAGES_PREFIX}")
+
+    # Only after the manifest, which no longer lists them, so no reader is sent to a deleted file
+    stale = publisher.delete_unpublished(PAGES_PREFIX)
+    if stale:
+        print(f"Deleted {len(stale)} pages and search index shards no longer in the manifest")
+    return manifest
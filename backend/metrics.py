@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from constants import METRICS_NAMESPACE
+
+# Phases of a leaderboard run
+SECRET_FETCH_PHASE = 'secretFetch'
+DISCOVERY_PHASE = 'contributorDiscovery'
+DISCUSSION_SCAN_PHASE = 'discussionScan'
+PER_USER_FETCH_PHASE = 'perUserFetch'
+RANKING_PHASE = 'ranking'
+UPLOAD_PHASE = 's3Upload'
+
+# Metrics of every span, with their CloudWatch units
+SPAN_METRICS = [
+    ('Duration', 'Milliseconds'),
+    ('Requests', 'Count'),
+    ('BytesReceived', 'Bytes'),
+    ('Retries', 'Count'),
+    ('RateLimitCost', 'Count'),
+    ('RateLimitRemaining', 'Count')
+]
+
+class StdoutSink:
+    """
+    Prints every record, which Lambda forwards to CloudWatch Logs where the
+    embedded metrics are extracted
+    """
+    def write(self, record: Dict[str, Any]):
+        print(json.dumps(record))
+
+class JsonFileSink:
+    """
+    Appends every record to a JSON lines file, for local runs and benchmarks
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+def create_metrics_sink(target: Optional[str]) -> Any:
+    """
+    Create the sink for a METRICS_SINK setting
+
+    Args:
+        target: 'stdout' or unset for CloudWatch, 'off' to disable metrics,
+            or the path of a JSON lines file
+    """
+    if not target or target == 'stdout':
+        return StdoutSink()
+    if target == 'off':
+        return None
+    return JsonFileSink(target)
+
+def rate_limit_cost(start: Dict[str, Dict[str, int]], end: Dict[str, Dict[str, int]]) -> int:
+    """Points spent between two rate limit snapshots, summed over GitHub resources"""
+    return sum(limit['cost'] - start.get(resource, {}).get('cost', 0) for resource, limit in end.items())
+
+class PipelineMetrics:
+    """
+    Timing spans for the phases of a leaderboard run.
+
+    Each span records its duration along with the requests, bytes, retries
+    and rate limit points the tracked transports saw while it ran, and is
+    written out in CloudWatch Embedded Metric Format as soon as it ends, so
+    an invocation that times out still reports the phases it finished.
+    Transports are shared, so phases running at the same time, such as the
+    repositories of a multi-repository run, include each other's requests.
+    """
+    def __init__(self, sink: Any = None, dimensions: Optional[Dict[str, str]] = None,
+                 properties: Optional[Dict[str, Any]] = None, namespace: str = METRICS_NAMESPACE):
+        """
+        Args:
+            sink: Where records are written, nothing is recorded without one
+            dimensions: Dimensions added to every metric, keep their values few
+            properties: Extra fields logged with every record, such as the job ID
+            namespace: CloudWatch namespace of the metrics
+        """
+        self.sink = sink
+        self.dimensions = dimensions or {}
+        self.properties = properties or {}
+        self.namespace = namespace
+        self.transports: List[Any] = []
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def track(self, transport: Any):
+        """Count the requests of a transport in every span"""
+        if transport not in self.transports:
+            self.transports.append(transport)
+
+    @contextmanager
+    def span(self, phase: str, **properties: Any) -> Iterator[None]:
+        """
+        Time a phase and record what it cost
+
+        Args:
+            phase: The phase name, used as a metric dimension
+            properties: Extra fields logged with this record only
+        """
+        if self.sink is None:
+            yield
+            return
+
+        before = self._snapshot()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            after = self._snapshot()
+            remaining = [limit['remaining'] for limit in after['rateLimits'].values()]
+            span = {
+                'Phase': phase,
+                'Duration': round(elapsed * 1000, 1),
+                'Requests': after['requests'] - before['requests'],
+                'BytesReceived': after['bytesReceived'] - before['bytesReceived'],
+                'Retries': after['retries'] - before['retries'],
+                'RateLimitCost': rate_limit_cost(before['rateLimits'], after['rateLimits']),
+                # The tightest budget across GitHub resources
+                'RateLimitRemaining': min(remaining) if remaining else None,
+                **properties
+            }
+            with self._lock:
+                self.spans.append(span)
+            self.sink.write(self._embedded_metric_record(span))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Get the total duration, requests and points of every phase so far"""
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for span in self.spans:
+                phase = totals.setdefault(span['Phase'], {'Duration': 0, 'Requests': 0, 'RateLimitCost': 0})
+                for name in phase:
+                    phase[name] = round(phase[name] + span[name], 1)
+        return totals
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """Add up the totals of every tracked transport"""
+        snapshot: Dict[str, Any] = {'requests': 0, 'bytesReceived': 0, 'retries': 0, 'rateLimits': {}}
+        for transport in self.transports:
+            stats = transport.stats()
+            for name in ('requests', 'bytesReceived', 'retries'):
+                snapshot[name] += stats[name]
+            for resource, limit in stats['rateLimits'].items():
+                combined = snapshot['rateLimits'].setdefault(resource, {'remaining': limit['remaining'], 'cost': 0})
+                combined['remaining'] = min(combined['remaining'], limit['remaining'])
+                combined['cost'] += limit['cost']
+        return snapshot
+
+    def _embedded_metric_record(self, span: Dict[str, Any]) -> Dict[str, Any]:
+        """Wrap a span in the CloudWatch Embedded Metric Format envelope"""
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [['Phase', *self.dimensions]],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, unit in SPAN_METRICS if span[name] is not None]
+                }]
+            },
+            **self.dimensions,
+            **self.properties,
+            **{name: value for name, value in span.items() if value is not None}
+        }
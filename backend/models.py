@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import Dict, List, TypedDict
 
 class Contributor(TypedDict):
     username: str
@@ -7,3 +7,13 @@ class Contributor(TypedDict):
     issuesOpened: int
     discussionsAnswered: int
     totalScore: int
+
+class ShardTask(TypedDict):
+    runId: str
+    shardIndex: int
+    org: str
+    repo: str
+    mode: str
+    maxWorkers: int
+    usernames: List[str]
+    discussionCounts: Dict[str, int]
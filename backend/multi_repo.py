@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from models import Contributor
+from contributor_table import ContributorTable
+from checkpoint import DeadlineExceeded
+from constants import REPOSITORY_WORKERS
+
+def parse_repositories(repos: List[str], default_org: str) -> List[Tuple[str, str]]:
+    """
+    Parse a list of repositories into (org, repo) pairs
+
+    Args:
+        repos: Repositories as 'org/repo', or as a bare name in default_org
+        default_org: The organization of repositories given without one
+
+    Returns:
+        The (org, repo) pairs in the given order, without duplicates
+    """
+    repositories: List[Tuple[str, str]] = []
+    for entry in repos:
+        org, _, repo = entry.strip().rpartition('/')
+        repository = (org or default_org, repo)
+        if repository not in repositories:
+            repositories.append(repository)
+    return repositories
+
+def repository_name(org: str, repo: str) -> str:
+    """Get the org/repo name a repository's results are keyed by"""
+    return f"{org}/{repo}"
+
+def process_repositories(process_repository: Callable[[str, str], Dict[str, Contributor]], repositories: List[Tuple[str, str]],
+                         max_workers: Optional[int] = None) -> Dict[str, Dict[str, Contributor]]:
+    """
+    Process several repositories in parallel
+
+    Every repository is scanned once and users are only merged afterwards,
+    so each added repository costs one more scan. If some repositories run
+    out of time, the others are still finished before DeadlineExceeded is
+    raised, so all of their progress is in the checkpoint.
+
+    Args:
+        process_repository: Returns the active contributors of one (org, repo)
+        repositories: The (org, repo) pairs to process
+        max_workers: Repositories processed at the same time
+
+    Returns:
+        Contributor records of every repository, keyed by org/repo name
+    """
+    def run(repository: Tuple[str, str]) -> Dict[str, Contributor]:
+        return process_repository(*repository)
+
+    results: Dict[str, Dict[str, Contributor]] = {}
+    deadline_error: Optional[DeadlineExceeded] = None
+    with ThreadPoolExecutor(max_workers=max_workers or REPOSITORY_WORKERS) as executor:
+        futures = [(repository, executor.submit(run, repository)) for repository in repositories]
+        for (org, repo), future in futures:
+            try:
+                results[repository_name(org, repo)] = future.result()
+            except DeadlineExceeded as e:
+                deadline_error = deadline_error or e
+
+    if deadline_error:
+        raise deadline_error
+    return results
+
+def merge_repository_contributors(results: Dict[str, Dict[str, Contributor]]) -> ContributorTable:
+    """Sum every user's counts across repositories into one table"""
+    table = ContributorTable()
+    for contributors in results.values():
+        for contributor in contributors.values():
+            table.add(contributor)
+    return table
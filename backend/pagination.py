@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Where the connection sits in the common GraphQL responses
+SEARCH_CONNECTION = ('data', 'search')
+DISCUSSIONS_CONNECTION = ('data', 'repository', 'discussions')
+
+def paginate(fetch_page: Callable[[Optional[str]], Dict[str, Any]], connection_path: Sequence[str], prefetch: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield the nodes of a paginated GraphQL connection
+
+    Only the page being consumed is kept in memory, plus the next one when
+    prefetching. Consumers can stop iterating at any point and no further
+    pages are requested.
+
+    Args:
+        fetch_page: Called with the cursor of the page to fetch, None for the first page
+        connection_path: Keys leading from the response to the connection,
+            for example SEARCH_CONNECTION
+        prefetch: Request the next page in the background while the current
+            one is being consumed
+
+    Yields:
+        Each node of the connection, in order
+    """
+    for nodes, _ in iter_pages(fetch_page, connection_path, prefetch):
+        yield from nodes
+
+def iter_pages(fetch_page: Callable[[Optional[str]], Dict[str, Any]], connection_path: Sequence[str], prefetch: bool = False,
+               cursor: Optional[str] = None) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """
+    Lazily yield the pages of a paginated GraphQL connection, as paginate does
+
+    Args:
+        fetch_page: Called with the cursor of the page to fetch, None for the first page
+        connection_path: Keys leading from the response to the connection
+        prefetch: Request the next page in the background while the current
+            one is being consumed
+        cursor: Cursor to resume from, None to start at the first page
+
+    Yields:
+        The nodes of each page and the cursor of the page after it, None after the last page
+    """
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        pending = executor.submit(fetch_page, cursor) if executor else None
+
+        while True:
+            response = pending.result() if pending else fetch_page(cursor)
+            connection = _get_connection(response, connection_path)
+
+            page_info = connection.get('pageInfo') or {}
+            has_next_page = page_info.get('hasNextPage', False)
+            cursor = page_info.get('endCursor') if has_next_page else None
+
+            pending = None
+            if has_next_page and executor:
+                pending = executor.submit(fetch_page, cursor)
+
+            nodes = [node for node in connection.get('nodes') or [] if node is not None]
+            # Drop the response so only the node list stays alive while yielding
+            del response, connection
+            yield nodes, cursor
+
+            if not has_next_page:
+                return
+    finally:
+        if executor:
+            executor.shutdown(wait=False)
+
+def complete_connections(nodes: List[Dict[str, Any]], field: str,
+                         fetch_pages: Callable[[List[Tuple[Dict[str, Any], Optional[str]]]], List[Dict[str, Any]]],
+                         batch_size: int) -> List[Dict[str, Any]]:
+    """
+    Fetch the remaining pages of a connection nested in every node
+
+    Nodes whose first page of the connection has a next page are requested
+    together, batch_size per call, until none has more pages, and the nodes
+    of every page are appended to the connection, in place.
+
+    Args:
+        nodes: Nodes holding the connection under field, with its pageInfo
+        field: Key of the nested connection, for example 'reviews'
+        fetch_pages: Called with (node, cursor) pairs, returns the next page
+            of each node's connection in the same order
+        batch_size: Most nodes per call
+
+    Returns:
+        The nodes
+    """
+    pending = [(node, node[field]['pageInfo'].get('endCursor')) for node in nodes if _has_next_page(node.get(field))]
+    while pending:
+        remaining = []
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i:i + batch_size]
+            for (node, _), page in zip(batch, fetch_pages(batch)):
+                connection = node[field]
+                connection['nodes'] = (connection.get('nodes') or []) + (page.get('nodes') or [])
+                connection['pageInfo'] = page.get('pageInfo') or {}
+                if _has_next_page(page):
+                    remaining.append((node, page['pageInfo'].get('endCursor')))
+        pending = remaining
+    return nodes
+
+def count_nodes(nodes: Iterator[Dict[str, Any]]) -> int:
+    """Count the nodes of a connection without keeping them"""
+    return sum(1 for _ in nodes)
+
+def _has_next_page(connection: Optional[Dict[str, Any]]) -> bool:
+    return bool(((connection or {}).get('pageInfo') or {}).get('hasNextPage'))
+
+def _get_connection(response: Dict[str, Any], connection_path: Sequence[str]) -> Dict[str, Any]:
+    """Extract the connection from a response, raising if GitHub returned errors instead"""
+    connection = response
+    for key in connection_path:
+        connection = connection.get(key) or {}
+
+    if not connection and response.get('errors'):
+        raise Exception(f"GitHub API error: {response['errors']}")
+    return connection
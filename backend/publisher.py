@@ -0,0 +1,215 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+from botocore.exceptions import ClientError
+from leaderboard_pages import compress_json
+from constants import ARCHIVE_SNAPSHOT_INTERVAL, MAX_INVALIDATION_PATHS
+
+# S3 object metadata key holding the content hash of a published file
+CONTENT_HASH_METADATA = 'content-hash'
+
+# What the last run published, read by the cache invalidation step
+PUBLISH_REPORT_KEY = 'leaderboard/publish/last-publish.json'
+
+# Latest full archive snapshot and the number of diffs written against it
+ARCHIVE_INDEX_KEY = 'leaderboard/archive-index.json'
+
+def content_hash(data: Dict[str, Any]) -> str:
+    """
+    Hash a JSON payload without its lastUpdated field
+
+    The timestamp changes on every run, so leaving it out makes the hash
+    change only when the published content does.
+    """
+    canonical = json.dumps({key: value for key, value in data.items() if key != 'lastUpdated'}, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def load_json(s3_client: Any, bucket: str, key: str) -> Optional[Any]:
+    """Load a JSON object from S3, or None if it does not exist"""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise e
+    return json.loads(response['Body'].read().decode('utf-8'))
+
+class Publisher:
+    """
+    Uploads published JSON only when its content changed since the last run.
+
+    Each object carries the hash of its content in its metadata, so a HEAD
+    request is enough to tell whether the new payload differs.
+    """
+    def __init__(self, s3_client: Any, bucket: str):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.changed: List[str] = []
+        self.unchanged: List[str] = []
+
+    def published_hash(self, key: str) -> Optional[str]:
+        """Get the content hash stored with a published object, None if missing"""
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise e
+        return response.get('Metadata', {}).get(CONTENT_HASH_METADATA)
+
+    def publish_json(self, key: str, data: Dict[str, Any], compress: bool = False) -> bool:
+        """
+        Upload a JSON payload unless the published copy has the same content
+
+        Args:
+            key: The S3 object key
+            data: The payload, whose lastUpdated field is ignored when comparing
+            compress: Store the payload gzipped with Content-Encoding: gzip
+
+        Returns:
+            True if the object was uploaded
+        """
+        digest = content_hash(data)
+        if self.published_hash(key) == digest:
+            self.unchanged.append(key)
+            return False
+
+        extra = {'ContentEncoding': 'gzip'} if compress else {}
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=compress_json(data) if compress else json.dumps(data, default=str),
+            ContentType='application/json',
+            Metadata={CONTENT_HASH_METADATA: digest},
+            **extra
+        )
+        self.changed.append(key)
+        return True
+
+    def delete_unpublished(self, prefix: str) -> List[str]:
+        """
+        Delete the objects under a prefix that were neither uploaded nor left unchanged by this publisher
+
+        Returns:
+            The deleted keys, also reported as changed so their cached copies are invalidated
+        """
+        published = set(self.changed) | set(self.unchanged)
+        stale = []
+        for page in self.s3_client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+            stale.extend(item['Key'] for item in page.get('Contents', []) if item['Key'] not in published)
+
+        for key in stale:
+            self.s3_client.delete_object(Bucket=self.bucket, Key=key)
+        self.changed.extend(stale)
+        return stale
+
+    def report(self) -> Dict[str, Any]:
+        """Get the keys uploaded and the number of keys skipped as unchanged"""
+        return {
+            'changed': self.changed,
+            'unchanged': len(self.unchanged)
+        }
+
+def summarize_changes(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Describe how the leaderboard changed since the previously published one
+
+    Returns:
+        Users who entered and left the board, and how many moved rank or
+        changed score
+    """
+    previous_contributors = (previous or {}).get('contributors', [])
+    previous_ranks = {contributor['username']: rank for rank, contributor in enumerate(previous_contributors, 1)}
+    previous_scores = {contributor['username']: contributor['totalScore'] for contributor in previous_contributors}
+    current_ranks = {contributor['username']: rank for rank, contributor in enumerate(current['contributors'], 1)}
+
+    return {
+        'entered': [username for username in current_ranks if username not in previous_ranks],
+        'left': [username for username in previous_ranks if username not in current_ranks],
+        'rankChanges': sum(1 for username, rank in current_ranks.items() if previous_ranks.get(username, rank) != rank),
+        'scoreChanges': sum(
+            1 for contributor in current['contributors']
+            if previous_scores.get(contributor['username'], contributor['totalScore']) != contributor['totalScore']
+        )
+    }
+
+def diff_leaderboards(snapshot_key: str, snapshot: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a compact diff of a leaderboard against a full snapshot
+
+    The diff keeps every top-level field except contributors, the ranking as
+    a list of usernames, and the records that differ from the snapshot's.
+    """
+    base = {contributor['username']: contributor for contributor in snapshot['contributors']}
+    diff = {key: value for key, value in current.items() if key != 'contributors'}
+    diff['archive'] = {'type': 'diff', 'base': snapshot_key}
+    diff['order'] = [contributor['username'] for contributor in current['contributors']]
+    diff['changed'] = {
+        contributor['username']: contributor
+        for contributor in current['contributors']
+        if base.get(contributor['username']) != contributor
+    }
+    return diff
+
+def apply_leaderboard_diff(snapshot: Dict[str, Any], diff: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the full leaderboard an archived diff was made from"""
+    base = {contributor['username']: contributor for contributor in snapshot['contributors']}
+    data = {key: value for key, value in diff.items() if key not in ('archive', 'order', 'changed')}
+    data['contributors'] = [diff['changed'].get(username) or base[username] for username in diff['order']]
+    return data
+
+def is_archive_diff(data: Dict[str, Any]) -> bool:
+    """Check whether an archived leaderboard is a diff rather than a full snapshot"""
+    return data.get('archive', {}).get('type') == 'diff'
+
+def archive_leaderboard(s3_client: Any, bucket: str, data: Dict[str, Any], timestamp: str) -> str:
+    """
+    Archive a leaderboard as a diff against the latest full snapshot
+
+    A new full snapshot is written every ARCHIVE_SNAPSHOT_INTERVAL archives,
+    or whenever the diff would not be smaller than the snapshot itself.
+
+    Returns:
+        The key of the archived object
+    """
+    index = load_json(s3_client, bucket, ARCHIVE_INDEX_KEY) or {'snapshot': None, 'diffs': 0}
+
+    if index['snapshot'] and index['diffs'] < ARCHIVE_SNAPSHOT_INTERVAL:
+        snapshot = load_json(s3_client, bucket, index['snapshot'])
+        if snapshot is not None:
+            body = json.dumps(diff_leaderboards(index['snapshot'], snapshot, data), default=str)
+            if len(body) < len(json.dumps(data, default=str)):
+                key = f"leaderboard/leaderboard-{timestamp}.diff.json"
+                s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json')
+                index['diffs'] += 1
+                _save_archive_index(s3_client, bucket, index)
+                return key
+
+    key = f"leaderboard/leaderboard-{timestamp}.json"
+    s3_client.put_object(Bucket=bucket, Key=key, Body=json.dumps(data, default=str), ContentType='application/json')
+    _save_archive_index(s3_client, bucket, {'snapshot': key, 'diffs': 0})
+    return key
+
+def _save_archive_index(s3_client: Any, bucket: str, index: Dict[str, Any]):
+    s3_client.put_object(Bucket=bucket, Key=ARCHIVE_INDEX_KEY, Body=json.dumps(index), ContentType='application/json')
+
+def save_publish_report(s3_client: Any, bucket: str, report: Dict[str, Any]):
+    """Save what this run published for the cache invalidation step"""
+    s3_client.put_object(Bucket=bucket, Key=PUBLISH_REPORT_KEY, Body=json.dumps(report), ContentType='application/json')
+
+def invalidation_paths(report: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    Get the CloudFront paths to invalidate after a publish
+
+    Returns:
+        No paths when nothing served changed, each changed path when there
+        are few, and a single wildcard otherwise or when no report exists
+    """
+    if report is None:
+        return ['/data/*']
+
+    paths = [f"/{key}" for key in report['changed'] if key.startswith('data/')]
+    if len(paths) > MAX_INVALIDATION_PATHS:
+        # A wildcard is billed as a single path
+        return ['/data/*']
+    return paths
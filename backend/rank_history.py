@@ -0,0 +1,354 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from botocore.exceptions import ClientError
+from publisher import is_archive_diff, apply_leaderboard_diff
+from constants import HISTORY_SEGMENT_LIMIT
+
+# Archived leaderboards, full snapshots and diffs, named by their run's timestamp
+ARCHIVE_KEY_PATTERN = re.compile(r'^leaderboard/leaderboard-\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}(\.diff)?\.json$')
+
+HISTORY_PREFIX = 'leaderboard/history/'
+HISTORY_KEY = f"{HISTORY_PREFIX}history.json"
+# The whole series in one object, as saved before it was split into segments
+SERIES_KEY = f"{HISTORY_PREFIX}series.bin"
+
+# Where every user's rank history and the biggest movers are published for the frontend
+PUBLISHED_HISTORY_PREFIX = 'data/history/'
+MOVERS_KEY = f"{PUBLISHED_HISTORY_PREFIX}movers.json"
+
+# One record per ranked user per archive: archive number, user row, rank and total score
+RECORD = struct.Struct('<IIId')
+
+class S3ObjectStore:
+    """
+    Objects in an S3 bucket
+    """
+    def __init__(self, s3_client: Any, bucket: str):
+        self.s3_client = s3_client
+        self.bucket = bucket
+
+    def list_keys(self, prefix: str) -> List[str]:
+        keys = []
+        for page in self.s3_client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(item['Key'] for item in page.get('Contents', []))
+        return keys
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise e
+        return response['Body'].read()
+
+    def get_version(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Get an object with its ETag, or None and None if it does not exist"""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None, None
+            raise e
+        return response['Body'].read(), response.get('ETag')
+
+    def put(self, key: str, value: bytes):
+        self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=value)
+
+    def put_if_unchanged(self, key: str, value: bytes, version: Optional[str]) -> bool:
+        """Write an object unless it changed since get_version, or was created when version is None"""
+        condition = {'IfMatch': version} if version else {'IfNoneMatch': '*'}
+        try:
+            self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=value, **condition)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409'):
+                return False
+            raise e
+        return True
+
+    def delete(self, key: str):
+        self.s3_client.delete_object(Bucket=self.bucket, Key=key)
+
+class LocalDirectoryStore:
+    """
+    Objects as files in a local directory, standing in for the S3 bucket
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def list_keys(self, prefix: str) -> List[str]:
+        keys = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                key = os.path.relpath(os.path.join(root, name), self.directory).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    keys.append(key)
+        return keys
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.directory, key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get_version(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Get a file with the hash of its content, or None and None if it does not exist"""
+        value = self.get(key)
+        return value, hashlib.md5(value).hexdigest() if value is not None else None
+
+    def put(self, key: str, value: bytes):
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(value)
+
+    def put_if_unchanged(self, key: str, value: bytes, version: Optional[str]) -> bool:
+        """Write a file unless its content changed since get_version, without S3's atomicity"""
+        if self.get_version(key)[1] != version:
+            return False
+        self.put(key, value)
+        return True
+
+    def delete(self, key: str):
+        try:
+            os.remove(os.path.join(self.directory, key))
+        except FileNotFoundError:
+            pass
+
+class RankHistory:
+    """
+    Every user's rank and score across the archived leaderboards.
+
+    The archives are folded into append-only fixed-size binary records,
+    with a username-to-row map and a per-user record index built on load,
+    so history queries never touch the archive files themselves. Each save
+    only writes the records folded in since loading, as a new segment, and
+    the header listing the segments is the single object that commits it.
+    """
+    def __init__(self, header: Optional[Dict[str, Any]] = None, series: bytes = b'', version: Optional[str] = None):
+        header = header or {}
+        # Last archive key folded in, to compact only newer archives next time
+        self.last_archive: Optional[str] = header.get('lastArchive')
+        # Series objects holding the records in order, and the header's version they were listed in
+        self.segments: List[str] = header.get('segments', [SERIES_KEY] if header else [])
+        self.version = version
+        # lastUpdated of each archive, by archive number
+        self.timestamps: List[str] = header.get('timestamps', [])
+        self.usernames: List[str] = header.get('usernames', [])
+        self.index: Dict[str, int] = {username: row for row, username in enumerate(self.usernames)}
+        self.series = bytearray(series)
+        # Records already in the saved segments
+        self.saved_records = len(self.series) // RECORD.size
+        self.user_records: Dict[int, List[int]] = defaultdict(list)
+        for position, (_, row, _, _) in enumerate(RECORD.iter_unpack(self.series)):
+            self.user_records[row].append(position)
+        # Users ranked in the archives folded in since loading, whose published history is stale
+        self.updated: Set[str] = set()
+
+    @classmethod
+    def load(cls, store: Any) -> 'RankHistory':
+        """Load the compacted history, or an empty one if none has been saved yet"""
+        header, version = store.get_version(HISTORY_KEY)
+        if header is None:
+            return cls()
+        header = json.loads(header.decode('utf-8'))
+        segments = header.get('segments', [SERIES_KEY])
+        return cls(header, b''.join(store.get(key) or b'' for key in segments), version)
+
+    def save(self, store: Any) -> bool:
+        """
+        Save the records folded in since loading as a new segment, then the header listing it
+
+        Once HISTORY_SEGMENT_LIMIT segments are listed, the whole series is
+        written as one segment instead. Segments are named by the records
+        they hold, so two compactions folding the same archives write the
+        same segment, and only the first is saved.
+
+        Returns:
+            False if another compaction saved the history since it was loaded,
+            in which case this one's records are not saved
+        """
+        records = len(self.series) // RECORD.size
+        start = 0 if len(self.segments) >= HISTORY_SEGMENT_LIMIT else self.saved_records
+        segment = f"{HISTORY_PREFIX}series-{start:010d}-{records:010d}.bin"
+        if not store.put_if_unchanged(segment, bytes(self.series[start * RECORD.size:]), None):
+            return False
+
+        segments = [segment] if start == 0 else self.segments + [segment]
+        header = json.dumps({
+            'lastArchive': self.last_archive,
+            'timestamps': self.timestamps,
+            'usernames': self.usernames,
+            'segments': segments
+        }).encode('utf-8')
+        if not store.put_if_unchanged(HISTORY_KEY, header, self.version):
+            store.delete(segment)
+            return False
+
+        if start == 0:
+            # The merged segment replaces every earlier one
+            for key in self.segments:
+                store.delete(key)
+        self.segments = segments
+        self.saved_records = records
+        return True
+
+    def append(self, leaderboard: Dict[str, Any]):
+        """Fold one archived leaderboard into the history"""
+        archive = len(self.timestamps)
+        self.timestamps.append(leaderboard['lastUpdated'])
+        for rank, contributor in enumerate(leaderboard['contributors'], 1):
+            row = self.index.get(contributor['username'])
+            if row is None:
+                row = len(self.usernames)
+                self.index[contributor['username']] = row
+                self.usernames.append(contributor['username'])
+            self.user_records[row].append(len(self.series) // RECORD.size)
+            self.series += RECORD.pack(archive, row, rank, contributor['totalScore'])
+            self.updated.add(contributor['username'])
+
+    def compact(self, store: Any) -> int:
+        """
+        Fold every archive newer than the last compaction into the history
+
+        Returns:
+            The number of archives folded in
+        """
+        keys = sorted(key for key in store.list_keys('leaderboard/leaderboard-') if ARCHIVE_KEY_PATTERN.match(key))
+        new_keys = [key for key in keys if self.last_archive is None or key > self.last_archive]
+
+        for key, leaderboard in iter_archives(store, new_keys):
+            self.append(leaderboard)
+            self.last_archive = key
+        return len(new_keys)
+
+    def _records(self, username: str) -> Iterator[Tuple[int, int, float]]:
+        """Iterate over a user's (archive, rank, score) records, oldest first"""
+        row = self.index.get(username)
+        if row is None:
+            return
+        for position in self.user_records[row]:
+            archive, _, rank, score = RECORD.unpack_from(self.series, position * RECORD.size)
+            yield archive, rank, score
+
+    def rank_history(self, username: str) -> List[Dict[str, Any]]:
+        """Get a user's rank and score in every archive they were ranked in"""
+        return [
+            {'timestamp': self.timestamps[archive], 'rank': rank, 'totalScore': score}
+            for archive, rank, score in self._records(username)
+        ]
+
+    def score_delta(self, username: str, since: Optional[str] = None) -> float:
+        """
+        Get how much a user's score changed since a timestamp
+
+        Args:
+            username: The GitHub username
+            since: ISO 8601 timestamp, the first archive by default
+        """
+        records = [(archive, score) for archive, _, score in self._records(username) if since is None or self.timestamps[archive] >= since]
+        return records[-1][1] - records[0][1] if records else 0
+
+    def biggest_movers(self, since: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the users whose rank improved the most between an archive and the latest one
+
+        Args:
+            since: ISO 8601 timestamp of the archive to compare with, the first by default
+            limit: Number of movers to return
+
+        Returns:
+            Movers with their old and new rank, largest improvement first
+        """
+        if not self.timestamps:
+            return []
+        start = next((archive for archive, timestamp in enumerate(self.timestamps) if since is None or timestamp >= since), len(self.timestamps) - 1)
+        latest = len(self.timestamps) - 1
+
+        ranks: Dict[int, Dict[int, int]] = {start: {}, latest: {}}
+        for archive, row, rank, _ in RECORD.iter_unpack(self.series):
+            if archive in ranks:
+                ranks[archive][row] = rank
+
+        movers = [
+            {'username': self.usernames[row], 'from': ranks[start][row], 'to': rank, 'change': ranks[start][row] - rank}
+            for row, rank in ranks[latest].items() if row in ranks[start]
+        ]
+        movers.sort(key=lambda mover: mover['change'], reverse=True)
+        return movers[:limit]
+
+def iter_archives(store: Any, keys: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Iterate over archived leaderboards, rebuilding diffs from their snapshots"""
+    snapshots: Dict[str, Dict[str, Any]] = {}
+    for key in keys:
+        data = json.loads(store.get(key).decode('utf-8'))
+        if is_archive_diff(data):
+            base = data['archive']['base']
+            if base not in snapshots:
+                snapshots.clear()
+                snapshots[base] = json.loads(store.get(base).decode('utf-8'))
+            data = apply_leaderboard_diff(snapshots[base], data)
+        else:
+            snapshots.clear()
+            snapshots[key] = data
+        yield key, data
+
+def compact_history(store: Any) -> RankHistory:
+    """
+    Load the history, fold in any new archives and save it
+
+    Returns:
+        The saved history, or when another compaction saved first, the
+        history it saved, with no users to republish
+    """
+    history = RankHistory.load(store)
+    folded = history.compact(store)
+    if folded and not history.save(store):
+        print(f"The rank history was compacted by another run, leaving its {folded} new archives to it")
+        return RankHistory.load(store)
+    print(f"Compacted {folded} new archives into the rank history, {len(history.timestamps)} in total")
+    return history
+
+def get_user_history_key(username: str) -> str:
+    """Get the key a user's published rank history is served from"""
+    return f"{PUBLISHED_HISTORY_PREFIX}users/{username}.json"
+
+def publish_rank_history(publisher: Any, history: RankHistory, last_updated: str) -> int:
+    """
+    Publish the rank history of every user ranked in the archives folded in
+    since the history was loaded, and the biggest movers
+
+    Users missing from the new archives have no new records, so their
+    published history is still current and is left alone.
+
+    Args:
+        publisher: The Publisher to upload through
+        history: The compacted history
+        last_updated: Timestamp of the run
+
+    Returns:
+        The number of user histories published
+    """
+    for username in sorted(history.updated):
+        publisher.publish_json(get_user_history_key(username), {
+            'lastUpdated': last_updated,
+            'username': username,
+            'history': history.rank_history(username)
+        }, compress=True)
+    publisher.publish_json(MOVERS_KEY, {'lastUpdated': last_updated, 'movers': history.biggest_movers()}, compress=True)
+    return len(history.updated)
+
+# For local testing against a copy of the bucket
+if __name__ == "__main__":
+    history = compact_history(LocalDirectoryStore(sys.argv[1]))
+    if len(sys.argv) > 2:
+        print(json.dumps(history.rank_history(sys.argv[2]), indent=2))
+    else:
+        print(json.dumps(history.biggest_movers(), indent=2))
@@ -0,0 +1,73 @@
+import threading
+import time
+import datetime
+from typing import Any, Mapping, Optional
+
+class RateLimitThrottle:
+    """
+    Shared throttle for GitHub API calls made from several threads.
+
+    It tracks the primary rate limit reported by GitHub and paces requests so
+    the remaining budget lasts until the reset time, and it enforces a minimum
+    gap between requests to stay clear of the secondary rate limits.
+    """
+    def __init__(self, min_interval: float = 0.0, reserve: int = 50, slowdown_threshold: int = 500):
+        """
+        Args:
+            min_interval: Minimum number of seconds between two requests
+            reserve: Number of requests to keep in hand before the reset time
+            slowdown_threshold: Remaining budget below which requests are
+                spread out over the rest of the window
+        """
+        self.min_interval = min_interval
+        self.reserve = reserve
+        self.slowdown_threshold = slowdown_threshold
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self._next_request_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until the next request is allowed to go out"""
+        with self._lock:
+            now = time.time()
+            send_at = max(now, self._next_request_at)
+            interval = self.min_interval
+
+            if self.remaining is not None and self.reset_at is not None and self.reset_at > now:
+                if self.remaining <= self.reserve:
+                    # Out of budget, hold every worker until the limit resets
+                    send_at = max(send_at, self.reset_at)
+                elif self.remaining <= self.slowdown_threshold:
+                    # Spread what is left evenly over the rest of the window
+                    interval = max(interval, (self.reset_at - now) / (self.remaining - self.reserve))
+
+                self.remaining -= 1
+
+            self._next_request_at = send_at + interval
+            delay = send_at - now
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Record the X-RateLimit-* values from a GitHub response"""
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+
+        with self._lock:
+            self.remaining = int(remaining)
+            self.reset_at = float(reset)
+
+    def update_from_rate_limit(self, rate_limit: Optional[Mapping[str, Any]]):
+        """Record the rateLimit object returned by a GraphQL query"""
+        if not rate_limit or rate_limit.get('remaining') is None:
+            return
+
+        with self._lock:
+            self.remaining = int(rate_limit['remaining'])
+            if rate_limit.get('resetAt'):
+                reset_at = datetime.datetime.fromisoformat(rate_limit['resetAt'].replace('Z', '+00:00'))
+                self.reset_at = reset_at.timestamp()
@@ -0,0 +1,111 @@
+import gzip
+import hashlib
+import http.client
+import json
+import threading
+from typing import Any, Dict, Optional
+from http_transport import HTTPTransport, TransportResponse
+
+def request_key(method: str, path: str, body: Optional[bytes]) -> str:
+    """
+    Key a request by its method, path and body
+
+    GraphQL bodies are re-serialized with sorted keys and collapsed query
+    whitespace, so formatting differences do not produce different keys.
+    """
+    canonical: Any = body.decode('utf-8') if body else None
+    if canonical:
+        try:
+            payload = json.loads(canonical)
+            if isinstance(payload, dict) and 'query' in payload:
+                payload['query'] = ' '.join(payload['query'].split())
+            canonical = json.dumps(payload, sort_keys=True)
+        except ValueError:
+            pass
+    return hashlib.sha256(json.dumps([method, path, canonical]).encode('utf-8')).hexdigest()
+
+def load_fixture(path: str) -> Dict[str, Any]:
+    """
+    Load a fixture from a JSON or gzipped JSON file
+
+    Returns:
+        The recorded responses keyed by request under 'responses', and when
+        the recording started under 'recordedAt'
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_fixture(path: str, responses: Dict[str, Dict[str, Any]], recorded_at: Optional[str] = None):
+    """Save recorded responses to a JSON or gzipped JSON file"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        json.dump({'recordedAt': recorded_at, 'responses': responses}, f)
+
+class RecordingTransport:
+    """
+    Passes requests through to another transport and records every response.
+
+    Wrap the transport of a GitHubAPI or GitHubRestAPI with it, and everything
+    built on them, DiscussionAnalyzer included, is captured.
+    """
+    def __init__(self, transport: Optional[HTTPTransport] = None, recorded_at: Optional[str] = None):
+        """
+        Args:
+            transport: The transport that sends the requests
+            recorded_at: ISO 8601 time the run treats as now, stored with the
+                fixture so a replay can build the same date-bounded queries
+        """
+        self.transport = transport or HTTPTransport()
+        self.recorded_at = recorded_at
+        self.responses: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None) -> TransportResponse:
+        response = self.transport.request(method, path, body, headers)
+        with self._lock:
+            self.responses[request_key(method, path, body)] = {
+                'request': {'method': method, 'path': path, 'body': body.decode('utf-8') if body else None},
+                'status': response.status,
+                'headers': {name: value for name, value in response.headers.items()},
+                'body': response.text()
+            }
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return self.transport.stats()
+
+    def save(self, path: str):
+        """Write the recorded responses to a fixture file"""
+        with self._lock:
+            save_fixture(path, self.responses, self.recorded_at)
+        print(f"Recorded {len(self.responses)} responses to {path}")
+
+class ReplayTransport:
+    """
+    Serves recorded responses instead of calling GitHub
+    """
+    def __init__(self, responses: Dict[str, Dict[str, Any]]):
+        self.responses = responses
+        self.requests = 0
+        self.bytes_received = 0
+
+    @classmethod
+    def from_fixture(cls, path: str) -> 'ReplayTransport':
+        return cls(load_fixture(path)['responses'])
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None) -> TransportResponse:
+        self.requests += 1
+        recorded = self.responses.get(request_key(method, path, body))
+        if recorded is None:
+            raise KeyError(f"No recorded response for {method} {path}")
+        # HTTPMessage keeps header lookups case-insensitive, as on a live response
+        headers = http.client.HTTPMessage()
+        for name, value in recorded['headers'].items():
+            headers[name] = value
+        body = recorded['body'].encode('utf-8')
+        self.bytes_received += len(body)
+        return TransportResponse(recorded['status'], headers, body)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'requests': self.requests, 'bytesReceived': self.bytes_received, 'retries': 0, 'rateLimits': {}}
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from botocore.exceptions import ClientError
+from constants import CACHE_TTLS, DEFAULT_CACHE_TTL, CACHE_MAX_BYTES, CACHE_EVICTION_TARGET
+
+# First root field of a GraphQL document, skipping the operation header and any alias
+ROOT_FIELD_PATTERN = re.compile(r'^\s*(?:query\b[^{]*)?\{\s*(?:\w+\s*:\s*)?(\w+)')
+
+# First field selected on the repository, telling discussion pages apart from pull requests
+REPOSITORY_FIELD_PATTERN = re.compile(r'\brepository\s*\([^)]*\)\s*\{\s*(?:\w+\s*:\s*)?(\w+)')
+
+def cache_key(query: str, variables: Dict[str, Any]) -> str:
+    """Content-addressed key for a query and its variables"""
+    canonical = json.dumps({'query': ' '.join(query.split()), 'variables': variables}, sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def query_kind(query: str) -> str:
+    """
+    Get the root field a query starts with, such as search, followed for
+    repository queries by the field selected on it, such as repository.discussions
+    """
+    match = ROOT_FIELD_PATTERN.match(query)
+    if not match:
+        return 'unknown'
+
+    kind = match.group(1)
+    if kind == 'repository':
+        field = REPOSITORY_FIELD_PATTERN.search(query)
+        if field:
+            kind = f"{kind}.{field.group(1)}"
+    return kind
+
+class MemoryCacheBackend:
+    """
+    In-memory cache entries with least-recently-used eviction
+    """
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes):
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+            self._entries[key] = value
+            self.size += len(value)
+
+            while self.size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+
+class DiskCacheBackend:
+    """
+    Cache entries stored as files in a local directory, evicting the least recently used
+
+    The size of the directory is kept in memory, so the files are only listed
+    when it goes over max_bytes. Eviction then frees space down to
+    CACHE_EVICTION_TARGET of the cap, so the next writes do not list them again.
+    """
+    def __init__(self, directory: str, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry_size for _, entry_size, _ in self._entries())
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        # Access time drives eviction, and atime is often not updated by the OS
+        os.utime(path)
+        return value
+
+    def set(self, key: str, value: bytes):
+        path = self._path(key)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(value)
+        with self._lock:
+            replaced = self._file_size(path)
+            os.replace(f"{path}.tmp", path)
+            self.size += len(value) - replaced
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            path = self._path(key)
+            removed = self._file_size(path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                return
+            self.size -= removed
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _file_size(self, path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """List the cached files as (last use, size, path)"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        """Remove the least recently used files until the directory is back under its eviction target"""
+        entries = self._entries()
+        # Listed again, as other processes sharing the directory change it too
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_bytes * CACHE_EVICTION_TARGET:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            size -= entry_size
+            self.evictions += 1
+        self.size = size
+
+class S3CacheBackend:
+    """
+    Cache entries stored in S3 so they survive across Lambda invocations.
+
+    Stale entries are replaced on the next write and expired by TTL on read.
+    There is no size cap: the stack's lifecycle rule on leaderboard/cache/
+    deletes every entry a day after it was last written, longer than any
+    TTL, which bounds the prefix to about a day of responses.
+    """
+    def __init__(self, s3_client: Any, bucket: str, prefix: str = 'leaderboard/cache/'):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        # Entries deleted by the lifecycle rule are not seen, so none are counted
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json")
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise e
+        return response['Body'].read()
+
+    def set(self, key: str, value: bytes):
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{key}.json",
+            Body=value,
+            ContentType='application/json'
+        )
+
+    def delete(self, key: str):
+        self.s3_client.delete_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json")
+
+class ResponseCache:
+    """
+    Cache of GraphQL responses keyed on the query and its variables
+    """
+    def __init__(self, backend: Any, ttls: Optional[Dict[str, float]] = None, default_ttl: float = DEFAULT_CACHE_TTL):
+        """
+        Args:
+            backend: MemoryCacheBackend, DiskCacheBackend or S3CacheBackend
+            ttls: Seconds a response stays fresh, by the query's kind as
+                returned by query_kind, or by its root field alone. A TTL of 0
+                disables caching for that kind of query.
+            default_ttl: TTL for query kinds missing from ttls
+        """
+        self.backend = backend
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+
+    def get(self, query: str, variables: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Get a fresh cached response, or None"""
+        ttl = self._ttl(query)
+        if ttl <= 0:
+            return None
+
+        key = cache_key(query, variables)
+        value = self.backend.get(key)
+        if value is None:
+            self._count('misses')
+            return None
+
+        entry = json.loads(value.decode('utf-8'))
+        if time.time() - entry['storedAt'] > ttl:
+            self.backend.delete(key)
+            self._count('expired')
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        return entry['response']
+
+    def set(self, query: str, variables: Dict[str, Any], response: Dict[str, Any]):
+        """Cache a response, unless it carries errors or its kind is not cached"""
+        if response.get('errors') or self._ttl(query) <= 0:
+            return
+
+        entry = json.dumps({'storedAt': time.time(), 'response': response})
+        self.backend.set(cache_key(query, variables), entry.encode('utf-8'))
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit, miss and eviction counts"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evictions': self.backend.evictions,
+            'hitRate': self.hits / lookups if lookups else 0.0
+        }
+
+    def _ttl(self, query: str) -> float:
+        kind = query_kind(query)
+        return self.ttls.get(kind, self.ttls.get(kind.split('.')[0], self.default_ttl))
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+def create_response_cache(backend_name: str, s3_client: Any = None, bucket: Optional[str] = None, directory: Optional[str] = None) -> ResponseCache:
+    """
+    Create a response cache with the named backend
+
+    Args:
+        backend_name: 'memory', 'disk' or 's3'
+        s3_client: A boto3 S3 client, for the s3 backend
+        bucket: Bucket to cache in, for the s3 backend
+        directory: Directory to cache in, for the disk backend
+    """
+    if backend_name == 'memory':
+        return ResponseCache(MemoryCacheBackend())
+    if backend_name == 'disk':
+        return ResponseCache(DiskCacheBackend(directory or os.path.join(os.getcwd(), '.cache', 'github')))
+    if backend_name == 's3':
+        if not s3_client or not bucket:
+            raise ValueError("The s3 response cache needs an S3 client and bucket")
+        return ResponseCache(S3CacheBackend(s3_client, bucket))
+    raise ValueError(f"Unknown response cache backend: {backend_name}")
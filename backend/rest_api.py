@@ -0,0 +1,197 @@
+import json
+import urllib.parse
+from typing import Any, Callable, Dict, Iterator, Optional
+from botocore.exceptions import ClientError
+from http_transport import HTTPTransport
+from rate_limiter import RateLimitThrottle
+from constants import CONTRIBUTIONS_START_DATE
+
+class ETagStore:
+    """
+    ETag, Last-Modified and trimmed body of every REST page fetched so far,
+    so the next run can send conditional requests and reuse unchanged pages
+    """
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        self.entries: Dict[str, Dict[str, Any]] = (data or {}).get('entries', {})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the store to a JSON-compatible dictionary"""
+        return {'entries': self.entries}
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get the stored entry for a page URL"""
+        return self.entries.get(url)
+
+    def set(self, url: str, etag: Optional[str], last_modified: Optional[str], body: Any):
+        """Store the validators and trimmed body of a page URL"""
+        self.entries[url] = {
+            'etag': etag,
+            'lastModified': last_modified,
+            'body': body
+        }
+
+class GitHubRestAPI:
+    """
+    GitHub REST client for repository listings, using conditional requests.
+
+    A 304 Not Modified answer does not count against the rate limit, so
+    pages that have not changed since the last run cost nothing.
+    """
+    def __init__(self, token: str, etag_store: Optional[ETagStore] = None, throttle: Optional[RateLimitThrottle] = None,
+                 transport: Optional[HTTPTransport] = None, token_refresher: Optional[Callable[[], str]] = None):
+        self.token = token
+        self.token_refresher = token_refresher
+        self.etag_store = etag_store or ETagStore()
+        self.throttle = throttle
+        self.transport = transport or HTTPTransport()
+        self.not_modified = 0
+        self.modified = 0
+
+    def get(self, path: str, params: Dict[str, Any], trim: Callable[[Any], Any]) -> Any:
+        """
+        Fetch a REST resource, reusing the stored copy if GitHub reports it unchanged
+
+        Args:
+            path: The API path, such as /repos/aws/aws-cdk/issues
+            params: Query string parameters
+            trim: Reduces the response body to what needs to be kept between runs
+
+        Returns:
+            The trimmed response body
+        """
+        url = f"{path}?{urllib.parse.urlencode(params)}"
+        headers = {
+            'Authorization': f'Bearer {self.token}',
+            'Accept': 'application/vnd.github+json',
+            'User-Agent': 'GitHub-Leaderboard-Script',
+        }
+
+        cached = self.etag_store.get(url)
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['lastModified']:
+                headers['If-Modified-Since'] = cached['lastModified']
+
+        if self.throttle:
+            self.throttle.wait()
+
+        response = self.transport.request('GET', url, headers=headers)
+        if response.status == 401 and self.token_refresher:
+            print("GitHub rejected the token, fetching it again")
+            self.token = self.token_refresher()
+            headers['Authorization'] = f'Bearer {self.token}'
+            response = self.transport.request('GET', url, headers=headers)
+        if self.throttle:
+            self.throttle.update_from_headers(response.headers)
+
+        if response.status == 304 and cached:
+            self.not_modified += 1
+            return cached['body']
+
+        if response.status >= 400:
+            error_body = response.text()
+            print(f"GitHub API error: {response.status} - {error_body}")
+            raise Exception(f"GitHub API error: {response.status} - {error_body}")
+
+        self.modified += 1
+        body = trim(json.loads(response.text()))
+        self.etag_store.set(url, response.headers.get('ETag'), response.headers.get('Last-Modified'), body)
+        return body
+
+    def iter_updated_since(self, path: str, params: Dict[str, Any], trim_item: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                           updated_since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over a listing sorted by most recently updated, stopping at updated_since
+
+        The page URLs do not depend on updated_since, so they stay stable from
+        one run to the next and can be answered with 304 Not Modified.
+
+        Args:
+            path: The listing's API path
+            params: Extra query string parameters
+            trim_item: Reduces an item to the fields to keep, or returns None to skip it
+            updated_since: ISO 8601 timestamp to stop at, or None for the whole listing
+        """
+        page = 1
+        while True:
+            page_params = dict(params, sort='updated', direction='desc', per_page=100, page=page)
+            # Trimming drops items, so the original page size is kept to detect the last page, and the update
+            # time of its last item to stop on a page of dropped items that are all older than updated_since
+            page_body = self.get(path, page_params, lambda body: {
+                'pageSize': len(body),
+                'lastUpdatedAt': body[-1]['updated_at'] if body else None,
+                'items': [item for item in map(trim_item, body) if item]
+            })
+
+            for item in page_body['items']:
+                if updated_since and item['updatedAt'] < updated_since:
+                    return
+                yield item
+
+            last_updated_at = page_body.get('lastUpdatedAt')
+            if page_body['pageSize'] < 100 or (updated_since and last_updated_at and last_updated_at < updated_since):
+                return
+            page += 1
+
+    def iter_issues(self, org: str, repo: str, updated_since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over the repository's issues, most recently updated first, in the GraphQL node shape"""
+        return self.iter_updated_since(f"/repos/{org}/{repo}/issues", {'state': 'all'}, trim_issue, updated_since)
+
+    def iter_pull_requests(self, org: str, repo: str, updated_since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over the repository's merged PRs, most recently updated first, in the GraphQL node shape"""
+        return self.iter_updated_since(f"/repos/{org}/{repo}/pulls", {'state': 'closed'}, trim_pull_request, updated_since)
+
+def trim_issue(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Keep the fields of a REST or webhook issue that GraphQL issue nodes have, skipping PRs"""
+    # The issues listing includes PRs, which carry a pull_request key
+    if 'pull_request' in item or item['created_at'] < CONTRIBUTIONS_START_DATE:
+        return None
+    return {
+        'number': item['number'],
+        'author': {'login': item['user']['login']} if item.get('user') else None,
+        'createdAt': item['created_at'],
+        'updatedAt': item['updated_at'],
+        'labels': {'nodes': [{'name': label['name']} for label in item.get('labels', [])]}
+    }
+
+def trim_pull_request(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Keep the fields of a REST or webhook PR that GraphQL PR nodes have, skipping unmerged PRs"""
+    if not item.get('merged_at') or item['merged_at'] < CONTRIBUTIONS_START_DATE:
+        return None
+    return {
+        'number': item['number'],
+        'author': {'login': item['user']['login']} if item.get('user') else None,
+        'mergedAt': item['merged_at'],
+        'updatedAt': item['updated_at'],
+        'labels': {'nodes': [{'name': label['name']} for label in item.get('labels', [])]}
+    }
+
+def get_etag_store_key(org: str, repo: str) -> str:
+    """Get the S3 key of the ETag store for a repository"""
+    return f"leaderboard/store/etags-{org}-{repo}.json"
+
+def load_etag_store(s3_client: Any, bucket: str, org: str, repo: str) -> ETagStore:
+    """
+    Load the ETag store for a repository from S3
+
+    Returns:
+        The stored ETags, or an empty store if none has been saved yet
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=get_etag_store_key(org, repo))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return ETagStore()
+        raise e
+
+    return ETagStore(json.loads(response['Body'].read().decode('utf-8')))
+
+def save_etag_store(s3_client: Any, bucket: str, org: str, repo: str, etag_store: ETagStore):
+    """Save the ETag store for a repository to S3"""
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=get_etag_store_key(org, repo),
+        Body=json.dumps(etag_store.to_dict()),
+        ContentType='application/json'
+    )
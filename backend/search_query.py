@@ -0,0 +1,106 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from constants import AUTHORS_TO_EXCLUDE, EXCLUDED_LABELS, APP_AUTHORS, MAX_SEARCH_QUERY_LENGTH
+
+def author_qualifier(login: str, app_authors: Iterable[str] = APP_AUTHORS) -> str:
+    """Build the qualifier that excludes an author, GitHub Apps being searched as app/<name>"""
+    return f"-author:app/{login}" if login in app_authors else f"-author:{login}"
+
+def label_qualifier(label: str) -> str:
+    """Build the qualifier that excludes a label, quoting names with spaces"""
+    return f'-label:"{label}"' if ' ' in label else f"-label:{label}"
+
+class CompiledSearch:
+    """
+    A search query carrying as many exclusions as fit, and the exclusions
+    that did not fit, to be filtered out of its results
+    """
+    def __init__(self, query: str, authors: frozenset = frozenset(), labels: frozenset = frozenset()):
+        self.query = query
+        self.authors = authors
+        self.labels = labels
+
+    def node_fields(self) -> str:
+        """The GraphQL fields result nodes need for the leftover filtering"""
+        fields = []
+        if self.authors:
+            fields.append('author { login }')
+        if self.labels:
+            fields.append('labels(first: 20) { nodes { name } }')
+        return ' '.join(fields)
+
+    def keeps(self, node: Dict[str, Any]) -> bool:
+        """Check whether a result node passes the leftover exclusions"""
+        if self.authors and (node.get('author') or {}).get('login') in self.authors:
+            return False
+        if self.labels:
+            for label in (node.get('labels') or {}).get('nodes', []):
+                if label.get('name') in self.labels:
+                    return False
+        return True
+
+    def filter_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Drop the result nodes caught by the leftover exclusions from a search response, in place"""
+        search = (response.get('data') or {}).get('search')
+        if search and search.get('nodes') and (self.authors or self.labels):
+            search['nodes'] = [node for node in search['nodes'] if self.keeps(node)]
+        return response
+
+class SearchExclusions:
+    """
+    Compiles the excluded authors and labels into search qualifiers.
+
+    Excluded items are left out of the results instead of being paged
+    through and dropped afterwards. GitHub rejects search queries over
+    MAX_SEARCH_QUERY_LENGTH characters, so the qualifiers are added until a
+    query is full, labels first as each rules out the most results, then
+    authors in the configured order, and whatever is left over is filtered
+    out of the results.
+    """
+    def __init__(self, authors: Iterable[str] = AUTHORS_TO_EXCLUDE, labels: Iterable[str] = EXCLUDED_LABELS,
+                 app_authors: Iterable[str] = APP_AUTHORS, max_length: int = MAX_SEARCH_QUERY_LENGTH):
+        authors, labels = list(authors), list(labels)
+        self.authors = frozenset(authors)
+        self.labels = frozenset(labels)
+        self.max_length = max_length
+        app_authors = frozenset(app_authors)
+        # (qualifier, author, label), in the order they are pushed into queries
+        self._qualifiers: List[Tuple[str, Optional[str], Optional[str]]] = (
+            [(label_qualifier(label), None, label) for label in labels]
+            + [(author_qualifier(author, app_authors), author, None) for author in authors]
+        )
+
+    def excludes_author(self, login: Optional[str]) -> bool:
+        return login in self.authors
+
+    def excludes(self, author: Optional[str], labels: Iterable[str]) -> bool:
+        """Check whether an item with this author and these labels is excluded"""
+        return author in self.authors or not self.labels.isdisjoint(labels)
+
+    def compile(self, query: str, single_author: bool = False) -> CompiledSearch:
+        """
+        Add the exclusion qualifiers that fit to a search query
+
+        Args:
+            query: The search query
+            single_author: The query already matches one author who is not
+                excluded, so only the label exclusions apply
+
+        Returns:
+            The query with the qualifiers, and the exclusions left to filter
+            out of its results
+        """
+        parts = [query]
+        length = len(query)
+        leftover_authors = set()
+        leftover_labels = set()
+        for qualifier, author, label in self._qualifiers:
+            if author is not None and single_author:
+                continue
+            if length + 1 + len(qualifier) <= self.max_length:
+                parts.append(qualifier)
+                length += 1 + len(qualifier)
+            elif author is not None:
+                leftover_authors.add(author)
+            else:
+                leftover_labels.add(label)
+        return CompiledSearch(' '.join(parts), frozenset(leftover_authors), frozenset(leftover_labels))
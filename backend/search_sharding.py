@@ -0,0 +1,274 @@
+import datetime
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from github_api import GitHubAPI
+from pagination import iter_pages, complete_connections, SEARCH_CONNECTION
+from constants import CONTRIBUTIONS_START_DATE, SEARCH_RESULT_CAP, SEARCH_SHARD_WORKERS, SEARCH_SHARD_PAGE_BUFFER, SEARCH_COMPLETION_NODES, REVIEW_PAGE_BATCH_SIZE
+
+# Format accepted by range qualifiers such as merged:A..B
+RANGE_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S+00:00'
+
+Window = Tuple[datetime.datetime, datetime.datetime]
+
+# Queued by a shard's worker after its last page
+_SHARD_DONE = object()
+
+def utc_now() -> datetime.datetime:
+    """End of a search range when none is given, replaced by the benchmarks to replay recorded runs"""
+    return datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+class ShardedSearch:
+    """
+    Runs searches that may match more than GitHub's 1,000 result cap.
+
+    The date range of a search is split into windows, bisecting every window
+    whose issueCount is still above the cap, and the windows are then paged
+    through in parallel, a few at a time, and merged without duplicates.
+    """
+    def __init__(self, github_api: GitHubAPI, max_workers: int = SEARCH_SHARD_WORKERS, result_cap: int = SEARCH_RESULT_CAP):
+        self.github_api = github_api
+        self.max_workers = max_workers
+        self.result_cap = result_cap
+
+    def merged_pull_requests(self, org: str, repo: str, updated_since: Optional[str] = None) -> 'ShardedQuery':
+        """Get the search of every merged PR since CONTRIBUTIONS_START_DATE, with all its reviews and one review per reviewer"""
+        return ShardedQuery(
+            lambda window: self.github_api.merged_prs_query(org, repo, window, updated_since).query,
+            lambda window, cursor: self.github_api.get_all_contributors(org, repo, cursor, updated_since, window),
+            lambda prs: complete_reviews(self.github_api, org, repo, prs)
+        )
+
+    def issues(self, org: str, repo: str, updated_since: Optional[str] = None) -> 'ShardedQuery':
+        """Get the search of every issue opened since CONTRIBUTIONS_START_DATE"""
+        return ShardedQuery(
+            lambda window: self.github_api.issues_query(org, repo, window, updated_since).query,
+            lambda window, cursor: self.github_api.get_issues_contributors(org, repo, cursor, updated_since, window)
+        )
+
+    def iter_merged_pull_requests(self, org: str, repo: str, updated_since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over every merged PR since CONTRIBUTIONS_START_DATE, with all
+        its reviews and one review per reviewer
+        """
+        query = self.merged_pull_requests(org, repo, updated_since)
+        return self.iter_nodes(query.build_query, query.fetch_page, complete=query.complete)
+
+    def iter_issues(self, org: str, repo: str, updated_since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over every issue opened since CONTRIBUTIONS_START_DATE"""
+        query = self.issues(org, repo, updated_since)
+        return self.iter_nodes(query.build_query, query.fetch_page)
+
+    def iter_nodes(self, build_query: Callable[[str], str], fetch_page: Callable[[str, Optional[str]], Dict[str, Any]],
+                   start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+                   complete: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over every node of a search across date-range shards
+
+        Args:
+            build_query: Builds the search query for a date range, used to count results
+            fetch_page: Fetches one page of results for a date range and cursor
+            start: Start of the range, CONTRIBUTIONS_START_DATE by default
+            end: End of the range, now by default
+            complete: Fills in the nested connections of a list of nodes in
+                place, run in the shard's worker
+
+        Yields:
+            Each node once, shard by shard in date order
+        """
+        shards = self.plan(build_query, start, end)
+
+        seen = set()
+        for _, nodes, _ in self.iter_shard_pages(shards, fetch_page, complete):
+            for node in nodes:
+                # Items edited while the shards run can move between windows
+                key = node.get('number')
+                if key is not None:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                yield node
+
+    def plan(self, build_query: Callable[[str], str], start: Optional[datetime.datetime] = None,
+             end: Optional[datetime.datetime] = None) -> List[str]:
+        """Plan the shards of a search, formatted as range qualifiers in date order"""
+        start = start or datetime.datetime.fromisoformat(CONTRIBUTIONS_START_DATE).replace(tzinfo=datetime.timezone.utc)
+        end = end or utc_now()
+
+        # The range is bisected from a power-of-two number of days, so the
+        # windows that have closed are the same in every run and their counts
+        # and pages are answered by the response cache
+        days = 1
+        while start + datetime.timedelta(days=days) <= end:
+            days *= 2
+        grid = (start, start + datetime.timedelta(days=days, seconds=-1))
+        return [format_window(window) for window in self.plan_shards(build_query, grid, end)]
+
+    def iter_shard_pages(self, shards: List[str], fetch_page: Callable[[str, Optional[str]], Dict[str, Any]],
+                         complete: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None,
+                         cursor: Optional[str] = None) -> Iterator[Tuple[str, List[Dict[str, Any]], Optional[str]]]:
+        """
+        Fetch the pages of several shards concurrently, yielding them in shard order
+
+        At most max_workers shards are in flight at a time, each fetching up
+        to SEARCH_SHARD_PAGE_BUFFER pages ahead of the consumer, plus those
+        held for completion, and the next shard starts once the oldest one
+        has been consumed. Closing the iterator stops the workers after the
+        page they are fetching.
+
+        Args:
+            shards: Range qualifiers of the shards, as returned by plan
+            fetch_page: Fetches one page of results for a shard and cursor
+            complete: Fills in the nested connections of a list of nodes in
+                place, run in the shard's worker over up to
+                SEARCH_COMPLETION_NODES nodes at a time
+            cursor: Cursor to resume the first shard from, for a run
+                continuing where an earlier one stopped
+
+        Yields:
+            (shard, nodes, cursor) for each page, cursor leading to the next
+            page of the shard and None once the shard is done
+        """
+        stopped = threading.Event()
+
+        def put(pages: queue.Queue, item: Any) -> bool:
+            while not stopped.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch_shard(shard: str, pages: queue.Queue, start_cursor: Optional[str]):
+            try:
+                held: List[Tuple[List[Dict[str, Any]], Optional[str]]] = []
+                for nodes, cursor in iter_pages(lambda cursor: fetch_page(shard, cursor), SEARCH_CONNECTION, cursor=start_cursor):
+                    held.append((nodes, cursor))
+                    # Pages are completed a few at a time so their nested pages share requests
+                    if complete and cursor is not None and sum(len(page) for page, _ in held) < SEARCH_COMPLETION_NODES:
+                        continue
+                    if complete:
+                        complete([node for page, _ in held for node in page])
+                    for page in held:
+                        if not put(pages, page):
+                            return
+                    held = []
+                put(pages, _SHARD_DONE)
+            except Exception as e:
+                put(pages, e)
+
+        remaining = iter(shards)
+        in_flight: Deque[Tuple[str, queue.Queue]] = deque()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        def start_next(start_cursor: Optional[str] = None):
+            shard = next(remaining, None)
+            if shard is not None:
+                pages: queue.Queue = queue.Queue(maxsize=SEARCH_SHARD_PAGE_BUFFER)
+                executor.submit(fetch_shard, shard, pages, start_cursor)
+                in_flight.append((shard, pages))
+
+        try:
+            start_next(cursor)
+            for _ in range(self.max_workers - 1):
+                start_next()
+
+            while in_flight:
+                shard, pages = in_flight[0]
+                item = pages.get()
+                if isinstance(item, Exception):
+                    raise item
+                if item is _SHARD_DONE:
+                    in_flight.popleft()
+                    start_next()
+                else:
+                    nodes, page_cursor = item
+                    yield shard, nodes, page_cursor
+        finally:
+            stopped.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def plan_shards(self, build_query: Callable[[str], str], window: Window, end: Optional[datetime.datetime] = None) -> List[Window]:
+        """
+        Split a date range into windows that each match at most result_cap items
+
+        Windows are halved on whole days while they span at least two, then
+        to the second, always from their full length so the windows before
+        end do not depend on it.
+
+        Args:
+            build_query: Builds the search query for a date range
+            window: The range, inclusive at both ends
+            end: Where the range is cut off, the range's own end by default
+
+        Returns:
+            Non-overlapping windows covering the range up to end, in date order
+        """
+        start, window_end = window
+        searched = (start, min(window_end, end or window_end))
+        if searched[0] > searched[1]:
+            return []
+
+        count = self.github_api.get_search_count(build_query(format_window(searched)))
+        if count <= self.result_cap:
+            return [searched] if count > 0 else []
+
+        if window_end - start < datetime.timedelta(seconds=2):
+            print(f"Warning: {count} results in {format_window(searched)} cannot be split further, some will be missed")
+            return [searched]
+
+        days = (window_end - start + datetime.timedelta(seconds=1)).days
+        if days >= 2:
+            middle = start + datetime.timedelta(days=days // 2, seconds=-1)
+        else:
+            middle = (start + (window_end - start) / 2).replace(microsecond=0)
+        return (self.plan_shards(build_query, (start, middle), end)
+                + self.plan_shards(build_query, (middle + datetime.timedelta(seconds=1), window_end), end))
+
+class ShardedQuery:
+    """
+    A search run by ShardedSearch: how to count a window, fetch a page of
+    it and complete the nested connections of its results
+    """
+    def __init__(self, build_query: Callable[[str], str], fetch_page: Callable[[str, Optional[str]], Dict[str, Any]],
+                 complete: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None):
+        self.build_query = build_query
+        self.fetch_page = fetch_page
+        self.complete = complete
+
+def get_review_pages(github_api: GitHubAPI, org: str, repo: str, pages: List[Tuple[Dict[str, Any], Optional[str]]]) -> List[Dict[str, Any]]:
+    """Fetch the next page of reviews of several PRs in one request"""
+    response = github_api.get_pull_request_reviews_batch(org, repo, [(pr['number'], cursor) for pr, cursor in pages])
+    repository = (response.get('data') or {}).get('repository')
+    if repository is None:
+        raise Exception(f"GitHub API error: {response.get('errors')}")
+    return [((repository.get(f"pr{i}") or {}).get('reviews') or {}) for i in range(len(pages))]
+
+def complete_reviews(github_api: GitHubAPI, org: str, repo: str, prs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fetch the reviews past the first page of every PR and keep one per reviewer, in place"""
+    complete_connections(prs, 'reviews', lambda pages: get_review_pages(github_api, org, repo, pages), REVIEW_PAGE_BATCH_SIZE)
+    for pr in prs:
+        dedupe_reviews(pr)
+    return prs
+
+def dedupe_reviews(pr: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep the first review of every reviewer of a PR, in place"""
+    reviews = pr.get('reviews')
+    if reviews and reviews.get('nodes'):
+        reviewers = set()
+        unique = []
+        for review in reviews['nodes']:
+            login = ((review or {}).get('author') or {}).get('login')
+            if login and login not in reviewers:
+                reviewers.add(login)
+                unique.append(review)
+        reviews['nodes'] = unique
+    return pr
+
+def format_window(window: Window) -> str:
+    """Format a window as an inclusive range for a search qualifier"""
+    start, end = window
+    return f"{start.strftime(RANGE_TIMESTAMP_FORMAT)}..{end.strftime(RANGE_TIMESTAMP_FORMAT)}"
@@ -0,0 +1,32 @@
+import os
+from typing import Any, Dict
+from models import ShardTask
+from aws_clients import get_client
+from github_api import GitHubAPI
+from rate_limiter import RateLimitThrottle
+from handler import get_github_token, process_shard
+from sharded_runner import S3PartialStore
+from metrics import PipelineMetrics, create_metrics_sink, PER_USER_FETCH_PHASE
+
+def handler(event: ShardTask, context: Any) -> Dict[str, Any]:
+    """
+    Lambda handler for one shard of a fanned-out leaderboard run
+
+    Fetches the contributions of the users in the shard and writes them to S3
+    for the reducer in the main leaderboard function.
+    """
+    print(f"Processing shard {event['shardIndex']} of run {event['runId']} with {len(event['usernames'])} contributors")
+
+    s3_bucket = os.environ.get('BUCKET_NAME')
+    if not s3_bucket:
+        raise ValueError("BUCKET_NAME environment variable is not set")
+
+    metrics = PipelineMetrics(create_metrics_sink(os.environ.get('METRICS_SINK')), {'Mode': event['mode']}, {'RunId': event['runId']})
+    github_api = GitHubAPI(get_github_token(), RateLimitThrottle(), token_refresher=lambda: get_github_token(refresh=True))
+    metrics.track(github_api.transport)
+    with metrics.span(PER_USER_FETCH_PHASE, Repository=f"{event['org']}/{event['repo']}", Shard=event['shardIndex'], Contributors=len(event['usernames'])):
+        partial = process_shard(github_api, event)
+
+    partial_key = S3PartialStore(get_client('s3'), s3_bucket).save(event, partial)
+    print(f"Saved {len(partial)} contributors to s3://{s3_bucket}/{partial_key}")
+    return {'partialKey': partial_key}
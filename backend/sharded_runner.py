@@ -0,0 +1,183 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from models import Contributor, ShardTask
+
+def shard_for(username: str, shard_count: int) -> int:
+    """
+    Get the shard a user belongs to
+
+    A stable hash is used so a user lands on the same shard in every
+    invocation, unlike Python's per-process salted hash().
+    """
+    digest = hashlib.md5(username.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+def partition_contributors(usernames: List[str], shard_count: int) -> List[List[str]]:
+    """Split users into shard_count groups by username hash, keeping their order within each group"""
+    shards: List[List[str]] = [[] for _ in range(shard_count)]
+    for username in usernames:
+        shards[shard_for(username, shard_count)].append(username)
+    return shards
+
+class InMemoryPartialStore:
+    """
+    Keeps shard results in memory, for running every shard in one process
+    """
+    def __init__(self):
+        self.partials: Dict[str, Dict[str, Contributor]] = {}
+
+    def save(self, task: ShardTask, partial: Dict[str, Contributor]) -> str:
+        key = get_partial_key(task)
+        self.partials[key] = partial
+        return key
+
+    def load(self, key: str) -> Dict[str, Contributor]:
+        return self.partials[key]
+
+    def delete(self, keys: List[str]):
+        for key in keys:
+            self.partials.pop(key, None)
+
+class S3PartialStore:
+    """
+    Keeps shard results in S3, so separate Lambda invocations can hand them to the reducer
+    """
+    def __init__(self, s3_client: Any, bucket: str):
+        self.s3_client = s3_client
+        self.bucket = bucket
+
+    def save(self, task: ShardTask, partial: Dict[str, Contributor]) -> str:
+        key = get_partial_key(task)
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=json.dumps(partial),
+            ContentType='application/json'
+        )
+        return key
+
+    def load(self, key: str) -> Dict[str, Contributor]:
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        return json.loads(response['Body'].read().decode('utf-8'))
+
+    def delete(self, keys: List[str]):
+        for key in keys:
+            self.s3_client.delete_object(Bucket=self.bucket, Key=key)
+
+def get_partial_key(task: ShardTask) -> str:
+    """Get the key a shard writes its partial result to"""
+    return f"leaderboard/partials/{task['runId']}/shard-{task['shardIndex']}.json"
+
+class LocalShardExecutor:
+    """
+    Runs every shard in the current process, standing in for worker Lambda invocations
+    """
+    def __init__(self, worker: Callable[[ShardTask], Dict[str, Contributor]], partial_store: Any, max_workers: Optional[int] = None):
+        """
+        Args:
+            worker: Processes one shard and returns its contributor records
+            partial_store: Where each shard's result is written
+            max_workers: Shards run at the same time, all of them by default
+        """
+        self.worker = worker
+        self.partial_store = partial_store
+        self.max_workers = max_workers
+
+    def run(self, tasks: List[ShardTask]) -> List[str]:
+        """Run the shards and return the keys of their partial results"""
+        def run_task(task: ShardTask) -> str:
+            return self.partial_store.save(task, self.worker(task))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers or max(len(tasks), 1)) as executor:
+            return list(executor.map(run_task, tasks))
+
+class LambdaShardExecutor:
+    """
+    Runs every shard in its own invocation of the shard worker Lambda
+    """
+    def __init__(self, function_name: str, lambda_client: Any, max_workers: Optional[int] = None):
+        """
+        Args:
+            function_name: Name or ARN of the shard worker function
+            lambda_client: A boto3 Lambda client with a read timeout longer than
+                the worker's and no retries, so a slow shard is never invoked twice
+            max_workers: Invocations in flight at the same time, all of them by default
+        """
+        self.function_name = function_name
+        self.lambda_client = lambda_client
+        self.max_workers = max_workers
+
+    def run(self, tasks: List[ShardTask]) -> List[str]:
+        """Invoke the worker for every shard and return the keys of their partial results"""
+        def invoke(task: ShardTask) -> str:
+            response = self.lambda_client.invoke(
+                FunctionName=self.function_name,
+                InvocationType='RequestResponse',
+                Payload=json.dumps(task).encode('utf-8')
+            )
+            payload = json.loads(response['Payload'].read().decode('utf-8'))
+            if response.get('FunctionError'):
+                raise Exception(f"Shard {task['shardIndex']} failed: {payload}")
+            return payload['partialKey']
+
+        with ThreadPoolExecutor(max_workers=self.max_workers or max(len(tasks), 1)) as executor:
+            return list(executor.map(invoke, tasks))
+
+class ShardedRunner:
+    """
+    Fans contributor processing out to shard workers and merges their partial results
+    """
+    def __init__(self, executor: Any, partial_store: Any, shard_count: int, run_id: str):
+        """
+        Args:
+            executor: LocalShardExecutor or LambdaShardExecutor
+            partial_store: The store the executor's workers write to
+            shard_count: Number of shards to split contributors into
+            run_id: Identifies this run's partial results
+        """
+        self.executor = executor
+        self.partial_store = partial_store
+        self.shard_count = shard_count
+        self.run_id = run_id
+
+    def run(self, org: str, repo: str, mode: str, usernames: List[str], discussion_counts: Dict[str, int], max_workers: int) -> Dict[str, Contributor]:
+        """
+        Process contributors across shards
+
+        Returns:
+            Contributor records of every user, keyed by username
+        """
+        tasks: List[ShardTask] = []
+        for shard_index, shard_usernames in enumerate(partition_contributors(usernames, self.shard_count)):
+            if not shard_usernames:
+                continue
+            tasks.append({
+                'runId': self.run_id,
+                'shardIndex': shard_index,
+                'org': org,
+                'repo': repo,
+                'mode': mode,
+                'maxWorkers': max_workers,
+                'usernames': shard_usernames,
+                'discussionCounts': {username: discussion_counts[username] for username in shard_usernames if username in discussion_counts}
+            })
+
+        print(f"Processing {len(usernames)} contributors across {len(tasks)} shards")
+        keys = self.executor.run(tasks)
+        merged = reduce_partials([self.partial_store.load(key) for key in keys])
+        self.partial_store.delete(keys)
+        return merged
+
+def reduce_partials(partials: List[Dict[str, Contributor]]) -> Dict[str, Contributor]:
+    """
+    Merge shard results into one set of contributor records, highest score first
+
+    Shards never share a user, but a user repeated across partials keeps the
+    record seen last so re-run shards replace earlier attempts.
+    """
+    merged: Dict[str, Contributor] = {}
+    for partial in partials:
+        merged.update(partial)
+    return dict(sorted(merged.items(), key=lambda item: item[1]['totalScore'], reverse=True))
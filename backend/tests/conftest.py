@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+from botocore.exceptions import ClientError
+from fake_github_server import FakeGitHubServer, SyntheticBackend
+from synthetic_github import SyntheticGitHub, SyntheticRepository
+from github_api import GitHubAPI
+from http_transport import HTTPTransport
+from checkpoint import Deadline
+
+# Contributors in the synthetic repository most tests run against, small enough for per-user mode
+CONTRIBUTORS = 150
+
+class InterruptingDeadline(Deadline):
+    """Runs out at every interval-th check, as if each invocation only had time for a few pages"""
+    def __init__(self, interval: int):
+        super().__init__(None)
+        self.interval = interval
+        self.checks = 0
+
+    def expired(self) -> bool:
+        self.checks += 1
+        return self.checks % self.interval == 0
+
+@pytest.fixture(scope='session')
+def start_server() -> Callable[..., FakeGitHubServer]:
+    """Start fake GitHub servers for synthetic repositories, stopped at the end of the session"""
+    servers: List[FakeGitHubServer] = []
+
+    def start(repository: SyntheticRepository, **kwargs: Any) -> FakeGitHubServer:
+        """Start a server, kwargs such as latency and budget going to FakeGitHubServer"""
+        server = FakeGitHubServer(('127.0.0.1', 0), SyntheticBackend(SyntheticGitHub(repository)), **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture(scope='session')
+def repository() -> SyntheticRepository:
+    return SyntheticRepository(CONTRIBUTORS, seed=1)
+
+@pytest.fixture(scope='session')
+def fake_github(start_server, repository) -> FakeGitHubServer:
+    return start_server(repository)
+
+def base_url(server: FakeGitHubServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+@pytest.fixture
+def make_github_api(fake_github) -> Callable[..., GitHubAPI]:
+    """Build GitHub clients talking to the fake server, or to another one passed as server"""
+    def make(server: Any = None, **kwargs: Any) -> GitHubAPI:
+        transport = kwargs.pop('transport', None) or HTTPTransport(base_url=base_url(server or fake_github), backoff_base=0.01)
+        return GitHubAPI('test-token', kwargs.pop('throttle', None), transport, **kwargs)
+
+    return make
+
+@pytest.fixture
+def github_api(make_github_api) -> GitHubAPI:
+    return make_github_api()
+
+def etag(body: bytes) -> str:
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+class FakeS3:
+    """In-memory stand-in for the S3 client calls the backend makes, on a single bucket"""
+    def __init__(self):
+        self.objects: Dict[str, Dict[str, Any]] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: Any, IfMatch: Optional[str] = None, IfNoneMatch: Optional[str] = None,
+                   **kwargs: Any) -> Dict[str, Any]:
+        stored = self.objects.get(Key)
+        if (IfMatch is not None and (stored is None or etag(stored['Body']) != IfMatch)) or (IfNoneMatch == '*' and stored is not None):
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+        body = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        self.objects[Key] = dict(kwargs, Body=body)
+        return {'ETag': etag(body)}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        stored = self._get(Key, 'GetObject')
+        return {'Body': io.BytesIO(stored['Body']), 'ETag': etag(stored['Body']), 'Metadata': stored.get('Metadata', {})}
+
+    def head_object(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        stored = self._get(Key, 'HeadObject')
+        return {'ContentLength': len(stored['Body']), 'Metadata': stored.get('Metadata', {})}
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        self.objects.pop(Key, None)
+        return {}
+
+    def get_paginator(self, operation: str) -> Any:
+        assert operation == 'list_objects_v2'
+        objects = self.objects
+
+        class Paginator:
+            def paginate(self, Bucket: str, Prefix: str = '') -> List[Dict[str, Any]]:
+                return [{'Contents': [{'Key': key} for key in sorted(objects) if key.startswith(Prefix)]}]
+
+        return Paginator()
+
+    def json(self, key: str) -> Any:
+        """Read a stored JSON object, gunzipping it if it was uploaded compressed"""
+        stored = self.objects[key]
+        body = gzip.decompress(stored['Body']) if stored.get('ContentEncoding') == 'gzip' else stored['Body']
+        return json.loads(body.decode('utf-8'))
+
+    def _get(self, key: str, operation: str) -> Dict[str, Any]:
+        if key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey' if operation == 'GetObject' else '404'}}, operation)
+        return self.objects[key]
+
+@pytest.fixture
+def s3() -> FakeS3:
+    return FakeS3()
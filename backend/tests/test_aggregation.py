@@ -0,0 +1,70 @@
+import datetime
+import json
+
+import search_sharding
+from search_sharding import ShardedSearch
+from checkpoint import DeadlineExceeded, RunCheckpoint
+from conftest import InterruptingDeadline
+from handler import process_contributions
+from http_transport import HTTPTransport
+from replay import RecordingTransport, ReplayTransport, load_fixture
+from constants import AGGREGATE_MODE, PER_USER_MODE
+
+def test_aggregate_matches_per_user(github_api, make_github_api):
+    aggregated = process_contributions(github_api, 'synthetic', 'repository', AGGREGATE_MODE)
+    per_user = process_contributions(make_github_api(), 'synthetic', 'repository', PER_USER_MODE)
+
+    assert aggregated
+    assert aggregated == per_user
+
+def test_aggregate_uses_fewer_requests(fake_github, make_github_api):
+    fake_github.reset_stats()
+    process_contributions(make_github_api(), 'synthetic', 'repository', AGGREGATE_MODE)
+    aggregate_requests = fake_github.stats['requests']
+
+    fake_github.reset_stats()
+    contributors = process_contributions(make_github_api(), 'synthetic', 'repository', PER_USER_MODE)
+
+    # Per-user mode runs the discovery scan too, then three searches per user
+    assert fake_github.stats['requests'] >= aggregate_requests + 3 * len(contributors)
+
+def test_aggregate_replay_matches_per_user(fake_github, make_github_api, monkeypatch, tmp_path):
+    # Replays only answer the recorded queries, so the shard ranges must end at the same time
+    recorded_at = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    monkeypatch.setattr(search_sharding, 'utc_now', lambda: recorded_at)
+
+    recording = RecordingTransport(HTTPTransport(base_url=f"http://127.0.0.1:{fake_github.server_address[1]}"), recorded_at.isoformat())
+    recorded = process_contributions(make_github_api(transport=recording), 'synthetic', 'repository', AGGREGATE_MODE)
+    fixture = str(tmp_path / 'aggregate.json.gz')
+    recording.save(fixture)
+
+    replay = ReplayTransport.from_fixture(fixture)
+    replayed = process_contributions(make_github_api(transport=replay), 'synthetic', 'repository', AGGREGATE_MODE)
+    per_user = process_contributions(make_github_api(), 'synthetic', 'repository', PER_USER_MODE)
+
+    assert replay.requests == len(load_fixture(fixture)['responses'])
+    assert replayed == recorded
+    assert replayed == per_user
+
+def test_interrupted_discovery_resumes_from_the_checkpoint(make_github_api):
+    def run(**kwargs) -> dict:
+        github_api = make_github_api()
+        # Windows of at most 60 results, so the scan spans several shards
+        return process_contributions(github_api, 'synthetic', 'repository', AGGREGATE_MODE, search=ShardedSearch(github_api, result_cap=60), **kwargs)
+
+    expected = run()
+
+    checkpoint = RunCheckpoint()
+    interrupted_scans = 0
+    while True:
+        try:
+            resumed = run(checkpoint=checkpoint, deadline=InterruptingDeadline(2))
+            break
+        except DeadlineExceeded:
+            # Saved to S3 and loaded by the next invocation
+            checkpoint = RunCheckpoint(json.loads(json.dumps(checkpoint.to_dict())))
+            assert checkpoint.aggregation is not None or checkpoint.discovery is not None
+            interrupted_scans += checkpoint.discovery is not None
+
+    assert interrupted_scans >= 4
+    assert resumed == expected
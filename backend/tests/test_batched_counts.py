@@ -0,0 +1,67 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from github_api import GitHubAPI
+from handler import process_contributions
+from constants import BATCHED_MODE, PER_USER_MODE
+
+class LimitedGitHubAPI(GitHubAPI):
+    """Answers count batches locally, failing the ones larger than a limit with the given errors"""
+    def __init__(self, limit: int, errors: List[Dict[str, Any]]):
+        super().__init__('test-token')
+        self.limit = limit
+        self.errors = errors
+        self.batch_sizes: List[int] = []
+
+    def get_contributor_counts_batch(self, org: str, repo: str, usernames: List[str]) -> Dict[str, Any]:
+        self.batch_sizes.append(len(usernames))
+        if len(usernames) > self.limit:
+            return {'errors': self.errors}
+        data: Dict[str, Any] = {'rateLimit': {'cost': 1}}
+        for i, username in enumerate(usernames):
+            data[f"prs{i}"] = data[f"reviews{i}"] = data[f"issues{i}"] = {'issueCount': len(username)}
+        return {'data': data}
+
+def test_batched_counts_match_per_user(github_api, make_github_api):
+    batched = process_contributions(github_api, 'synthetic', 'repository', BATCHED_MODE)
+    per_user = process_contributions(make_github_api(), 'synthetic', 'repository', PER_USER_MODE)
+
+    assert batched
+    assert batched == per_user
+
+def test_batch_shrinks_on_query_limit_errors():
+    github_api = LimitedGitHubAPI(7, [{'type': 'MAX_NODE_LIMIT_EXCEEDED', 'message': 'This query requests too many nodes'}])
+    usernames = [f"user{i}" for i in range(40)]
+
+    counts = github_api.get_contributor_counts('org', 'repo', usernames)
+
+    assert sorted(counts) == sorted(usernames)
+    # 20 and 10 fail, 5 succeeds, then it doubles up to 9, below the smallest failed size
+    assert github_api.batch_sizes[:3] == [20, 10, 5]
+    assert max(github_api.batch_sizes[3:]) <= 9
+    # The next call starts over from the configured size
+    assert github_api.count_batch_size == 20
+
+@pytest.mark.parametrize('errors', [
+    [{'type': 'FORBIDDEN', 'message': 'Resource not accessible by integration'}],
+    [{'message': 'Bad credentials'}]
+])
+def test_other_errors_are_raised_without_shrinking(errors):
+    github_api = LimitedGitHubAPI(0, errors)
+
+    with pytest.raises(Exception, match='GitHub API error'):
+        github_api.get_contributor_counts('org', 'repo', ['a', 'b', 'c'])
+    assert github_api.batch_sizes == [3]
+
+def test_request_failures_are_raised_without_shrinking():
+    class FailingGitHubAPI(LimitedGitHubAPI):
+        def get_contributor_counts_batch(self, org: str, repo: str, usernames: List[str]) -> Dict[str, Any]:
+            self.batch_sizes.append(len(usernames))
+            raise Exception('GitHub API error: 502 - Bad Gateway')
+
+    github_api = FailingGitHubAPI(0, [])
+
+    with pytest.raises(Exception, match='502'):
+        github_api.get_contributor_counts('org', 'repo', ['a', 'b', 'c'])
+    assert github_api.batch_sizes == [3]
@@ -0,0 +1,66 @@
+import datetime
+import json
+import time
+
+from synthetic_github import SyntheticRepository
+from contribution_store import ContributionStore
+from discussion_analyzer import DiscussionAnalyzer
+from search_sharding import ShardedSearch
+from checkpoint import DeadlineExceeded
+from conftest import InterruptingDeadline
+from constants import CONTRIBUTIONS_START_DATE, EXCLUDED_LABELS
+
+def refresh(store: ContributionStore, github_api):
+    store.refresh(github_api, DiscussionAnalyzer(github_api), 'synthetic', 'repository')
+
+def relabel(repository: SyntheticRepository, position: int, labels: tuple):
+    """Change a PR's labels, which bumps its updatedAt like on GitHub"""
+    number, author, merged_at, _, reviewers, _ = repository.pull_requests[position]
+    repository.pull_requests[position] = (number, author, merged_at, int(time.time()) + 1, reviewers, labels)
+    repository._index()
+
+def test_relabelled_pull_request_is_recounted(start_server, make_github_api):
+    # A repository of its own, since this test edits it
+    repository = SyntheticRepository(60, seed=2)
+    github_api = make_github_api(start_server(repository))
+    store = ContributionStore()
+    refresh(store, github_api)
+
+    start = datetime.datetime.fromisoformat(CONTRIBUTIONS_START_DATE).replace(tzinfo=datetime.timezone.utc).timestamp()
+    position = next(i for i, pr in enumerate(repository.pull_requests) if pr[2] >= start and not set(pr[5]) & set(EXCLUDED_LABELS))
+    author = repository.usernames[repository.pull_requests[position][1]]
+    counted = store.get_user_pr_count(author)
+    assert counted > 0
+
+    relabel(repository, position, (EXCLUDED_LABELS[0],))
+    refresh(store, github_api)
+    assert store.get_user_pr_count(author) == counted - 1
+
+    relabel(repository, position, ())
+    refresh(store, github_api)
+    assert store.get_user_pr_count(author) == counted
+
+def test_interrupted_refresh_resumes_from_its_progress(github_api):
+    expected = ContributionStore()
+    refresh(expected, github_api)
+
+    store = ContributionStore()
+    progress = None
+    interrupted = 0
+    while True:
+        store.progress = progress
+        try:
+            # Windows of at most 60 results, so the searches take several invocations
+            store.refresh(github_api, DiscussionAnalyzer(github_api), 'synthetic', 'repository',
+                          deadline=InterruptingDeadline(2), search=ShardedSearch(github_api, result_cap=60))
+            break
+        except DeadlineExceeded:
+            # The store and the checkpoint are saved to S3 and loaded by the next invocation
+            assert store.watermark is None
+            progress = json.loads(json.dumps(store.progress))
+            store = ContributionStore(json.loads(json.dumps(store.to_dict())))
+            interrupted += 1
+
+    assert interrupted >= 4
+    assert store.watermark is not None
+    assert dict(store.to_dict(), watermark=None) == dict(expected.to_dict(), watermark=None)
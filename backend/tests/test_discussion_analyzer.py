@@ -0,0 +1,24 @@
+import json
+import time
+
+from synthetic_github import SyntheticRepository
+from discussion_analyzer import DiscussionAnalyzer, DiscussionIndex
+
+def test_later_scans_fetch_a_single_page(start_server, make_github_api):
+    # Enough discussions for several pages
+    server = start_server(SyntheticRepository(1500, seed=3))
+    first = DiscussionAnalyzer(make_github_api(server))
+    first.initialize_discussions('synthetic', 'repository')
+    # Saved to S3 and loaded by the next run
+    index = DiscussionIndex(json.loads(json.dumps(first.index.to_dict())))
+
+    server.reset_stats()
+    later = DiscussionAnalyzer(make_github_api(server), index)
+    later.initialize_discussions('synthetic', 'repository')
+    # Time for a page requested in the background to arrive
+    time.sleep(0.5)
+
+    # Nothing was updated since the first scan, so its first page ends it
+    assert server.stats['requests'] == 1
+    assert later.user_discussions == first.user_discussions
+    assert later.user_discussions
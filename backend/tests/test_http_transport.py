@@ -0,0 +1,153 @@
+import gzip
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from http_transport import HTTPTransport
+from checkpoint import DeadlineExceeded
+
+# A scripted response: status, headers and body, or None to drop the connection without answering
+Scripted = Optional[Tuple[int, Dict[str, str], bytes]]
+
+class StubServer(ThreadingHTTPServer):
+    """Answers requests with scripted responses and records what it received"""
+    daemon_threads = True
+
+    def __init__(self, script: List[Scripted], default: Scripted = (200, {}, b'{}')):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.script = list(script)
+        self.default = default
+        self.requests: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def next_response(self) -> Scripted:
+        with self.lock:
+            return self.script.pop(0) if self.script else self.default
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.requests.append({'headers': dict(self.headers), 'port': self.client_address[1]})
+
+        response = self.server.next_response()
+        if response is None:
+            self.close_connection = True
+            return
+        status, headers, body = response
+        if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            body = gzip.compress(body)
+            headers = dict(headers, **{'Content-Encoding': 'gzip'})
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(script: List[Scripted], default: Scripted = (200, {}, b'{}')) -> StubServer:
+        server = StubServer(script, default)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def transport_for(server: StubServer, **kwargs: Any) -> HTTPTransport:
+    return HTTPTransport(base_url=f"http://127.0.0.1:{server.server_address[1]}", backoff_base=0.001, **kwargs)
+
+def test_retries_server_errors_until_success(stub_server):
+    server = stub_server([(502, {}, b'Bad Gateway'), (503, {}, b'Unavailable'), (200, {}, b'{"data": {}}')])
+    transport = transport_for(server)
+
+    response = transport.request('POST', '/graphql', b'{}')
+
+    assert response.status == 200
+    assert response.text() == '{"data": {}}'
+    assert len(server.requests) == 3
+    assert transport.stats()['retries'] == 2
+
+def test_returns_last_error_once_retries_run_out(stub_server):
+    server = stub_server([], default=(502, {}, b'Bad Gateway'))
+    transport = transport_for(server, max_retries=2)
+
+    response = transport.request('POST', '/graphql', b'{}')
+
+    assert response.status == 502
+    assert len(server.requests) == 3
+
+def test_does_not_retry_client_errors(stub_server):
+    server = stub_server([(404, {}, b'Not Found')])
+
+    assert transport_for(server).request('POST', '/graphql', b'{}').status == 404
+    assert len(server.requests) == 1
+
+def test_honours_retry_after(stub_server):
+    server = stub_server([(429, {'Retry-After': '0.3'}, b'Slow down'), (200, {}, b'{}')])
+
+    start = time.monotonic()
+    response = transport_for(server).request('POST', '/graphql', b'{}')
+
+    assert response.status == 200
+    assert time.monotonic() - start >= 0.3
+
+def test_waits_for_the_reset_of_an_exhausted_rate_limit(stub_server):
+    reset = time.time() + 1.5
+    server = stub_server([
+        (403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(reset))}, b'API rate limit exceeded'),
+        (200, {}, b'{}')
+    ])
+
+    response = transport_for(server).request('POST', '/graphql', b'{}')
+
+    assert response.status == 200
+    assert time.time() >= int(reset)
+
+def test_stops_instead_of_sleeping_past_backoff_max(stub_server):
+    reset = time.time() + 3600
+    server = stub_server([
+        (403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(reset))}, b'API rate limit exceeded')
+    ])
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded, match='asked to wait'):
+        transport_for(server).request('POST', '/graphql', b'{}')
+
+    assert time.monotonic() - start < 5
+    assert len(server.requests) == 1
+
+def test_retries_dropped_connections(stub_server):
+    server = stub_server([None, (200, {}, b'{}')])
+
+    assert transport_for(server).request('POST', '/graphql', b'{}').status == 200
+    assert len(server.requests) == 2
+
+def test_requests_gzip_and_reuses_connections(stub_server):
+    body = b'{"data": {"search": {"nodes": []}}}' * 100
+    server = stub_server([], default=(200, {}, body))
+    transport = transport_for(server)
+
+    responses = [transport.request('POST', '/graphql', b'{}') for _ in range(5)]
+
+    assert all(response.body == body for response in responses)
+    assert all('gzip' in request['headers']['Accept-Encoding'] for request in server.requests)
+    # Every request went over the same keep-alive connection
+    assert len({request['port'] for request in server.requests}) == 1
+    # Bytes are counted as received, before decompression
+    assert transport.stats()['bytesReceived'] < 5 * len(body)
@@ -0,0 +1,24 @@
+from contributor_table import ContributorTable
+from handler import build_contributor
+from leaderboard_pages import PAGES_PREFIX, get_page_key, get_index_key, publish_leaderboard_pages
+from publisher import Publisher
+from constants import SCORE_WEIGHTS
+
+def publish(s3, usernames: list) -> Publisher:
+    table = ContributorTable.from_contributors(build_contributor(username, len(usernames) - i, 0, 0, 0) for i, username in enumerate(usernames))
+    publisher = Publisher(s3, 'bucket')
+    publish_leaderboard_pages(publisher, table, SCORE_WEIGHTS, '2025-03-01T00:00:00Z', page_size=2)
+    return publisher
+
+def test_files_of_a_shrunk_board_are_deleted(s3):
+    publish(s3, ['alice', 'bob', 'carol', 'dave', 'erin'])
+    assert get_page_key(3) in s3.objects
+
+    publisher = publish(s3, ['alice', 'bob', 'carol'])
+
+    assert sorted(key for key in s3.objects if key.startswith(PAGES_PREFIX)) == sorted([
+        get_page_key(1), get_page_key(2), get_index_key('al'), get_index_key('bo'), get_index_key('ca'), f"{PAGES_PREFIX}manifest.json"
+    ])
+    # Deleted files are invalidated with the changed ones
+    assert {get_page_key(3), get_index_key('da'), get_index_key('er')} <= set(publisher.report()['changed'])
+    assert s3.json(get_page_key(2))['contributors'][0]['username'] == 'carol'
@@ -0,0 +1,71 @@
+from publisher import Publisher, archive_leaderboard
+from rank_history import RankHistory, S3ObjectStore, compact_history, publish_rank_history, get_user_history_key, MOVERS_KEY, HISTORY_PREFIX, RECORD
+from constants import HISTORY_SEGMENT_LIMIT
+
+def leaderboard(last_updated: str, *ranking: str):
+    return {
+        'lastUpdated': last_updated,
+        'contributors': [{'username': username, 'totalScore': 100 - rank} for rank, username in enumerate(ranking)]
+    }
+
+def publish_run(s3, data, timestamp: str) -> Publisher:
+    """Archive a leaderboard, compact the history and publish it, as the handler does"""
+    publisher = Publisher(s3, 'bucket')
+    archive_leaderboard(s3, 'bucket', data, timestamp)
+    history = compact_history(S3ObjectStore(s3, 'bucket'))
+    publish_rank_history(publisher, history, data['lastUpdated'])
+    return publisher
+
+def test_rank_history_is_published_per_user(s3):
+    publish_run(s3, leaderboard('2025-01-01T00:00:00', 'alice', 'bob', 'carol'), '2025-01-01-00-00-00')
+    publish_run(s3, leaderboard('2025-01-02T00:00:00', 'carol', 'alice', 'bob'), '2025-01-02-00-00-00')
+
+    assert s3.json(get_user_history_key('carol')) == {
+        'lastUpdated': '2025-01-02T00:00:00',
+        'username': 'carol',
+        'history': [
+            {'timestamp': '2025-01-01T00:00:00', 'rank': 3, 'totalScore': 98},
+            {'timestamp': '2025-01-02T00:00:00', 'rank': 1, 'totalScore': 100}
+        ]
+    }
+    assert s3.json(MOVERS_KEY)['movers'][0] == {'username': 'carol', 'from': 3, 'to': 1, 'change': 2}
+
+def test_only_users_in_new_archives_are_republished(s3):
+    publish_run(s3, leaderboard('2025-01-01T00:00:00', 'alice', 'bob'), '2025-01-01-00-00-00')
+
+    publisher = publish_run(s3, leaderboard('2025-01-02T00:00:00', 'bob'), '2025-01-02-00-00-00')
+
+    assert publisher.changed == [get_user_history_key('bob'), MOVERS_KEY]
+    assert len(s3.json(get_user_history_key('alice'))['history']) == 1
+    assert len(s3.json(get_user_history_key('bob'))['history']) == 2
+
+def test_concurrent_compactions_fold_each_archive_once(s3):
+    store = S3ObjectStore(s3, 'bucket')
+    archive_leaderboard(s3, 'bucket', leaderboard('2025-01-01T00:00:00', 'alice', 'bob'), '2025-01-01-00-00-00')
+    compact_history(store)
+    archive_leaderboard(s3, 'bucket', leaderboard('2025-01-02T00:00:00', 'bob', 'alice'), '2025-01-02-00-00-00')
+
+    # Both load the history before either saves
+    first, second = RankHistory.load(store), RankHistory.load(store)
+    assert first.compact(store) == second.compact(store) == 1
+    assert first.save(store)
+    assert not second.save(store)
+
+    history = RankHistory.load(store)
+    assert history.timestamps == ['2025-01-01T00:00:00', '2025-01-02T00:00:00']
+    assert [entry['rank'] for entry in history.rank_history('bob')] == [2, 1]
+
+def test_saves_only_write_the_new_records(s3):
+    store = S3ObjectStore(s3, 'bucket')
+    for day in range(1, HISTORY_SEGMENT_LIMIT + 2):
+        archive_leaderboard(s3, 'bucket', leaderboard(f"2025-01-{day:02d}T00:00:00", 'alice', 'bob'), f"2025-01-{day:02d}-00-00-00")
+        history = compact_history(store)
+        segments = [key for key in s3.objects if key.startswith(f"{HISTORY_PREFIX}series-")]
+        if day <= HISTORY_SEGMENT_LIMIT:
+            assert len(s3.objects[segments[-1]]['Body']) == 2 * RECORD.size
+        else:
+            # Merged back into one segment
+            assert segments == history.segments
+
+    assert len(history.rank_history('alice')) == HISTORY_SEGMENT_LIMIT + 1
+    assert len(RankHistory.load(store).rank_history('bob')) == HISTORY_SEGMENT_LIMIT + 1
@@ -0,0 +1,41 @@
+import json
+import time
+
+from fake_github_server import RateLimitBudget
+from rate_limiter import RateLimitThrottle
+from handler import process_contributions
+from constants import PER_USER_MODE
+
+def test_throttled_concurrent_run_matches_serial(start_server, repository, make_github_api):
+    # A short window keeps the pacing quick while every request still reports a reset ahead
+    server = start_server(repository, budget=RateLimitBudget(limit=1_000_000, window=5.0))
+    serial = process_contributions(make_github_api(server), 'synthetic', 'repository', PER_USER_MODE, max_workers=1)
+
+    # Every request goes through the slowdown branch, as it does once the real budget runs low
+    throttle = RateLimitThrottle(slowdown_threshold=10_000_000)
+    concurrent = process_contributions(make_github_api(server, throttle=throttle), 'synthetic', 'repository', PER_USER_MODE, max_workers=8)
+
+    assert serial
+    assert json.dumps(concurrent) == json.dumps(serial)
+    assert throttle.remaining is not None
+
+def test_throttle_spreads_remaining_budget_until_reset():
+    throttle = RateLimitThrottle(reserve=10, slowdown_threshold=100)
+    throttle.update_from_headers({'X-RateLimit-Remaining': '20', 'X-RateLimit-Reset': str(time.time() + 0.2)})
+
+    start = time.monotonic()
+    for _ in range(5):
+        throttle.wait()
+
+    # 0.2s spread over the 10 requests above the reserve, one every 20ms
+    assert time.monotonic() - start >= 0.07
+    assert throttle.remaining == 15
+
+def test_throttle_holds_requests_until_reset_once_budget_is_spent():
+    throttle = RateLimitThrottle(reserve=10)
+    throttle.update_from_headers({'X-RateLimit-Remaining': '10', 'X-RateLimit-Reset': str(time.time() + 0.1)})
+
+    start = time.monotonic()
+    throttle.wait()
+
+    assert time.monotonic() - start >= 0.09
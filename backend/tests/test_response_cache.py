@@ -0,0 +1,74 @@
+import datetime
+import os
+
+from search_sharding import ShardedSearch, RANGE_TIMESTAMP_FORMAT
+from response_cache import DiskCacheBackend, MemoryCacheBackend, ResponseCache, query_kind
+from handler import process_contributions
+from constants import AGGREGATE_MODE
+
+def test_second_run_is_answered_by_the_cache(fake_github, make_github_api):
+    cache = ResponseCache(MemoryCacheBackend())
+
+    def run() -> dict:
+        github_api = make_github_api(cache=cache)
+        # Windows of at most 60 results, so most of the scan is in windows that have closed
+        return process_contributions(github_api, 'synthetic', 'repository', AGGREGATE_MODE, search=ShardedSearch(github_api, result_cap=60))
+
+    fake_github.reset_stats()
+    first = run()
+    first_requests = fake_github.stats['requests']
+
+    fake_github.reset_stats()
+    second = run()
+
+    assert second == first
+    # Only the window still open, its count and the discussion pages are fetched again
+    assert fake_github.stats['requests'] <= first_requests // 4
+
+def test_closed_windows_do_not_depend_on_the_end():
+    class CountingAPI:
+        """Counts 100 results a day"""
+        def get_search_count(self, query: str) -> int:
+            start, end = (datetime.datetime.strptime(bound, RANGE_TIMESTAMP_FORMAT) for bound in query.split('..'))
+            return int((end - start).total_seconds() / 864)
+
+    search = ShardedSearch(CountingAPI(), result_cap=1000)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(2024, 3, 10, 13, 45, tzinfo=datetime.timezone.utc)
+
+    shards = search.plan(lambda window: window, start, end)
+    later = search.plan(lambda window: window, start, end + datetime.timedelta(hours=5))
+
+    # Every window but the last ends on a day boundary and is planned the same way later
+    assert shards[:-1] == later[:-1]
+    assert all(shard.endswith('T23:59:59+00:00') for shard in shards[:-1])
+    assert shards[-1].endswith('2024-03-10T13:45:00+00:00')
+
+def test_discussion_pages_are_not_cached():
+    cache = ResponseCache(MemoryCacheBackend())
+    discussions = 'query($org: String!, $repo: String!) { repository(owner: $org, name: $repo) { discussions(first: 100) { nodes { number } } } }'
+    reviews = 'query($org: String!, $repo: String!) { repository(owner: $org, name: $repo) { pr0: pullRequest(number: 1) { number } } }'
+
+    assert query_kind(discussions) == 'repository.discussions'
+    assert query_kind(reviews) == 'repository.pullRequest'
+
+    cache.set(discussions, {}, {'data': {}})
+    cache.set(reviews, {}, {'data': {}})
+    assert cache.get(discussions, {}) is None
+    assert cache.get(reviews, {}) == {'data': {}}
+
+def test_disk_cache_lists_its_files_only_when_over_the_cap(tmp_path, monkeypatch):
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: scans.append(path) or scandir(path))
+    backend = DiskCacheBackend(str(tmp_path), max_bytes=10000)
+
+    for i in range(500):
+        backend.set(f"key{i}", b'x' * 100)
+
+    # Once when opened, then once per eviction down to 90% of the cap
+    assert len(scans) <= 1 + 500 // 10
+    assert backend.evictions > 0
+    assert backend.size == sum(entry.stat().st_size for entry in scandir(str(tmp_path)))
+    assert backend.size <= 10000
+    assert backend.get('key499') == b'x' * 100
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+import pytest
+
+from http_transport import HTTPTransport
+from rest_api import ETagStore, GitHubRestAPI
+
+class IssueListingServer(ThreadingHTTPServer):
+    """Serves an issue listing most recently updated first, answering If-None-Match with 304 like GitHub"""
+    daemon_threads = True
+
+    def __init__(self, issues: List[Dict[str, Any]]):
+        super().__init__(('127.0.0.1', 0), IssueListingHandler)
+        self.issues = issues
+        self.statuses: List[int] = []
+
+class IssueListingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        page, per_page = int(params['page'][0]), int(params['per_page'][0])
+        issues = sorted(self.server.issues, key=lambda issue: issue['updated_at'], reverse=True)
+        body = json.dumps(issues[(page - 1) * per_page:page * per_page]).encode('utf-8')
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+
+        if self.headers.get('If-None-Match') == etag:
+            self.server.statuses.append(304)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.server.statuses.append(200)
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+def make_issue(number: int, updated_at: str) -> Dict[str, Any]:
+    return {
+        'number': number,
+        'user': {'login': f"user{number % 7}"},
+        'created_at': '2024-06-01T00:00:00Z',
+        'updated_at': updated_at,
+        'labels': []
+    }
+
+@pytest.fixture
+def issue_server():
+    issues = [make_issue(number, f"2025-01-{1 + number % 28:02d}T{number % 24:02d}:00:00Z") for number in range(1, 251)]
+    server = IssueListingServer(issues)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_rest_api(server: IssueListingServer, etag_store: ETagStore) -> GitHubRestAPI:
+    return GitHubRestAPI('test-token', etag_store, transport=HTTPTransport(base_url=f"http://127.0.0.1:{server.server_address[1]}"))
+
+def test_unchanged_pages_are_answered_with_304(issue_server):
+    first = make_rest_api(issue_server, ETagStore())
+    issues = list(first.iter_issues('org', 'repo'))
+
+    # The next run loads the store saved to S3 by this one
+    etag_store = ETagStore(json.loads(json.dumps(first.etag_store.to_dict())))
+    second = make_rest_api(issue_server, etag_store)
+
+    assert len(issues) == 250
+    assert list(second.iter_issues('org', 'repo')) == issues
+    assert (first.modified, first.not_modified) == (3, 0)
+    assert (second.modified, second.not_modified) == (0, 3)
+    assert issue_server.statuses == [200, 200, 200, 304, 304, 304]
+
+def test_changed_pages_are_fetched_again(issue_server):
+    first = make_rest_api(issue_server, ETagStore())
+    list(first.iter_issues('org', 'repo'))
+
+    # Edit the most recently updated issue again, so it stays on the first page
+    latest = max(issue_server.issues, key=lambda issue: issue['updated_at'])
+    latest.update(updated_at='2025-02-01T00:00:00Z', labels=[{'name': 'bug'}])
+    second = make_rest_api(issue_server, first.etag_store)
+    issues = list(second.iter_issues('org', 'repo'))
+
+    assert issues[0]['number'] == latest['number']
+    assert issues[0]['labels'] == {'nodes': [{'name': 'bug'}]}
+    assert (second.modified, second.not_modified) == (1, 2)
+
+def test_listing_stops_at_updated_since(issue_server):
+    rest_api = make_rest_api(issue_server, ETagStore())
+
+    issues = list(rest_api.iter_issues('org', 'repo', '2025-01-26T00:00:00Z'))
+
+    assert issues
+    assert all(issue['updatedAt'] >= '2025-01-26T00:00:00Z' for issue in issues)
+    assert rest_api.modified == 1
+
+def test_listing_stops_on_pages_of_skipped_items(issue_server):
+    # PRs are dropped from the issue listing, so no kept item ever reaches updated_since
+    for issue in issue_server.issues:
+        issue['pull_request'] = {}
+    rest_api = make_rest_api(issue_server, ETagStore())
+
+    issues = list(rest_api.iter_issues('org', 'repo', '2025-01-26T00:00:00Z'))
+
+    assert issues == []
+    assert rest_api.modified == 1
@@ -0,0 +1,76 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from search_sharding import ShardedSearch
+
+PAGES_PER_SHARD = 4
+
+class PagedShards:
+    """Serves PAGES_PER_SHARD pages of two numbered nodes for every shard, recording the pages fetched"""
+    def __init__(self):
+        self.fetched: List[tuple] = []
+        self.lock = threading.Lock()
+
+    def fetch_page(self, shard: str, cursor: Optional[str]) -> Dict[str, Any]:
+        page = int(cursor or 0)
+        with self.lock:
+            self.fetched.append((shard, page))
+        has_next_page = page + 1 < PAGES_PER_SHARD
+        return {'data': {'search': {
+            'nodes': [{'number': f"{shard}-{page}-{i}"} for i in range(2)],
+            'pageInfo': {'hasNextPage': has_next_page, 'endCursor': str(page + 1) if has_next_page else None}
+        }}}
+
+    def shards_started(self) -> set:
+        with self.lock:
+            return {shard for shard, _ in self.fetched}
+
+def test_shard_pages_are_yielded_in_order():
+    server = PagedShards()
+    shards = [f"shard{i}" for i in range(6)]
+
+    pages = list(ShardedSearch(None, max_workers=3).iter_shard_pages(shards, server.fetch_page))
+
+    expected = []
+    for shard in shards:
+        for page in range(PAGES_PER_SHARD):
+            cursor = str(page + 1) if page + 1 < PAGES_PER_SHARD else None
+            expected.append((shard, [{'number': f"{shard}-{page}-{i}"} for i in range(2)], cursor))
+    assert pages == expected
+
+def test_at_most_max_workers_shards_are_in_flight():
+    server = PagedShards()
+    shards = [f"shard{i}" for i in range(8)]
+    pages = ShardedSearch(None, max_workers=2).iter_shard_pages(shards, server.fetch_page)
+
+    for shard, _, _ in pages:
+        # Give the workers time to run ahead as far as they are allowed to
+        time.sleep(0.01)
+        # The shard being consumed and the one after it
+        assert server.shards_started() <= set(shards[:shards.index(shard) + 2])
+
+def test_closing_stops_fetching():
+    server = PagedShards()
+    shards = [f"shard{i}" for i in range(8)]
+    pages = ShardedSearch(None, max_workers=2).iter_shard_pages(shards, server.fetch_page)
+
+    next(pages)
+    pages.close()
+    time.sleep(0.3)
+    fetched = len(server.fetched)
+    time.sleep(0.3)
+
+    assert len(server.fetched) == fetched
+    assert server.shards_started() <= set(shards[:2])
+
+def test_errors_of_a_shard_are_raised_to_the_consumer():
+    def fetch_page(shard: str, cursor: Optional[str]) -> Dict[str, Any]:
+        return {'errors': [{'message': 'Something went wrong'}]}
+
+    pages = ShardedSearch(None, max_workers=2).iter_shard_pages(['shard0', 'shard1'], fetch_page)
+
+    with pytest.raises(Exception, match='Something went wrong'):
+        next(pages)
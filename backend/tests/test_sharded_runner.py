@@ -0,0 +1,56 @@
+import pytest
+
+import handler
+from handler import process_contributions, create_sharded_runner
+from sharded_runner import LambdaShardExecutor, LocalShardExecutor, partition_contributors, reduce_partials, shard_for
+from constants import BATCHED_MODE, PER_USER_MODE
+
+@pytest.mark.parametrize('mode', [PER_USER_MODE, BATCHED_MODE])
+def test_local_shards_match_unsharded_run(make_github_api, monkeypatch, mode):
+    monkeypatch.delenv('SHARD_WORKER_FUNCTION_NAME', raising=False)
+    github_api = make_github_api()
+    runner = create_sharded_runner(github_api, 3, 'test-run', None, None)
+    assert isinstance(runner.executor, LocalShardExecutor)
+
+    sharded = process_contributions(github_api, 'synthetic', 'repository', mode, max_workers=4, sharded_runner=runner)
+    unsharded = process_contributions(make_github_api(), 'synthetic', 'repository', mode)
+
+    assert sharded
+    assert sharded == unsharded
+    # Ranked the same way, highest score first
+    assert list(sharded) == list(unsharded)
+    assert runner.partial_store.partials == {}
+
+def test_lambda_shards_are_invoked_once_and_waited_for(make_github_api, monkeypatch):
+    monkeypatch.setenv('SHARD_WORKER_FUNCTION_NAME', 'shard-worker')
+    clients = []
+    monkeypatch.setattr(handler, 'get_client', lambda service_name, **config: clients.append((service_name, config)) or object())
+
+    runner = create_sharded_runner(make_github_api(), 16, 'test-run', None, 'bucket')
+
+    assert isinstance(runner.executor, LambdaShardExecutor)
+    assert runner.executor.max_workers == 16
+    service_name, config = clients[0]
+    assert service_name == 'lambda'
+    assert config['read_timeout'] > 15 * 60
+    assert config['retries'] == {'max_attempts': 0}
+    assert config['max_pool_connections'] >= 16
+
+def test_partitions_are_stable_and_disjoint():
+    usernames = [f"user{i}" for i in range(200)]
+
+    shards = partition_contributors(usernames, 4)
+
+    assert sorted(username for shard in shards for username in shard) == sorted(usernames)
+    assert all(shard_for(username, 4) == index for index, shard in enumerate(shards) for username in shard)
+    assert shards == partition_contributors(usernames, 4)
+
+def test_reduce_partials_ranks_by_score_and_keeps_reruns():
+    first = {'a': {'username': 'a', 'totalScore': 5}, 'b': {'username': 'b', 'totalScore': 9}}
+    second = {'c': {'username': 'c', 'totalScore': 7}}
+    rerun = {'a': {'username': 'a', 'totalScore': 11}}
+
+    merged = reduce_partials([first, second, rerun])
+
+    assert list(merged) == ['a', 'b', 'c']
+    assert merged['a']['totalScore'] == 11
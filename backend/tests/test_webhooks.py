@@ -0,0 +1,169 @@
+import hashlib
+import hmac
+import json
+import os
+from typing import Any, Dict, List
+
+import pytest
+
+import webhook_handler
+from webhook_events import StoreUpdate
+from handler import save_run_settings, save_run_store
+from contribution_store import ContributionStore, get_store_key, get_store_updates_prefix, delete_store_updates, save_contribution_store, load_contribution_store_version
+from leaderboard_pages import get_page_key
+from time_windows import get_window_leaderboard_key
+from constants import AGGREGATE_MODE, INCREMENTAL_MODE, SCORE_WEIGHTS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SECRET = 'webhook-secret'
+UPDATES_PREFIX = get_store_updates_prefix('aws', 'aws-cdk')
+# Reviews GitHub would return for the PRs merged by the recorded deliveries
+REVIEWERS = {10: ['erin']}
+
+class FakeCloudFront:
+    def __init__(self):
+        self.invalidations: List[List[str]] = []
+
+    def create_invalidation(self, DistributionId: str, InvalidationBatch: Dict[str, Any]) -> Dict[str, Any]:
+        self.invalidations.append(InvalidationBatch['Paths']['Items'])
+        return {}
+
+def load_deliveries(name: str) -> List[Dict[str, Any]]:
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def signed_event(delivery: Dict[str, Any], number: int, secret: str = SECRET) -> Dict[str, Any]:
+    """Build the function URL event GitHub's delivery would arrive as"""
+    body = json.dumps(delivery['payload'])
+    return {
+        'headers': {
+            'X-GitHub-Event': delivery['event'],
+            'X-GitHub-Delivery': f"delivery-{number}",
+            'X-Hub-Signature-256': 'sha256=' + hmac.new(secret.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).hexdigest()
+        },
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def load_reviews(update: StoreUpdate, github_api: Any, org: str, repo: str):
+    update.node['reviews'] = {'nodes': [{'author': {'login': reviewer}} for reviewer in REVIEWERS[update.node['number']]]}
+
+@pytest.fixture
+def cloudfront(s3, monkeypatch) -> FakeCloudFront:
+    cloudfront = FakeCloudFront()
+    monkeypatch.setenv('BUCKET_NAME', 'bucket')
+    monkeypatch.setenv('DISTRIBUTION_ID', 'distribution')
+    monkeypatch.setattr(webhook_handler, 'get_client', lambda service_name: {'s3': s3, 'cloudfront': cloudfront}[service_name])
+    monkeypatch.setattr(webhook_handler, 'get_secret', lambda secret_arn_variable: SECRET)
+    monkeypatch.setattr(webhook_handler, 'get_github_token', lambda refresh=False: 'test-token')
+    monkeypatch.setattr(StoreUpdate, 'load_reviews', load_reviews)
+    return cloudfront
+
+def make_store(author: str, reviewer: str) -> ContributionStore:
+    """A store an incremental run left, with a PR and an issue"""
+    store = ContributionStore({'watermark': '2025-03-01T00:00:00Z'})
+    store.merge_pull_request({
+        'number': 1, 'author': {'login': author}, 'reviews': {'nodes': [{'author': {'login': reviewer}}]},
+        'labels': {'nodes': []}, 'mergedAt': '2025-02-10T09:00:00Z', 'updatedAt': '2025-02-15T00:00:00Z'
+    })
+    store.merge_issue({
+        'number': 2, 'author': {'login': 'carol'}, 'labels': {'nodes': []},
+        'createdAt': '2025-02-11T08:00:00Z', 'updatedAt': '2025-02-11T08:00:00Z'
+    })
+    return store
+
+@pytest.fixture
+def store(s3) -> ContributionStore:
+    store = make_store('alice', 'bob')
+    save_contribution_store(s3, 'bucket', 'aws', 'aws-cdk', store)
+    save_run_settings(s3, 'bucket', INCREMENTAL_MODE, [('aws', 'aws-cdk')], SCORE_WEIGHTS)
+    return store
+
+def pending_updates(s3) -> List[str]:
+    return [key for key in s3.objects if key.startswith(UPDATES_PREFIX)]
+
+def counts(contributors: List[Dict[str, Any]]) -> Dict[str, tuple]:
+    return {
+        contributor['username']: (contributor['prsMerged'], contributor['prsReviewed'], contributor['issuesOpened'], contributor['discussionsAnswered'])
+        for contributor in contributors
+    }
+
+def test_recorded_deliveries_update_every_published_file(s3, cloudfront, store):
+    responses = [webhook_handler.handler(signed_event(delivery, number), None)
+                 for number, delivery in enumerate(load_deliveries('webhook_deliveries.jsonl'))]
+
+    # The first change publishes, the rest wait for the interval
+    assert [response['statusCode'] for response in responses] == [200, 200, 200, 200, 200, 202, 200]
+    assert [json.loads(response['body']).get('published') for response in responses[:2]] == [True, False]
+    assert len(pending_updates(s3)) == 6
+
+    flushed = webhook_handler.handler({'source': 'aws.events'}, None)
+    assert json.loads(flushed['body']) == {'published': True}
+
+    expected = {
+        'alice': (1, 0, 0, 0),
+        'bob': (0, 1, 0, 1),
+        'dave': (1, 0, 1, 0),
+        'erin': (0, 1, 0, 0),
+        'frank': (0, 1, 0, 0)
+    }
+    # carol's issue was labelled core, the stale edit of alice's PR is ignored
+    assert counts(s3.json('data/leaderboard.json')['contributors']) == expected
+    assert counts(s3.json(get_page_key(1))['contributors']) == expected
+    assert counts(s3.json(get_window_leaderboard_key('2025-Q1'))['contributors']) == expected
+    assert '2025-Q1' in [window['name'] for window in s3.json('data/windows.json')['windows']]
+    assert '/data/leaderboard.json' in cloudfront.invalidations[-1]
+    # Only runs save the store and archive the leaderboard
+    assert s3.json(get_store_key('aws', 'aws-cdk')) == store.to_dict()
+    assert not [key for key in s3.objects if key.startswith('leaderboard/leaderboard-')]
+
+def test_publishes_follow_the_run_settings(s3, cloudfront, store):
+    save_contribution_store(s3, 'bucket', 'aws', 'jsii', make_store('grace', 'alice'))
+    weights = dict(SCORE_WEIGHTS, prsReviewed=100)
+    save_run_settings(s3, 'bucket', INCREMENTAL_MODE, [('aws', 'aws-cdk'), ('aws', 'jsii')], weights)
+    delivery = {'event': 'pull_request_review', 'payload': {
+        'action': 'submitted', 'repository': {'full_name': 'aws/jsii'}, 'review': {'user': {'login': 'alice'}},
+        'pull_request': {'number': 1, 'merged_at': '2025-02-10T09:00:00Z'}
+    }}
+
+    response = webhook_handler.handler(signed_event(delivery, 0), None)
+
+    assert response['statusCode'] == 200
+    leaderboard = s3.json('data/leaderboard.json')
+    assert [repository['name'] for repository in leaderboard['repositories']] == ['aws/aws-cdk', 'aws/jsii']
+    # alice's review in jsii ranks her first with the run's weights
+    assert leaderboard['contributors'][0]['username'] == 'alice'
+    assert counts(leaderboard['contributors'])['alice'] == (1, 1, 0, 0)
+    assert counts(s3.json('data/repos/aws/jsii.json')['contributors'])['grace'] == (1, 0, 0, 0)
+
+def test_deliveries_wait_for_an_incremental_run(s3, cloudfront, store):
+    save_run_settings(s3, 'bucket', AGGREGATE_MODE, [('aws', 'aws-cdk')], SCORE_WEIGHTS)
+    delivery = load_deliveries('webhook_deliveries.jsonl')[0]
+
+    response = webhook_handler.handler(signed_event(delivery, 0), None)
+
+    assert response['statusCode'] == 202
+    assert not pending_updates(s3)
+
+def test_unsigned_deliveries_are_rejected(s3, cloudfront, store):
+    delivery = load_deliveries('webhook_deliveries.jsonl')[0]
+
+    response = webhook_handler.handler(signed_event(delivery, 0, 'another-secret'), None)
+
+    assert response['statusCode'] == 401
+    assert not pending_updates(s3)
+
+def test_runs_drop_covered_changes_and_never_overwrite_another_save(s3, cloudfront, store):
+    for number, delivery in enumerate(load_deliveries('webhook_deliveries.jsonl')):
+        webhook_handler.handler(signed_event(delivery, number), None)
+
+    # Changes received before a refresh's watermark were fetched by the refresh
+    assert delete_store_updates(s3, 'bucket', 'aws', 'aws-cdk', '2000-01-01T00:00:00Z') == 0
+    assert delete_store_updates(s3, 'bucket', 'aws', 'aws-cdk', '2999-01-01T00:00:00Z') == 6
+    assert not pending_updates(s3)
+
+    # Two runs load the same store, the second to save fails instead of overwriting the first
+    _, etag = load_contribution_store_version(s3, 'bucket', 'aws', 'aws-cdk')
+    save_run_store(s3, 'bucket', 'aws', 'aws-cdk', make_store('dave', 'erin'), etag)
+    with pytest.raises(Exception, match='saved by another run'):
+        save_run_store(s3, 'bucket', 'aws', 'aws-cdk', make_store('mallory', 'mallory'), etag)
@@ -0,0 +1,137 @@
+import datetime
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from contributor_table import ContributorTable, COLUMNS
+from constants import CONTRIBUTIONS_START_DATE, ROLLING_WINDOW_DAYS
+
+def to_day(timestamp: str) -> int:
+    """Get the day number of an ISO 8601 date or timestamp"""
+    return datetime.date.fromisoformat(timestamp[:10]).toordinal()
+
+class ActivityIndex:
+    """
+    Day of every counted contribution, indexed to count any date window in one pass.
+
+    Each column holds one (day, user row) pair per contribution. Once sorted
+    by day, a prefix sum of contributions per day gives the slice of
+    contributions inside a window directly, so a window costs one pass over
+    its own contributions rather than over the whole history.
+    """
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.usernames: List[str] = list(data.get('usernames', []))
+        self.index: Dict[str, int] = {username: row for row, username in enumerate(self.usernames)}
+        self.days: Dict[str, array] = {column: array('I', data.get('days', {}).get(column, [])) for column in COLUMNS}
+        self.rows: Dict[str, array] = {column: array('I', data.get('rows', {}).get(column, [])) for column in COLUMNS}
+        self._offsets: Optional[Dict[str, Tuple[int, array]]] = None
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the index to a JSON-compatible dictionary"""
+        return {
+            'usernames': self.usernames,
+            'days': {column: self.days[column].tolist() for column in COLUMNS},
+            'rows': {column: self.rows[column].tolist() for column in COLUMNS}
+        }
+
+    def add(self, username: str, column: str, timestamp: Optional[str]):
+        """Record one contribution of a user on the day of a timestamp"""
+        if username and timestamp:
+            self._add(username, column, to_day(timestamp))
+
+    def _add(self, username: str, column: str, day: int):
+        with self._lock:
+            row = self.index.get(username)
+            if row is None:
+                row = len(self.usernames)
+                self.index[username] = row
+                self.usernames.append(username)
+            self.days[column].append(day)
+            self.rows[column].append(row)
+            self._offsets = None
+
+    def merge(self, other: 'ActivityIndex', usernames: Optional[Iterable[str]] = None):
+        """
+        Add another index's contributions to this one
+
+        Args:
+            other: The index to copy contributions from
+            usernames: Only copy these users' contributions, every user's by default
+        """
+        keep = set(usernames) if usernames is not None else None
+        for column in COLUMNS:
+            for day, row in zip(other.days[column], other.rows[column]):
+                username = other.usernames[row]
+                if keep is None or username in keep:
+                    self._add(username, column, day)
+
+    def window(self, start: datetime.date, end: datetime.date) -> ContributorTable:
+        """
+        Count every user's contributions from start up to, but excluding, end
+
+        Returns:
+            A table with a row for each user active in the window
+        """
+        offsets = self._build()
+        table = ContributorTable()
+        start_day, end_day = start.toordinal(), end.toordinal()
+
+        for column in COLUMNS:
+            first_day, prefix = offsets[column]
+            if not len(prefix):
+                continue
+            rows = self.rows[column]
+            # prefix[i] is the number of contributions before first_day + i
+            lower = prefix[min(max(start_day - first_day, 0), len(prefix) - 1)]
+            upper = prefix[min(max(end_day - first_day, 0), len(prefix) - 1)]
+            for position in range(lower, upper):
+                table.increment(self.usernames[rows[position]], column)
+        return table
+
+    def _build(self) -> Dict[str, Tuple[int, array]]:
+        """Sort each column by day and compute its per-day prefix sums"""
+        with self._lock:
+            if self._offsets is not None:
+                return self._offsets
+
+            offsets: Dict[str, Tuple[int, array]] = {}
+            for column in COLUMNS:
+                order = sorted(range(len(self.days[column])), key=self.days[column].__getitem__)
+                days = array('I', (self.days[column][i] for i in order))
+                self.rows[column] = array('I', (self.rows[column][i] for i in order))
+                self.days[column] = days
+
+                if not days:
+                    offsets[column] = (0, array('I'))
+                    continue
+                first_day = days[0]
+                prefix = array('I', (bisect_left(days, first_day + i) for i in range(days[-1] - first_day + 2)))
+                offsets[column] = (first_day, prefix)
+
+            self._offsets = offsets
+            return offsets
+
+def leaderboard_windows(today: datetime.date) -> List[Tuple[str, datetime.date, datetime.date]]:
+    """
+    Get the windows to publish leaderboards for
+
+    Returns:
+        (name, start, end) of the rolling windows ending today and of every
+        calendar quarter since CONTRIBUTIONS_START_DATE, end excluded
+    """
+    end = today + datetime.timedelta(days=1)
+    windows = [(f"{days}d", end - datetime.timedelta(days=days), end) for days in ROLLING_WINDOW_DAYS]
+
+    start = datetime.date.fromisoformat(CONTRIBUTIONS_START_DATE)
+    year, quarter = start.year, (start.month - 1) // 3
+    while datetime.date(year, quarter * 3 + 1, 1) <= today:
+        quarter_start = datetime.date(year, quarter * 3 + 1, 1)
+        year, quarter = (year + 1, 0) if quarter == 3 else (year, quarter + 1)
+        windows.append((f"{quarter_start.year}-Q{(quarter_start.month - 1) // 3 + 1}", quarter_start, datetime.date(year, quarter * 3 + 1, 1)))
+    return windows
+
+def get_window_leaderboard_key(name: str) -> str:
+    """Get the S3 key of a windowed leaderboard, next to data/leaderboard.json"""
+    return f"data/leaderboard-{name}.json"
@@ -0,0 +1,142 @@
+import hashlib
+import hmac
+from typing import Any, Dict, Optional
+from github_api import GitHubAPI
+from contribution_store import ContributionStore
+from rest_api import trim_issue, trim_pull_request
+from search_sharding import complete_reviews
+
+# Headers of a GitHub webhook delivery, lowercased
+SIGNATURE_HEADER = 'x-hub-signature-256'
+EVENT_HEADER = 'x-github-event'
+DELIVERY_HEADER = 'x-github-delivery'
+
+# Kinds of change a webhook event makes to the contribution store
+PULL_REQUEST_UPDATE = 'pullRequest'
+REVIEW_UPDATE = 'review'
+ISSUE_UPDATE = 'issue'
+ISSUE_REMOVAL = 'issueRemoval'
+DISCUSSION_UPDATE = 'discussion'
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """
+    Check a delivery's X-Hub-Signature-256 header against its body
+
+    Args:
+        secret: The webhook secret configured on GitHub
+        body: The raw request body, exactly as delivered
+        signature: The header value, sha256=<hex digest>
+    """
+    if not signature or not signature.startswith('sha256='):
+        return False
+    expected = 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+class StoreUpdate:
+    """
+    A change to the contribution store carried by a webhook event.
+
+    Items are kept in the GraphQL node shape the store merges, so an event
+    and the next scheduled run write the same record for an item.
+    """
+    def __init__(self, kind: str, node: Dict[str, Any], fetch_reviews: bool = False):
+        """
+        Args:
+            kind: One of the *_UPDATE or *_REMOVAL kinds
+            node: The item, or its number for removals and reviews
+            fetch_reviews: The PR was just merged, its reviews are fetched
+                from GitHub as the payload does not list them
+        """
+        self.kind = kind
+        self.node = node
+        self.fetch_reviews = fetch_reviews
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the change, to apply it later with from_dict"""
+        return {'kind': self.kind, 'node': self.node}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StoreUpdate':
+        """Restore a change saved with to_dict, its reviews already loaded"""
+        return cls(data['kind'], data['node'])
+
+    def load_reviews(self, github_api: GitHubAPI, org: str, repo: str):
+        """Fetch every review of a merged PR, one per reviewer"""
+        self.node['reviews'] = {'pageInfo': {'hasNextPage': True, 'endCursor': None}, 'nodes': []}
+        complete_reviews(github_api, org, repo, [self.node])
+
+    def is_stale(self, store: ContributionStore) -> bool:
+        """Check whether the store already holds a later version of the item, written by a run or a later delivery"""
+        records = {PULL_REQUEST_UPDATE: store.pull_requests, ISSUE_UPDATE: store.issues, DISCUSSION_UPDATE: store.discussions}.get(self.kind)
+        if records is None or not self.node.get('updatedAt'):
+            return False
+        stored = records.get(str(self.node['number'])) or {}
+        return (stored.get('updatedAt') or '') > self.node['updatedAt']
+
+    def apply(self, store: ContributionStore):
+        """Merge the change into a store, updating its counts in place, unless the store has a later version of the item"""
+        if self.is_stale(store):
+            return
+        if self.kind == PULL_REQUEST_UPDATE:
+            node = self.node
+            if 'reviews' not in node:
+                # Edits and labels do not carry the reviews, keep the ones already stored
+                reviewers = (store.pull_requests.get(str(node['number'])) or {}).get('reviewers', [])
+                node = dict(node, reviews={'nodes': [{'author': {'login': reviewer}} for reviewer in reviewers]})
+            store.merge_pull_request(node)
+        elif self.kind == REVIEW_UPDATE:
+            store.merge_review(self.node['number'], self.node['reviewer'])
+        elif self.kind == ISSUE_UPDATE:
+            store.merge_issue(self.node)
+        elif self.kind == ISSUE_REMOVAL:
+            store.remove_issue(self.node['number'])
+        elif self.kind == DISCUSSION_UPDATE:
+            store.merge_discussion(self.node)
+
+def parse_event(event: str, payload: Dict[str, Any]) -> Optional[StoreUpdate]:
+    """
+    Get the store change of a webhook event
+
+    Args:
+        event: The X-GitHub-Event header, such as pull_request
+        payload: The delivery's JSON body
+
+    Returns:
+        The change, or None for events that count for nobody
+    """
+    action = payload.get('action')
+
+    if event == 'pull_request' and action in ('closed', 'edited', 'labeled', 'unlabeled'):
+        node = trim_pull_request(payload['pull_request'])
+        if node is None:
+            return None
+        return StoreUpdate(PULL_REQUEST_UPDATE, node, fetch_reviews=action == 'closed')
+
+    if event == 'pull_request_review' and action == 'submitted':
+        # Reviews of unmerged PRs are picked up when the PR merges
+        if not payload['pull_request'].get('merged_at'):
+            return None
+        reviewer = (payload['review'].get('user') or {}).get('login')
+        return StoreUpdate(REVIEW_UPDATE, {'number': payload['pull_request']['number'], 'reviewer': reviewer})
+
+    if event == 'issues':
+        if action in ('deleted', 'transferred'):
+            return StoreUpdate(ISSUE_REMOVAL, {'number': payload['issue']['number']})
+        if action in ('opened', 'edited', 'labeled', 'unlabeled'):
+            node = trim_issue(payload['issue'])
+            return StoreUpdate(ISSUE_UPDATE, node) if node is not None else None
+        return None
+
+    if event == 'discussion' and action in ('answered', 'unanswered', 'deleted'):
+        discussion = payload['discussion']
+        answer = payload.get('answer') if action == 'answered' else None
+        return StoreUpdate(DISCUSSION_UPDATE, {
+            'number': discussion['number'],
+            'updatedAt': discussion.get('updated_at'),
+            'answer': {
+                'createdAt': answer.get('created_at'),
+                'author': {'login': (answer.get('user') or {}).get('login')}
+            } if answer else None
+        })
+
+    return None
@@ -0,0 +1,212 @@
+import base64
+import datetime
+import json
+import os
+import sys
+import uuid
+from typing import Any, Dict, Optional
+from aws_clients import get_client, get_secret
+from github_api import GitHubAPI
+from rate_limiter import RateLimitThrottle
+from models import Contributor
+from contribution_store import ContributionStore, has_contribution_store, load_contribution_store, load_store_updates, save_store_update
+from contributor_table import ContributorTable
+from time_windows import ActivityIndex
+from publisher import load_json, invalidation_paths
+from webhook_events import StoreUpdate, parse_event, verify_signature, SIGNATURE_HEADER, EVENT_HEADER, DELIVERY_HEADER
+from handler import get_github_token, is_author_to_exclude, aggregate_contributions_data, build_leaderboard_data, build_combined_leaderboard, publish_leaderboard, RUN_SETTINGS_KEY
+from constants import INCREMENTAL_MODE, SCORE_WEIGHTS, WEBHOOK_PUBLISH_INTERVAL_SECONDS
+
+# When webhook changes were last checked for publishing, and whether some are waiting
+WEBHOOK_STATE_KEY = 'leaderboard/webhooks/publish-state.json'
+
+def store_contributors(store: ContributionStore) -> Dict[str, Contributor]:
+    """Count every contributor of the store the way an incremental run does"""
+    return {
+        username: aggregate_contributions_data(store, username, store)
+        for username in store.get_contributors() if not is_author_to_exclude(username)
+    }
+
+def load_current_store(s3_client: Any, bucket: str, org: str, repo: str) -> ContributionStore:
+    """
+    Load a repository's contribution store with the webhook changes saved since its last refresh applied
+
+    Only runs save the store, the changes are applied in memory for each
+    publish until a run's refresh has fetched them itself.
+    """
+    store = load_contribution_store(s3_client, bucket, org, repo)
+    updates = load_store_updates(s3_client, bucket, org, repo)
+    for update in updates:
+        StoreUpdate.from_dict(update).apply(store)
+    # Merged items move the counts but not the dates the windows are built from
+    store.recount()
+    print(f"Applied {len(updates)} webhook changes to the contribution store of {org}/{repo}")
+    return store
+
+def publish_stores(s3_client: Any, bucket: str, settings: Dict[str, Any], now: datetime.datetime) -> Dict[str, Any]:
+    """
+    Publish the leaderboard from the stores of the last run's repositories, with its weights, pages and windows
+
+    Returns:
+        The publish report
+    """
+    results = {}
+    activity = ActivityIndex()
+    for name in settings['repositories']:
+        org, repo = name.split('/')
+        store = load_current_store(s3_client, bucket, org, repo)
+        results[name] = store_contributors(store)
+        activity.merge(store.activity, results[name])
+
+    score_weights = settings.get('scoreWeights', SCORE_WEIGHTS)
+    contributor_table, leaderboard_data = build_combined_leaderboard(results, score_weights, now.isoformat())
+    return publish_leaderboard(s3_client, bucket, leaderboard_data, contributor_table, activity, score_weights,
+                               results if len(results) > 1 else None, archive=False)
+
+def publish_if_due(s3_client: Any, bucket: str, settings: Dict[str, Any], now: datetime.datetime,
+                   force: bool = False, distribution_id: Optional[str] = None, caller_reference: Optional[str] = None) -> bool:
+    """
+    Republish the leaderboard with the saved changes, at most once per interval
+
+    Changes arriving within WEBHOOK_PUBLISH_INTERVAL_SECONDS of the last check
+    are only marked pending, for the next event or the scheduled flush.
+
+    Args:
+        settings: How the last run built the leaderboard, saved by save_run_settings
+        force: Check now, however recent the last check was
+        distribution_id: CloudFront distribution to invalidate the changed files in
+
+    Returns:
+        True if the leaderboard was uploaded
+    """
+    state = load_json(s3_client, bucket, WEBHOOK_STATE_KEY) or {}
+    checked_at = state.get('checkedAt')
+    if not force and checked_at:
+        elapsed = (now - datetime.datetime.fromisoformat(checked_at)).total_seconds()
+        if elapsed < WEBHOOK_PUBLISH_INTERVAL_SECONDS:
+            if not state.get('pending'):
+                save_state(s3_client, bucket, dict(state, pending=True))
+            print(f"Last checked {int(elapsed)}s ago, leaving the changes for the next publish")
+            return False
+
+    report = publish_stores(s3_client, bucket, settings, now)
+    save_state(s3_client, bucket, {'checkedAt': now.isoformat(), 'pending': False})
+
+    published = 'data/leaderboard.json' in report['changed']
+    paths = invalidation_paths(report)
+    if distribution_id and paths:
+        get_client('cloudfront').create_invalidation(
+            DistributionId=distribution_id,
+            InvalidationBatch={
+                'Paths': {'Quantity': len(paths), 'Items': paths},
+                'CallerReference': caller_reference or now.isoformat()
+            }
+        )
+    print(f"Leaderboard {'republished' if published else 'unchanged'} after webhook events, {len(report['changed'])} files changed")
+    return published
+
+def save_state(s3_client: Any, bucket: str, state: Dict[str, Any]):
+    s3_client.put_object(Bucket=bucket, Key=WEBHOOK_STATE_KEY, Body=json.dumps(state), ContentType='application/json')
+
+def response(status: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps(body)
+    }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Lambda handler for GitHub webhook deliveries, behind a function URL
+
+    Merged PRs, reviews, opened issues and answered discussions change the
+    contribution stores that incremental runs keep, so the pipeline must run
+    in incremental mode, as the stack configures it. Every delivery saves its
+    change next to the store of its repository. At most once per interval the
+    leaderboard is republished, with its pages and windows, from the stores
+    of the last run's repositories with the saved changes applied and the
+    run's score weights. A scheduled event publishes the changes still
+    pending from the last interval.
+    """
+    s3_bucket = os.environ.get('BUCKET_NAME')
+    if not s3_bucket:
+        raise ValueError("BUCKET_NAME environment variable is not set")
+    s3_client = get_client('s3')
+    distribution_id = os.environ.get('DISTRIBUTION_ID')
+    caller_reference = getattr(context, 'aws_request_id', None)
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    # Changes are only published the way the last run built the leaderboard
+    settings = load_json(s3_client, s3_bucket, RUN_SETTINGS_KEY)
+    if not settings or settings.get('mode') != INCREMENTAL_MODE:
+        print("No incremental run has published the leaderboard yet, ignoring the event")
+        return response(202, {'message': 'No contribution store yet, run the leaderboard in incremental mode first'})
+
+    if event.get('source') == 'aws.events':
+        state = load_json(s3_client, s3_bucket, WEBHOOK_STATE_KEY) or {}
+        if not state.get('pending'):
+            return response(200, {'message': 'Nothing pending'})
+        published = publish_if_due(s3_client, s3_bucket, settings, now, True, distribution_id, caller_reference)
+        return response(200, {'published': published})
+
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    body = event.get('body') or ''
+    body = base64.b64decode(body) if event.get('isBase64Encoded') else body.encode('utf-8')
+    if not verify_signature(get_secret('WEBHOOK_SECRET_ARN'), body, headers.get(SIGNATURE_HEADER)):
+        print(f"Rejected delivery {headers.get(DELIVERY_HEADER)} with an invalid signature")
+        return response(401, {'message': 'Invalid signature'})
+
+    event_name = headers.get(EVENT_HEADER, '')
+    payload = json.loads(body)
+    print(f"Received {event_name}.{payload.get('action')} delivery {headers.get(DELIVERY_HEADER)}")
+    name = (payload.get('repository') or {}).get('full_name')
+    if name not in settings['repositories']:
+        return response(202, {'message': 'Repository not tracked'})
+    org, repo = name.split('/')
+
+    update = parse_event(event_name, payload)
+    if update is None:
+        return response(202, {'message': 'Event not counted'})
+    if not has_contribution_store(s3_client, s3_bucket, org, repo):
+        return response(202, {'message': 'No contribution store yet, run the leaderboard in incremental mode first'})
+    if update.fetch_reviews:
+        github_api = GitHubAPI(get_github_token(), RateLimitThrottle(), token_refresher=lambda: get_github_token(refresh=True))
+        update.load_reviews(github_api, org, repo)
+
+    # Each change is its own object, so a delivery costs a HEAD and a PUT however large the store is
+    save_store_update(s3_client, s3_bucket, org, repo, update.to_dict(), now, headers.get(DELIVERY_HEADER) or uuid.uuid4().hex)
+    published = publish_if_due(s3_client, s3_bucket, settings, now, False, distribution_id, caller_reference)
+    return response(200, {'applied': update.kind, 'published': published})
+
+# Replays recorded deliveries against a local store:
+#   python webhook_handler.py deliveries.jsonl [store.json]
+# Each line holds an event name and payload, {"event": "pull_request", "payload": {...}}.
+# Reviews of merged PRs are fetched when GITHUB_TOKEN is set.
+if __name__ == "__main__":
+    store_data = None
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as f:
+            store_data = json.load(f)
+    store = ContributionStore(store_data)
+    token = os.environ.get('GITHUB_TOKEN')
+    github_api = GitHubAPI(token, RateLimitThrottle()) if token else None
+
+    with open(sys.argv[1]) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            delivery = json.loads(line)
+            update = parse_event(delivery['event'], delivery['payload'])
+            if update is None:
+                print(f"Skipped {delivery['event']}.{delivery['payload'].get('action')}")
+                continue
+            if update.fetch_reviews and github_api:
+                owner, name = delivery['payload']['repository']['full_name'].split('/')
+                update.load_reviews(github_api, owner, name)
+            update.apply(store)
+            print(f"Applied {delivery['event']}.{delivery['payload'].get('action')} as a {update.kind} update")
+
+    leaderboard = build_leaderboard_data(ContributorTable.from_contributors(store_contributors(store).values()), SCORE_WEIGHTS, datetime.datetime.now(datetime.timezone.utc).isoformat())
+    print(json.dumps(leaderboard['contributors'][:10], indent=2))
@@ -4,6 +4,7 @@ import Footer from './components/Footer';
 import TopThree from "./components/TopThree";
 import LeaderboardTable from "./components/LeaderboardTable";
 import InfoBoards from './components/InfoBoards';
+import { fetchManifest } from "./leaderboardPages";
 import "./styles/App.css";
 
 function sortContributors(contributors) {
@@ -28,6 +29,7 @@ function sortContributors(contributors) {
 
 function App() {
   const [leaderboardData, setLeaderboardData] = useState(null);
+  const [manifest, setManifest] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -46,6 +48,11 @@ function App() {
         console.error("Error fetching data:", error);
         setLoading(false);
       });
+
+    // The full ranking is paged; without it the table falls back to the top 100
+    fetchManifest()
+      .then(setManifest)
+      .catch((error) => console.warn("Leaderboard pages unavailable:", error));
   }, []);
 
   if (loading) {
@@ -68,7 +75,7 @@ function App() {
       </h1>
       <TopThree winners={sortedData.slice(0, 3)} />
       <InfoBoards />
-      <LeaderboardTable data={sortedData} />
+      <LeaderboardTable data={sortedData} manifest={manifest} />
       <Footer lastUpdated={leaderboardData?.lastUpdated} />
     </div>
   );
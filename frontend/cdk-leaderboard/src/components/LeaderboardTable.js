@@ -1,8 +1,9 @@
-import React, { useMemo } from "react";
+import React, { useEffect, useMemo } from "react";
 import Pagination from "./Pagination";
 import RankBadge from "./RankBadge";
 import SearchBar from "./SearchBar";
 import defaultAvatar from "../assets/sample_user.png";
+import { fetchPage, searchContributors, fetchContributors } from "../leaderboardPages";
 
 const GitHubIcon = () => (
   <svg
@@ -16,10 +17,13 @@ const GitHubIcon = () => (
   </svg>
 );
 
-function LeaderboardTable({ data }) {
+// With a manifest, pages and search hits are fetched on demand from the
+// published page files; otherwise the given data is paged in the browser.
+function LeaderboardTable({ data, manifest }) {
   const [currentPage, setCurrentPage] = React.useState(1);
   const [searchTerm, setSearchTerm] = React.useState("");
-  const itemsPerPage = 20;
+  const [remoteData, setRemoteData] = React.useState({ rows: [], total: 0 });
+  const itemsPerPage = manifest ? manifest.pageSize : 20;
 
   const filteredData = useMemo(() => {
     return data.filter((contributor) =>
@@ -27,11 +31,44 @@ function LeaderboardTable({ data }) {
     );
   }, [data, searchTerm]);
 
-  const totalPages = Math.ceil(filteredData.length / itemsPerPage);
+  useEffect(() => {
+    if (!manifest) {
+      return;
+    }
+    let cancelled = false;
+    const load = searchTerm
+      ? searchContributors(manifest, searchTerm).then((hits) =>
+          fetchContributors(
+            manifest,
+            hits.slice((currentPage - 1) * itemsPerPage, currentPage * itemsPerPage)
+          ).then((rows) => ({ rows, total: hits.length }))
+        )
+      : fetchPage(currentPage).then((rows) => ({
+          rows,
+          total: manifest.totalContributors,
+        }));
+
+    load
+      .then((result) => {
+        if (!cancelled) {
+          setRemoteData(result);
+        }
+      })
+      .catch((error) => console.error("Error fetching leaderboard page:", error));
+    return () => {
+      cancelled = true;
+    };
+  }, [manifest, searchTerm, currentPage, itemsPerPage]);
+
+  const totalPages = Math.ceil(
+    (manifest ? remoteData.total : filteredData.length) / itemsPerPage
+  );
 
   const startIndex = (currentPage - 1) * itemsPerPage;
   const endIndex = startIndex + itemsPerPage;
-  const currentData = filteredData.slice(startIndex, endIndex);
+  const currentData = manifest
+    ? remoteData.rows
+    : filteredData.slice(startIndex, endIndex);
 
   const getGithubAvatar = (username) => `https://github.com/${username}.png`;
 
@@ -79,7 +116,7 @@ function LeaderboardTable({ data }) {
             </thead>
             <tbody>
               {currentData.map((contributor, index) => {
-                const originalRank = getOriginalRank(contributor.username);
+                const originalRank = contributor.rank ?? getOriginalRank(contributor.username);
                 return (
                   <tr key={contributor.username}>
                     <td className="badge-cell">
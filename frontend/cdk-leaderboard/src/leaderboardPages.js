@@ -0,0 +1,61 @@
+// Client for the paged leaderboard published under /data/pages/.
+// The backend gzips every file and serves it with Content-Encoding: gzip,
+// so the browser decompresses it transparently.
+const PAGES_PATH = "/data/pages";
+
+const cache = new Map();
+
+function fetchJson(path) {
+  if (!cache.has(path)) {
+    const request = fetch(path).then((response) => {
+      if (!response.ok) {
+        throw new Error(`Failed to fetch ${path}: ${response.status}`);
+      }
+      return response.json();
+    });
+    // Forget failed requests so they can be retried
+    request.catch(() => cache.delete(path));
+    cache.set(path, request);
+  }
+  return cache.get(path);
+}
+
+export function fetchManifest() {
+  return fetchJson(`${PAGES_PATH}/manifest.json`);
+}
+
+export function fetchPage(pageNumber) {
+  return fetchJson(`${PAGES_PATH}/page-${pageNumber}.json`).then(
+    (page) => page.contributors
+  );
+}
+
+// Find contributors whose username starts with the search term.
+// Returns [username, rank] pairs in rank order.
+export async function searchContributors(manifest, searchTerm) {
+  const term = searchTerm.toLowerCase();
+  const prefixes = manifest.prefixes.filter((prefix) =>
+    term.length >= manifest.prefixLength
+      ? prefix === term.slice(0, manifest.prefixLength)
+      : prefix.startsWith(term)
+  );
+  const shards = await Promise.all(
+    prefixes.map((prefix) => fetchJson(`${PAGES_PATH}/index/${prefix}.json`))
+  );
+  return shards
+    .flatMap((shard) => shard.entries)
+    .filter(([username]) => username.toLowerCase().startsWith(term))
+    .sort((a, b) => a[1] - b[1]);
+}
+
+// Load the full records of search hits, fetching each page they fall on once
+export async function fetchContributors(manifest, hits) {
+  const pageNumbers = [
+    ...new Set(hits.map(([, rank]) => Math.ceil(rank / manifest.pageSize))),
+  ];
+  const pages = await Promise.all(pageNumbers.map(fetchPage));
+  const byUsername = new Map(
+    pages.flat().map((contributor) => [contributor.username, contributor])
+  );
+  return hits.map(([username]) => byUsername.get(username)).filter(Boolean);
+}
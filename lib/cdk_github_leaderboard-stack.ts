@@ -35,6 +35,12 @@ export class CdkGithubLeaderboardStack extends cdk.Stack {
       autoDeleteObjects: true
     });
 
+    // Cached GitHub responses are fresh for at most 6 hours, unused ones are deleted a day after they were written
+    websiteBucket.addLifecycleRule({
+      prefix: 'leaderboard/cache/',
+      expiration: cdk.Duration.days(1),
+    });
+
     websiteBucket.addCorsRule({
       allowedMethods: [s3.HttpMethods.GET],
       allowedOrigins: ['*'],
@@ -134,8 +140,38 @@ export class CdkGithubLeaderboardStack extends cdk.Stack {
       description: 'Python Lambda function deployed with TypeScript CDK',
     });
 
+    // Worker that processes one shard of contributors when a run is fanned out
+    const shardWorkerFunction = new lambda.Function(this, 'CdkGithubLeaderboardShardWorkerFunction', {
+      runtime: lambda.Runtime.PYTHON_3_10,
+      handler: 'shard_worker.handler',
+      code: lambda.Code.fromAsset(path.join(__dirname, '../backend'), {
+        bundling: {
+          image: lambda.Runtime.PYTHON_3_10.bundlingImage,
+          command: [
+            'bash', '-c',
+            'pip install -r requirements.txt -t /asset-output && cp -au . /asset-output'
+          ],
+        },
+      }),
+      memorySize: 512,
+      timeout: cdk.Duration.minutes(15),
+      environment: {
+        PYTHONPATH: '/var/runtime:/var/task',
+        GITHUB_TOKEN_SECRET_ARN: githubTokenSecret.secretArn,
+        BUCKET_NAME: websiteBucket.bucketName,
+      },
+      description: 'Processes one shard of contributors for the leaderboard',
+    });
+
+    githubTokenSecret.grantRead(shardWorkerFunction);
+    websiteBucket.grantWrite(shardWorkerFunction);
+    shardWorkerFunction.grantInvoke(cdkGithubLeaderboardFunction);
+    cdkGithubLeaderboardFunction.addEnvironment('SHARD_WORKER_FUNCTION_NAME', shardWorkerFunction.functionName);
+
      githubTokenSecret.grantRead(cdkGithubLeaderboardFunction);
      websiteBucket.grantWrite(cdkGithubLeaderboardFunction);
+     // Read access for the persisted contribution store
+     websiteBucket.grantRead(cdkGithubLeaderboardFunction);
 
     // Create an S3 bucket for the pipeline source (placeholder)
     const sourceBucket = new s3.Bucket(this, 'SourceBucket', {
@@ -175,6 +211,9 @@ export class CdkGithubLeaderboardStack extends cdk.Stack {
     const lambdaAction = new codepipeline_actions.LambdaInvokeAction({
       actionName: 'InvokeLambda',
       lambda: cdkGithubLeaderboardFunction,
+      // Incremental runs keep the contribution store that the webhook function applies events to.
+      // The first one fetches the whole history, resuming from a checkpoint in as many invocations as it needs.
+      userParameters: { mode: 'incremental' },
     });
 
     // Grant the pipeline permission to invoke the Lambda function
@@ -202,8 +241,12 @@ export class CdkGithubLeaderboardStack extends cdk.Stack {
       environment: {
         PYTHONPATH: '/var/runtime:/var/task',
         DISTRIBUTION_ID: cloudFrontOAC.distributionId, // Pass the CloudFront distribution ID
+        BUCKET_NAME: websiteBucket.bucketName, // Where the leaderboard run reports what it changed
       },
     });
+
+    // Grant the Lambda function permission to read the publish report
+    websiteBucket.grantRead(invalidateCacheFunction);
     
     // Grant the Lambda function permission to interact with CodePipeline
     invalidateCacheFunction.addToRolePolicy(
@@ -250,6 +293,68 @@ export class CdkGithubLeaderboardStack extends cdk.Stack {
       new targets.CodePipeline(pipeline)
     );
 
+    // Secret shared with the GitHub webhook, used to verify delivery signatures
+    const webhookSecret = new secretsmanager.Secret(this, 'GitHubWebhookSecret', {
+      description: 'Secret of the GitHub webhook that sends contribution events',
+      generateSecretString: {
+        excludePunctuation: true,
+        passwordLength: 40,
+      },
+    });
+
+    // Applies webhook events to the contribution store and republishes the leaderboard between daily runs
+    const webhookFunction = new lambda.Function(this, 'CdkGithubLeaderboardWebhookFunction', {
+      runtime: lambda.Runtime.PYTHON_3_10,
+      handler: 'webhook_handler.handler',
+      code: lambda.Code.fromAsset(path.join(__dirname, '../backend'), {
+        bundling: {
+          image: lambda.Runtime.PYTHON_3_10.bundlingImage,
+          command: [
+            'bash', '-c',
+            'pip install -r requirements.txt -t /asset-output && cp -au . /asset-output'
+          ],
+        },
+      }),
+      memorySize: 512,
+      // Room to republish every page and window of the leaderboard
+      timeout: cdk.Duration.minutes(5),
+      environment: {
+        PYTHONPATH: '/var/runtime:/var/task',
+        GITHUB_TOKEN_SECRET_ARN: githubTokenSecret.secretArn,
+        WEBHOOK_SECRET_ARN: webhookSecret.secretArn,
+        BUCKET_NAME: websiteBucket.bucketName,
+        DISTRIBUTION_ID: cloudFrontOAC.distributionId,
+      },
+      description: 'Applies GitHub webhook events to the leaderboard',
+    });
+
+    githubTokenSecret.grantRead(webhookFunction);
+    webhookSecret.grantRead(webhookFunction);
+    websiteBucket.grantReadWrite(webhookFunction);
+    cloudFrontOAC.grantCreateInvalidation(webhookFunction);
+
+    // Deliveries are authenticated by their signature, not by IAM
+    const webhookUrl = webhookFunction.addFunctionUrl({
+      authType: lambda.FunctionUrlAuthType.NONE,
+    });
+
+    // Publishes the webhook changes held back by the debounce
+    const webhookFlushRule = new events.Rule(this, 'WebhookFlushRule', {
+      schedule: events.Schedule.rate(cdk.Duration.minutes(5)),
+    });
+
+    webhookFlushRule.addTarget(new targets.LambdaFunction(webhookFunction));
+
+    new cdk.CfnOutput(this, 'WebhookUrl', {
+      value: webhookUrl.url,
+      description: 'Payload URL of the GitHub webhook',
+    });
+
+    new cdk.CfnOutput(this, 'WebhookSecretArn', {
+      value: webhookSecret.secretArn,
+      description: 'Secret to configure on the GitHub webhook',
+    });
+
     new cdk.CfnOutput(this, 'CloudfrontDistributionName', {
       value: cloudFrontOAC.distributionDomainName,
       description: 'URL for leaderboard website',